@@ -0,0 +1,216 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import cv2
+
+from detection import detect_and_encode, make_region
+from detectors import resolve_detector
+from gallery import LEGACY_PICKLE_PATH, identify_faces, load_matcher
+from thumbnails import IMAGE_EXTENSIONS
+
+# --- Mode batch offline: memproses file video dan folder gambar ---
+# Memakai langkah deteksi -> encoding -> pencocokan yang sama dengan stream
+# live, tetapi dibagi ke banyak proses. Setiap worker memuat galeri satu kali.
+# Contoh:
+#   python batch.py rekaman.mp4 folder_foto/ --workers 16 --output hasil.jsonl
+#   python batch.py rekaman.mp4 --format csv --stride 5 --annotate rekaman_anotasi.mp4
+
+RESULT_FIELDS = ("source", "frame", "timestamp", "top", "right", "bottom", "left", "name", "similarity")
+
+_worker_matcher = None
+_worker_scale = 0.25
+_worker_detector = "hog"
+
+
+def _init_worker(gallery_path, pickle_path, index_path, n_probe, scale, detector):
+    global _worker_matcher, _worker_scale, _worker_detector
+    # stdout dipakai proses utama untuk hasil; log dari worker dialihkan ke stderr
+    sys.stdout = sys.stderr
+    _worker_matcher = load_matcher(gallery_path, pickle_path, index_path, n_probe)
+    _worker_scale = scale
+    _worker_detector = detector
+
+
+def process_frame(frame):
+    """Deteksi, encode, dan cocokkan semua wajah di satu frame BGR.
+
+    Mengembalikan list (location skala penuh, nama, kemiripan).
+    """
+    locations, encodings, _ = detect_and_encode([make_region(frame, _worker_scale)], detector=_worker_detector)
+    identities = identify_faces(_worker_matcher, encodings)
+    return [(location, name, similarity) for location, (name, similarity) in zip(locations, identities)]
+
+
+def _result_rows(source, frame_index, timestamp, faces):
+    for (top, right, bottom, left), name, similarity in faces:
+        yield {"source": source, "frame": frame_index, "timestamp": timestamp,
+               "top": top, "right": right, "bottom": bottom, "left": left,
+               "name": name, "similarity": similarity}
+
+
+def run_task(task):
+    """Satu potongan pekerjaan: rentang frame sebuah video atau sekelompok gambar."""
+    kind = task[0]
+    rows = []
+    if kind == "video":
+        _, path, start, end, stride = task
+        capture = cv2.VideoCapture(path)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frame_index = start
+        while end is None or frame_index < end:
+            # grab() tanpa decode untuk frame yang dilewati stride
+            if frame_index % stride != 0:
+                if not capture.grab():
+                    break
+                frame_index += 1
+                continue
+            ret, frame = capture.read()
+            if not ret:
+                break
+            timestamp = round(frame_index / fps, 3) if fps else None
+            rows.extend(_result_rows(path, frame_index, timestamp, process_frame(frame)))
+            frame_index += 1
+        capture.release()
+    else:
+        _, paths = task
+        for path in paths:
+            frame = cv2.imread(path)
+            if frame is None or frame.size == 0:
+                print(f"Peringatan: Gagal membaca gambar {path}.", file=sys.stderr)
+                continue
+            rows.extend(_result_rows(path, 0, None, process_frame(frame)))
+    return rows
+
+
+def plan_tasks(inputs, chunk_frames, chunk_images, stride):
+    tasks = []
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            images = sorted(os.path.join(root, filename)
+                            for root, _, filenames in os.walk(input_path)
+                            for filename in filenames if filename.lower().endswith(IMAGE_EXTENSIONS))
+            for start in range(0, len(images), chunk_images):
+                tasks.append(("images", images[start:start + chunk_images]))
+        elif input_path.lower().endswith(IMAGE_EXTENSIONS):
+            tasks.append(("images", [input_path]))
+        else:
+            capture = cv2.VideoCapture(input_path)
+            if not capture.isOpened():
+                print(f"Peringatan: Tidak dapat membuka video {input_path}. Dilewati.", file=sys.stderr)
+                continue
+            frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            capture.release()
+            if frame_count <= 0:
+                # Jumlah frame tidak diketahui: proses satu potongan sampai habis
+                tasks.append(("video", input_path, 0, None, stride))
+                continue
+            for start in range(0, frame_count, chunk_frames):
+                # Potongan terakhir dibaca sampai habis, karena CAP_PROP_FRAME_COUNT bisa meleset
+                end = start + chunk_frames if start + chunk_frames < frame_count else None
+                tasks.append(("video", input_path, start, end, stride))
+    return tasks
+
+
+def write_annotated_video(video_path, output_path, rows, stride):
+    """Menggambar kotak & label hasil batch ke salinan video (satu proses, decode ulang berurutan)."""
+    faces_by_frame = {}
+    for row in rows:
+        faces_by_frame.setdefault(row["frame"], []).append(row)
+
+    capture = cv2.VideoCapture(video_path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+
+    frame_index = 0
+    current_faces = []
+    while True:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        # Dengan stride > 1, kotak dari frame terakhir yang diproses tetap ditampilkan
+        if frame_index % stride == 0:
+            current_faces = faces_by_frame.get(frame_index, [])
+        for row in current_faces:
+            cv2.rectangle(frame, (row["left"], row["top"]), (row["right"], row["bottom"]), (0, 255, 0), 2)
+            label = f"{row['name']} ({row['similarity']:.2f}%)"
+            cv2.putText(frame, label, (row["left"], row["top"] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        writer.write(frame)
+        frame_index += 1
+    capture.release()
+    writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mencocokkan wajah di file video/folder gambar dengan galeri waifu secara paralel.")
+    parser.add_argument("inputs", nargs="+", help="File video, file gambar, atau folder gambar")
+    parser.add_argument("--output", default="-", help="File hasil (default: stdout)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl", help="Format hasil")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Jumlah proses")
+    parser.add_argument("--stride", type=int, default=1, help="Proses setiap frame ke-N dari video")
+    parser.add_argument("--scale", type=float, default=0.25, help="Skala frame sebelum deteksi (sama dengan stream live)")
+    parser.add_argument("--detector", default="hog",
+                        help="Backend detektor (hog, haar, lbp:<xml>, dnn:<model>[,<config>], atau auto dari detector_calibration.json)")
+    parser.add_argument("--chunk-frames", type=int, default=300, help="Jumlah frame video per tugas")
+    parser.add_argument("--chunk-images", type=int, default=32, help="Jumlah gambar per tugas")
+    parser.add_argument("--gallery", default="waifu_gallery", help="Folder galeri (build_gallery.py)")
+    parser.add_argument("--encodings-pickle", default=LEGACY_PICKLE_PATH, help="Pickle lama jika folder galeri tidak ada")
+    parser.add_argument("--index", default="", help="Indeks IVF opsional (build_index.py)")
+    parser.add_argument("--n-probe", type=int, default=8, help="n_probe untuk indeks IVF")
+    parser.add_argument("--annotate", default=None, help="Tulis video beranotasi (hanya untuk satu input video)")
+    args = parser.parse_args()
+    args.detector = resolve_detector(args.detector, "detector_calibration.json")
+
+    tasks = plan_tasks(args.inputs, args.chunk_frames, args.chunk_images, args.stride)
+    if not tasks:
+        print("Tidak ada input yang bisa diproses.", file=sys.stderr)
+        return
+    video_inputs = sorted({task[1] for task in tasks if task[0] == "video"})
+    if args.annotate and len(video_inputs) != 1:
+        parser.error("--annotate hanya didukung untuk tepat satu input video.")
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    csv_writer = None
+    if args.format == "csv":
+        csv_writer = csv.DictWriter(output, fieldnames=RESULT_FIELDS)
+        csv_writer.writeheader()
+
+    print(f"[INFO] {len(tasks)} tugas dari {len(args.inputs)} input, {args.workers} proses.", file=sys.stderr)
+    start = time.perf_counter()
+    annotated_rows = []
+    total_rows = 0
+    try:
+        with Pool(processes=args.workers, initializer=_init_worker,
+                  initargs=(args.gallery, args.encodings_pickle, args.index, args.n_probe, args.scale, args.detector)) as pool:
+            # imap menjaga urutan hasil sesuai urutan tugas, sambil tetap mengalirkan hasil yang sudah selesai
+            for done, rows in enumerate(pool.imap(run_task, tasks), 1):
+                for row in rows:
+                    if csv_writer is not None:
+                        csv_writer.writerow(row)
+                    else:
+                        output.write(json.dumps(row, ensure_ascii=False) + "\n")
+                output.flush()
+                total_rows += len(rows)
+                if args.annotate:
+                    annotated_rows.extend(rows)
+                print(f"[INFO] {done}/{len(tasks)} tugas selesai ({total_rows} wajah).", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"[INFO] Selesai dalam {time.perf_counter() - start:.1f} detik.", file=sys.stderr)
+
+    if args.annotate:
+        write_annotated_video(video_inputs[0], args.annotate, annotated_rows, args.stride)
+        print(f"[INFO] Video beranotasi disimpan ke {args.annotate}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import argparse
+import json
+import os
+import platform
+import time
+
+import cv2
+import numpy as np
+
+from gallery import ENCODING_DIM, GalleryMatcher, load_matcher
+from metrics import PIPELINE_STAGE_SECONDS, pipeline_registry
+from pipeline import PipelineConfig, process_frames
+from thumbnails import ThumbnailStore, get_waifu_image_path
+
+# --- Benchmark per tahap pipeline tanpa webcam ---
+# Menjalankan process_frames() yang sama dengan server, dengan sumber frame
+# palsu yang bisa diputar ulang: video rekaman atau frame sintetis berisi N
+# wajah. Durasi per tahap dibaca dari histogram PIPELINE_STAGE_SECONDS di
+# pipeline_registry (selisih sebelum/sesudah run), jadi angkanya selalu
+# berasal dari kode produksi. Persentil diperkirakan dari bucket histogram.
+# Contoh:
+#   python benchmark.py --gallery-sizes 1000,10000,100000 --faces 1,4 --output bench.json
+#   python benchmark.py --video rekaman.mp4 --compare bench_lama.json
+
+
+class FakeCamera:
+    """Pengganti cv2.VideoCapture yang memutar ulang frame dari memori.
+
+    Frame dimuat di awal sehingga waktu decode/disk tidak ikut terukur dan
+    setiap run melihat frame yang sama persis.
+    """
+
+    def __init__(self, frames, fps=30.0):
+        self.frames = frames
+        self.fps = fps
+        self._index = 0
+
+    @classmethod
+    def from_video(cls, path, max_frames=300):
+        capture = cv2.VideoCapture(path)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        frames = []
+        while len(frames) < max_frames:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            frames.append(frame)
+        capture.release()
+        if not frames:
+            raise ValueError(f"Tidak ada frame yang bisa dibaca dari {path}")
+        return cls(frames, fps)
+
+    @classmethod
+    def synthetic(cls, face_images, faces_per_frame, n_frames=120, size=(640, 480), seed=0):
+        """Latar derau + faces_per_frame wajah yang bergerak pelan dalam grid."""
+        rng = np.random.default_rng(seed)
+        width, height = size
+        background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        columns = max(1, int(np.ceil(np.sqrt(faces_per_frame))))
+        cell_w, cell_h = width // columns, height // columns
+        face_size = int(min(cell_w, cell_h) * 0.6)
+        faces = [cv2.resize(face_images[i % len(face_images)], (face_size, face_size))
+                 for i in range(faces_per_frame)] if face_images else []
+
+        frames = []
+        for frame_index in range(n_frames):
+            frame = background.copy()
+            shift = int(10 * np.sin(frame_index / 10.0))
+            for i, face in enumerate(faces):
+                x = (i % columns) * cell_w + (cell_w - face_size) // 2 + shift
+                y = (i // columns) * cell_h + (cell_h - face_size) // 2
+                x = min(max(x, 0), width - face_size)
+                frame[y:y + face_size, x:x + face_size] = face
+            frames.append(frame)
+        return cls(frames)
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        frame = self.frames[self._index % len(self.frames)]
+        self._index += 1
+        return True, frame.copy()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.frames)
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+
+def stage_histograms():
+    """{tahap: (batas atas bucket, jumlah kumulatif, total detik, count)} dari PIPELINE_STAGE_SECONDS."""
+    stages = {}
+    for name, _, _, samples in pipeline_registry.collect():
+        if name != PIPELINE_STAGE_SECONDS.name:
+            continue
+        for sample_name, labels, value in samples:
+            labels = dict(labels)
+            bounds, counts, total, count = stages.setdefault(labels["stage"], ([], [], 0.0, 0))
+            if sample_name.endswith("_bucket"):
+                bounds.append(float(labels["le"]))
+                counts.append(value)
+            elif sample_name.endswith("_sum"):
+                stages[labels["stage"]] = (bounds, counts, value, count)
+            elif sample_name.endswith("_count"):
+                stages[labels["stage"]] = (bounds, counts, total, value)
+    return stages
+
+
+def histogram_quantile(q, bounds, cumulative_counts):
+    """Perkiraan kuantil q dari bucket kumulatif (interpolasi linear, seperti histogram_quantile Prometheus)."""
+    rank = q * cumulative_counts[-1]
+    previous_bound, previous_count = 0.0, 0
+    for bound, count in zip(bounds, cumulative_counts):
+        if count >= rank:
+            if bound == float("inf"):
+                return previous_bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / max(count - previous_count, 1)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def stage_summary(before, after):
+    """Statistik per tahap (ms) untuk observasi di antara dua stage_histograms()."""
+    result = {}
+    for stage, (bounds, counts, total, count) in sorted(after.items()):
+        _, counts_before, total_before, count_before = before.get(stage, (bounds, [0] * len(counts), 0.0, 0))
+        count -= count_before
+        if count <= 0:
+            continue
+        counts = [now - then for now, then in zip(counts, counts_before)]
+        result[stage] = {
+            "count": count,
+            "mean_ms": round((total - total_before) / count * 1000.0, 4),
+            "p50_ms": round(histogram_quantile(0.50, bounds, counts) * 1000.0, 4),
+            "p90_ms": round(histogram_quantile(0.90, bounds, counts) * 1000.0, 4),
+            "p99_ms": round(histogram_quantile(0.99, bounds, counts) * 1000.0, 4),
+        }
+    return result
+
+
+def synthetic_gallery(size, seed=0):
+    # Vektor acak dengan norma mirip enkripsi face_recognition (sekitar 1.0)
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0.0, 1.0 / np.sqrt(ENCODING_DIM), (size, ENCODING_DIM)).astype(np.float32)
+    return GalleryMatcher(encodings, [f"waifu_{i}" for i in range(size)])
+
+
+def load_face_images(dataset_base_path, limit=16):
+    images = []
+    if not os.path.isdir(dataset_base_path):
+        return images
+    for waifu_name in sorted(os.listdir(dataset_base_path)):
+        image_path = get_waifu_image_path(waifu_name, dataset_base_path)
+        image = cv2.imread(image_path) if image_path else None
+        if image is not None:
+            images.append(image)
+        if len(images) >= limit:
+            break
+    return images
+
+
+def pipeline_config(args):
+    """PipelineConfig benchmark: deteksi setiap --detection-interval frame setelah hasil sebelumnya diterapkan."""
+    return PipelineConfig(target_fps=args.target_fps, detection_worker_mode=args.detection_worker,
+                          min_detection_interval=args.detection_interval,
+                          max_detection_interval=args.detection_interval, tracker_type=args.tracker,
+                          track_refresh_interval=2.0, track_min_confidence=70.0, detection_scale=args.scale,
+                          motion_gating=args.motion_gating, detector=args.detector, detection_budget=1.0)
+
+
+def run_pipeline(camera, matcher, thumbnail_store, n_frames, config):
+    """Menjalankan process_frames() untuk n_frames frame dari camera dan mengukur setiap tahap."""
+    before = stage_histograms()
+    frames = process_frames(camera, matcher, thumbnail_store, lambda comparison_data: None, config)
+    n_done = 0
+    start = time.perf_counter()
+    try:
+        for _ in frames:
+            n_done += 1
+            if n_done >= n_frames:
+                break
+    finally:
+        frames.close()
+    elapsed = time.perf_counter() - start
+
+    stages = stage_summary(before, stage_histograms())
+    return {
+        "frames": n_done,
+        "seconds": round(elapsed, 3),
+        "fps": round(n_done / elapsed, 2) if elapsed > 0 else None,
+        "detections": stages.get("detection", {}).get("count", 0),
+        "stages": stages,
+    }
+
+
+def environment_info():
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def compare_reports(current, baseline, tolerance):
+    """Mencetak perubahan FPS & p50 per tahap terhadap laporan lama; True jika ada regresi."""
+    baseline_runs = {(run["gallery_size"], run["faces_per_frame"]): run for run in baseline["runs"]}
+    regressed = False
+    print(f"\n{'run':<28}{'tahap':<16}{'lama':>10}{'baru':>10}{'ubah':>9}")
+    for run in current["runs"]:
+        key = (run["gallery_size"], run["faces_per_frame"])
+        old = baseline_runs.get(key)
+        if old is None:
+            continue
+        label = f"galeri={key[0]} wajah={key[1]}"
+        rows = [("fps", old["fps"], run["fps"], True)]
+        rows += [(stage, old["stages"][stage]["p50_ms"], stats["p50_ms"], False)
+                 for stage, stats in run["stages"].items() if stage in old["stages"]]
+        for stage, old_value, new_value, higher_is_better in rows:
+            if not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if higher_is_better else change
+            marker = " !" if worse > tolerance else ""
+            regressed = regressed or bool(marker)
+            print(f"{label:<28}{stage:<16}{old_value:>10.3f}{new_value:>10.3f}{change * 100:>8.1f}%{marker}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per tahap pipeline pencocokan waifu dengan kamera palsu.")
+    parser.add_argument("--video", default=None, help="Video rekaman sebagai sumber frame (default: frame sintetis)")
+    parser.add_argument("--faces-dir", default="waifu_dataset", help="Sumber gambar wajah untuk frame sintetis")
+    parser.add_argument("--faces", default="1,4", help="Jumlah wajah per frame sintetis, dipisah koma")
+    parser.add_argument("--gallery-sizes", default="1000,10000,100000", help="Ukuran galeri sintetis, dipisah koma")
+    parser.add_argument("--gallery", default=None, help="Pakai galeri asli (folder/pickle) sebagai pengganti galeri sintetis")
+    parser.add_argument("--frames", type=int, default=120, help="Jumlah frame per run")
+    parser.add_argument("--detection-interval", type=int, default=5,
+                        help="Jeda N frame antara hasil deteksi diterapkan dan deteksi berikutnya")
+    parser.add_argument("--detection-worker", default="thread", choices=("thread", "process"),
+                        help="Mode worker deteksi (server memakai 'process' secara default)")
+    parser.add_argument("--target-fps", type=int, default=1000,
+                        help="Target FPS loop frame; default tinggi agar loop tidak ditahan pembatas FPS")
+    parser.add_argument("--no-motion-gating", dest="motion_gating", action="store_false",
+                        help="Selalu deteksi seluruh frame (tanpa gating gerakan/ROI)")
+    parser.add_argument("--scale", type=float, default=0.25, help="Skala frame sebelum deteksi")
+    parser.add_argument("--detector", default="hog", help="Backend detektor (hog, haar, lbp:<xml>, dnn:<model>[,<config>])")
+    parser.add_argument("--tracker", default="CSRT", help="Tipe tracker (CSRT/KCF/MOSSE)")
+    parser.add_argument("--output", default=None, help="Simpan hasil ke file JSON")
+    parser.add_argument("--compare", default=None, help="File JSON hasil lama untuk dibandingkan")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Batas regresi relatif (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    if args.gallery:
+        matcher = load_matcher(args.gallery, args.gallery)
+        galleries = [(len(matcher), matcher)]
+    else:
+        galleries = [(size, None) for size in (int(v) for v in args.gallery_sizes.split(",") if v.strip())]
+
+    if args.video:
+        camera_factories = [(None, lambda: FakeCamera.from_video(args.video, args.frames))]
+    else:
+        face_images = load_face_images(args.faces_dir)
+        if not face_images:
+            print(f"Peringatan: Tidak ada gambar wajah di '{args.faces_dir}'; frame sintetis tidak berisi wajah.")
+        camera_factories = [(faces, lambda faces=faces: FakeCamera.synthetic(face_images, faces, args.frames))
+                            for faces in (int(v) for v in args.faces.split(",") if v.strip())]
+
+    config = pipeline_config(args)
+    thumbnail_store = ThumbnailStore(args.faces_dir, recheck_interval=None)
+    report = {"environment": environment_info(), "config": vars(args), "runs": []}
+    for gallery_size, matcher in galleries:
+        if matcher is None:
+            matcher = synthetic_gallery(gallery_size)
+        for faces_per_frame, make_camera in camera_factories:
+            result = run_pipeline(make_camera(), matcher, thumbnail_store, args.frames, config)
+            result.update({"gallery_size": gallery_size, "faces_per_frame": faces_per_frame})
+            report["runs"].append(result)
+
+            print(f"\n[galeri={gallery_size} wajah/frame={faces_per_frame}] {result['fps']} FPS "
+                  f"({result['detections']} deteksi)")
+            for stage, stats in result["stages"].items():
+                print(f"  {stage:<16} p50 {stats['p50_ms']:>8.2f} ms   p90 {stats['p90_ms']:>8.2f} ms   p99 {stats['p99_ms']:>8.2f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[INFO] Hasil disimpan ke {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_reports(report, baseline, args.tolerance):
+            print(f"\n[PERINGATAN] Ada tahap yang melambat lebih dari {args.tolerance * 100:.0f}% (ditandai '!').")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
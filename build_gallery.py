@@ -0,0 +1,122 @@
+import argparse
+import os
+import pickle
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from gallery import ENCODING_DIM, MANIFEST_FILENAME, load_gallery, save_gallery
+from thumbnails import IMAGE_EXTENSIONS
+
+# --- Membangun galeri waifu (format mmap) dari waifu_dataset/ ---
+# Contoh:
+#   python build_gallery.py                          # build inkremental ke waifu_gallery/
+#   python build_gallery.py --rebuild --workers 8    # encode ulang semua gambar
+#   python build_gallery.py --from-pickle waifu_encodings.pickle
+# Mode inkremental hanya meng-encode gambar yang belum tercatat di manifest.
+# Gambar/folder yang dihapus baru hilang dari galeri setelah --rebuild.
+
+
+def list_dataset_images(dataset_base_path):
+    images = []
+    for waifu_name in sorted(os.listdir(dataset_base_path)):
+        waifu_folder = os.path.join(dataset_base_path, waifu_name)
+        if not os.path.isdir(waifu_folder):
+            continue
+        for filename in sorted(os.listdir(waifu_folder)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((waifu_name, os.path.join(waifu_name, filename)))
+    return images
+
+
+def encode_image(job):
+    # Dijalankan di proses worker
+    import face_recognition
+
+    dataset_base_path, waifu_name, relative_path = job
+    try:
+        image = face_recognition.load_image_file(os.path.join(dataset_base_path, relative_path))
+        encodings = face_recognition.face_encodings(image)
+    except Exception as e:
+        print(f"Peringatan: Gagal memproses {relative_path}: {e}")
+        return waifu_name, relative_path, None
+    if not encodings:
+        print(f"Peringatan: Tidak ada wajah terdeteksi di {relative_path}.")
+        return waifu_name, relative_path, None
+    return waifu_name, relative_path, np.asarray(encodings[0], dtype=np.float32)
+
+
+def load_existing(gallery_path):
+    if not os.path.exists(os.path.join(gallery_path, MANIFEST_FILENAME)):
+        return np.empty((0, ENCODING_DIM), dtype=np.float32), [], []
+    encodings, _, manifest = load_gallery(gallery_path)
+    return encodings, manifest["names"], manifest["sources"]
+
+
+def build_gallery(dataset_base_path, gallery_path, workers=None, rebuild=False):
+    """Meng-encode gambar dataset yang belum ada di galeri lalu menyimpan galeri.
+
+    workers: jumlah proses encoding (None = jumlah CPU, 1 = tanpa pool).
+    Mengembalikan manifest galeri, atau None jika galeri sudah terbaru.
+    """
+    workers = workers or os.cpu_count()
+    if rebuild:
+        existing_encodings, existing_names, existing_sources = np.empty((0, ENCODING_DIM), dtype=np.float32), [], []
+    else:
+        existing_encodings, existing_names, existing_sources = load_existing(gallery_path)
+
+    known_sources = set(source for source in existing_sources if source)
+    jobs = [(dataset_base_path, waifu_name, relative_path)
+            for waifu_name, relative_path in list_dataset_images(dataset_base_path)
+            if relative_path not in known_sources]
+    print(f"[INFO] {len(existing_names)} enkripsi sudah ada, {len(jobs)} gambar baru akan di-encode dengan {workers} proses.")
+    if not jobs:
+        print("[INFO] Galeri sudah terbaru.")
+        return None
+
+    start = time.perf_counter()
+    new_encodings, new_names, new_sources = [], [], []
+    pool = Pool(processes=workers) if workers > 1 else None
+    try:
+        results = pool.imap(encode_image, jobs, chunksize=4) if pool is not None else map(encode_image, jobs)
+        for done, (waifu_name, relative_path, encoding) in enumerate(results, 1):
+            if encoding is not None:
+                new_encodings.append(encoding)
+                new_names.append(waifu_name)
+                new_sources.append(relative_path)
+            if done % 100 == 0:
+                print(f"[INFO] {done}/{len(jobs)} gambar diproses...")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    encodings = np.concatenate([existing_encodings, np.asarray(new_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)])
+    manifest = save_gallery(gallery_path, encodings, existing_names + new_names, existing_sources + new_sources)
+    print(f"[INFO] {len(new_names)} enkripsi baru ditambahkan dalam {time.perf_counter() - start:.1f} detik. "
+          f"Total {manifest['count']} enkripsi di {gallery_path}/")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Membangun galeri waifu ter-memory-map dari waifu_dataset/.")
+    parser.add_argument("--dataset", default="waifu_dataset", help="Folder dataset waifu")
+    parser.add_argument("--output", default="waifu_gallery", help="Folder galeri output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Jumlah proses encoding (1 = tanpa pool)")
+    parser.add_argument("--rebuild", action="store_true", help="Abaikan galeri lama dan encode ulang semuanya")
+    parser.add_argument("--from-pickle", default=None, help="Konversi file pickle lama (encodings, names) tanpa encode ulang")
+    args = parser.parse_args()
+
+    if args.from_pickle:
+        with open(args.from_pickle, "rb") as f:
+            encodings, names = pickle.load(f)
+        manifest = save_gallery(args.output, encodings, names)
+        print(f"[INFO] {manifest['count']} enkripsi dari '{args.from_pickle}' disimpan ke {args.output}/")
+        return
+
+    build_gallery(args.dataset, args.output, args.workers, args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+from gallery import MANIFEST_FILENAME, GalleryMatcher, IVFIndex, file_checksum, load_gallery
+
+# --- Membangun indeks IVF secara offline + laporan recall/latensi ---
+# Contoh:
+#   python build_index.py --encodings waifu_gallery --output waifu_index
+# Lalu jalankan match.py dengan WAIFU_INDEX_PATH=waifu_index
+# Indeks menyimpan checksum galeri sumbernya; setelah build_gallery.py menambah
+# identitas, indeks lama diabaikan (dengan peringatan) sampai dibangun ulang.
+
+
+def load_encodings(path):
+    """Menerima folder galeri (build_gallery.py) atau file pickle lama.
+
+    Mengembalikan (encodings, names, checksum galeri)."""
+    if os.path.exists(os.path.join(path, MANIFEST_FILENAME)):
+        encodings, _, manifest = load_gallery(path)
+        return np.asarray(encodings), manifest["names"], manifest["checksum"]
+    with open(path, "rb") as f:
+        encodings, names = pickle.load(f)
+    return np.asarray(encodings, dtype=np.float32), list(names), file_checksum(path)
+
+
+def make_queries(encodings, n_queries, noise, seed=0):
+    # Kueri sintetis: enkripsi galeri yang diberi sedikit derau,
+    # meniru wajah yang sama difoto ulang dari kamera
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(encodings), min(n_queries, len(encodings)), replace=False)
+    return encodings[picked] + rng.normal(0.0, noise, size=(len(picked), encodings.shape[1])).astype(np.float32)
+
+
+def time_queries(matcher, queries, k):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(matcher.match(query[None, :], k=k)[0])
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return results, np.asarray(latencies)
+
+
+def recall(approx_results, exact_results, k):
+    top1_hits = 0
+    topk_hits = 0.0
+    for approx, exact in zip(approx_results, exact_results):
+        if approx and exact and approx[0][0] == exact[0][0]:
+            top1_hits += 1
+        exact_names = {name for name, _ in exact[:k]}
+        if exact_names:
+            topk_hits += len(exact_names & {name for name, _ in approx[:k]}) / len(exact_names)
+    return top1_hits / len(exact_results), topk_hits / len(exact_results)
+
+
+def latency_summary(latencies):
+    return {
+        "mean_ms": round(float(latencies.mean()), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Membangun indeks IVF dari galeri waifu dan membandingkannya dengan pencarian eksak.")
+    parser.add_argument("--encodings", default="waifu_encodings.pickle", help="Folder galeri atau file pickle (encodings, names)")
+    parser.add_argument("--output", default="waifu_index", help="Folder indeks IVF")
+    parser.add_argument("--n-lists", type=int, default=None, help="Jumlah daftar k-means (default: sqrt(N))")
+    parser.add_argument("--n-iter", type=int, default=20, help="Iterasi k-means")
+    parser.add_argument("--n-probe", default="1,4,8,16,32", help="Daftar nilai n_probe yang dilaporkan, dipisah koma")
+    parser.add_argument("--queries", type=int, default=500, help="Jumlah kueri untuk laporan")
+    parser.add_argument("--noise", type=float, default=0.03, help="Simpangan baku derau kueri sintetis")
+    parser.add_argument("--k", type=int, default=5, help="k untuk recall@k")
+    parser.add_argument("--report", default=None, help="Simpan laporan ke file JSON")
+    args = parser.parse_args()
+
+    encodings, names, gallery_checksum = load_encodings(args.encodings)
+    print(f"[INFO] Galeri dimuat: {len(names)} enkripsi.")
+
+    start = time.perf_counter()
+    index = IVFIndex.build(encodings, names, n_lists=args.n_lists, n_iter=args.n_iter, gallery_checksum=gallery_checksum)
+    build_seconds = time.perf_counter() - start
+    index.save(args.output)
+    print(f"[INFO] Indeks IVF ({index.n_lists} daftar) dibangun dalam {build_seconds:.1f} detik dan disimpan ke {args.output}")
+
+    queries = make_queries(encodings, args.queries, args.noise)
+    exact_results, exact_latencies = time_queries(GalleryMatcher(encodings, names), queries, args.k)
+
+    report = {
+        "gallery_size": len(names),
+        "n_lists": index.n_lists,
+        "build_seconds": round(build_seconds, 3),
+        "queries": len(queries),
+        "k": args.k,
+        "exact": latency_summary(exact_latencies),
+        "ivf": [],
+    }
+
+    print(f"\n{'metode':<16}{'recall@1':>10}{f'recall@{args.k}':>10}{'mean ms':>10}{'p95 ms':>10}")
+    print(f"{'eksak':<16}{1.0:>10.3f}{1.0:>10.3f}{report['exact']['mean_ms']:>10.3f}{report['exact']['p95_ms']:>10.3f}")
+    for n_probe in [int(v) for v in args.n_probe.split(",") if v.strip()]:
+        index.n_probe = n_probe
+        ivf_results, ivf_latencies = time_queries(index, queries, args.k)
+        recall_1, recall_k = recall(ivf_results, exact_results, args.k)
+        entry = {"n_probe": n_probe, "recall@1": round(recall_1, 4), f"recall@{args.k}": round(recall_k, 4)}
+        entry.update(latency_summary(ivf_latencies))
+        report["ivf"].append(entry)
+        print(f"{f'ivf n_probe={n_probe}':<16}{recall_1:>10.3f}{recall_k:>10.3f}{entry['mean_ms']:>10.3f}{entry['p95_ms']:>10.3f}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[INFO] Laporan disimpan ke {args.report}")
+
+
+if __name__ == "__main__":
+    main()
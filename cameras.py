@@ -0,0 +1,323 @@
+import multiprocessing
+import queue
+import re
+import threading
+import time
+
+from capture import LatestFrameGrabber, open_source
+from comparison import ComparisonCache, ComparisonState, DebugImageWriter
+from events import event_thumbnail
+from gallery import attach_matcher
+from metrics import pipeline_registry
+from pipeline import process_frames
+from thumbnails import ThumbnailStore
+
+# --- Kamera: satu pipeline per kamera ---
+# Mode "thread": pipeline berjalan di thread proses server (cukup untuk satu kamera).
+# Mode "process": setiap kamera punya proses sendiri dengan galeri di shared
+# memory, sehingga beberapa kamera tidak berebut satu GIL. Proses kamera
+# mengirim bytes JPEG, data perbandingan, kejadian pencocokan, dan metrik ke
+# server lewat pipe; log kejadian hanya ditulis oleh proses server.
+
+CAMERA_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+# Seberapa sering proses kamera mengirim metrik pipeline ke server (detik)
+METRICS_INTERVAL = 1.0
+
+
+def parse_camera_sources(spec):
+    """"0,1" atau "lobby=0,booth=/data/booth.mp4" -> dict {id kamera: sumber} sesuai urutan.
+
+    Tanpa nama, id kamera adalah posisinya dalam daftar ("0", "1", ...).
+    """
+    cameras = {}
+    for position, entry in enumerate(part.strip() for part in spec.split(",") if part.strip()):
+        camera_id, separator, source = entry.partition("=")
+        if not separator:
+            camera_id, source = str(position), entry
+        camera_id, source = camera_id.strip(), source.strip()
+        if not CAMERA_ID_PATTERN.match(camera_id):
+            raise ValueError(f"Id kamera tidak valid: '{camera_id}' (hanya huruf, angka, '_' dan '-').")
+        if camera_id in cameras:
+            raise ValueError(f"Id kamera ganda: '{camera_id}'.")
+        cameras[camera_id] = source
+    if not cameras:
+        raise ValueError("Tidak ada kamera yang dikonfigurasi.")
+    return cameras
+
+
+class FrameBroadcaster:
+    """Menjalankan frame_source() di thread latar belakang dan menyebarkan
+    bytes JPEG yang sama ke semua subscriber.
+
+    Setiap subscriber memiliki buffer sendiri yang dibatasi ukurannya; jika
+    penuh (klien lambat), frame terlama dibuang sehingga loop kamera tidak
+    pernah menunggu browser mana pun.
+    """
+
+    def __init__(self, frame_source, subscriber_buffer_size=2, name="frame-broadcaster"):
+        self.frame_source = frame_source
+        self.subscriber_buffer_size = subscriber_buffer_size
+        self.name = name
+        self.frame_drops = 0  # frame yang dibuang karena buffer subscriber penuh
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.is_running():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def subscribe(self, subscriber=None):
+        """subscriber: objek dengan put_nowait() (mis. jembatan ke event loop asyncio); default queue baru."""
+        if subscriber is None:
+            subscriber = queue.Queue(maxsize=self.subscriber_buffer_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        # Mulai ulang pipeline jika belum berjalan atau sudah berhenti sebelumnya
+        self.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _publish(self, frame_bytes):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(frame_bytes)
+            except queue.Full:
+                # Klien lambat: buang frame terlama, simpan yang terbaru
+                try:
+                    subscriber.get_nowait()
+                    self.frame_drops += 1
+                except queue.Empty:
+                    pass
+                try:
+                    subscriber.put_nowait(frame_bytes)
+                except queue.Full:
+                    pass
+
+    def _run(self):
+        try:
+            for frame_bytes in self.frame_source():
+                self._publish(frame_bytes)
+        except Exception as e:
+            print(f"Error tak terduga di pipeline broadcaster: {e}")
+        finally:
+            # None sebagai penanda bahwa pipeline berhenti
+            self._publish(None)
+
+
+class _Camera:
+    """Bagian yang sama untuk kedua mode: state perbandingan dan broadcaster di proses server."""
+
+    def __init__(self, camera_id, source, loop, config, debug_dump=False, event_log=None):
+        self.camera_id = camera_id
+        self.source = source
+        self.loop = loop
+        self.config = config
+        self.event_log = event_log
+        self.comparison = ComparisonState()
+        # JPEG gambar perbandingan di-cache per generasi data; debug dump ke disk hanya jika diaktifkan
+        self.comparison_cache = ComparisonCache(
+            debug_writer=DebugImageWriter(f"debug_combined_img_{camera_id}.jpg") if debug_dump else None)
+        self.broadcaster = FrameBroadcaster(self._frames, name=f"frame-broadcaster-{camera_id}")
+
+    def _frames(self):
+        raise NotImplementedError
+
+    def start(self):
+        self.broadcaster.start()
+
+    def record_match(self, timestamp, track_id, name, similarity, thumbnail_rgb):
+        if self.event_log is not None:
+            self.event_log.record(self.camera_id, track_id, name, similarity, thumbnail_rgb, timestamp)
+
+
+class LocalCamera(_Camera):
+    """Pipeline di thread proses server (mode "thread")."""
+
+    def __init__(self, camera_id, source, loop, config, matcher, thumbnail_store, debug_dump=False, event_log=None):
+        super().__init__(camera_id, source, loop, config, debug_dump, event_log)
+        self.matcher = matcher
+        self.thumbnail_store = thumbnail_store
+        self.video_stream = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        with self._lock:
+            if self.video_stream is None or not self.video_stream.isOpened():
+                print(f"[INFO] Mencoba membuka sumber frame '{self.source}' (kamera {self.camera_id})...")
+                temp_cap, live = open_source(self.source, fps=self.config.target_fps)
+
+                if not temp_cap.isOpened():
+                    print("Error: Tidak dapat membuka webcam saat startup. Pastikan webcam terhubung dengan benar, drivernya terinstal, dan tidak sedang digunakan oleh aplikasi lain (misalnya Zoom, Skype, aplikasi Kamera).")
+                    temp_cap.release()
+                    self.video_stream = None
+                else:
+                    # Thread grabber selalu menyimpan frame terbaru; frame lama di buffer driver tidak pernah diproses
+                    self.video_stream = LatestFrameGrabber(temp_cap, live=live, loop=self.loop)
+                    print(f"Webcam (kamera {self.camera_id}) berhasil diinisialisasi.")
+            return self.video_stream is not None
+
+    def _frames(self):
+        self.open()
+        on_match = None
+        if self.event_log is not None:
+            thumbnails = self.event_log.store_thumbnails
+
+            def on_match(track_id, name, similarity, face_rgb):
+                self.record_match(time.time(), track_id, name, similarity,
+                                  event_thumbnail(face_rgb) if thumbnails else None)
+        return process_frames(self.video_stream, self.matcher, self.thumbnail_store, self.comparison.update, self.config,
+                              on_match)
+
+    def start(self):
+        self.open()
+        super().start()
+
+    def stop(self):
+        with self._lock:
+            if self.video_stream is not None:
+                self.video_stream.release()
+                print(f"Webcam (kamera {self.camera_id}) berhasil dilepaskan.")
+                self.video_stream = None
+
+    def pipeline_metrics(self):
+        return pipeline_registry.collect()
+
+
+def run_camera_process(camera_id, source, loop, config, gallery_handle, thumbnail_options, connection, stop_event,
+                       record_events=False, event_thumbnails=False):
+    """Titik masuk proses kamera: pipeline penuh, hasilnya dikirim ke server lewat connection."""
+    print(f"[INFO] Proses kamera {camera_id} dimulai (sumber '{source}').")
+    matcher = attach_matcher(gallery_handle)
+    try:
+        thumbnail_store = ThumbnailStore(max_items=thumbnail_options["max_items"],
+                                         memmap_path=thumbnail_options["memmap_path"])
+    except Exception as e:
+        print(f"Peringatan: Gagal memuat thumbnail memmap '{thumbnail_options['memmap_path']}': {e}. Thumbnail dibaca dari disk.")
+        thumbnail_store = ThumbnailStore(max_items=thumbnail_options["max_items"])
+    if thumbnail_options["preload"]:
+        thumbnail_store.preload(matcher.names)
+
+    capture, live = open_source(source, fps=config.target_fps)
+    if not capture.isOpened():
+        print(f"Error: Tidak dapat membuka sumber frame '{source}' untuk kamera {camera_id}.")
+        capture.release()
+        connection.close()
+        return
+    video_stream = LatestFrameGrabber(capture, live=live, loop=loop)
+
+    # Saat sumber tersendat, loop frame tertahan di video_stream.read() dan tidak sempat memeriksa
+    # stop_event; thread ini membangunkannya agar stop() tidak perlu terminate()
+    def stop_when_requested():
+        stop_event.wait()
+        video_stream.stop()
+    threading.Thread(target=stop_when_requested, name=f"camera-{camera_id}-stop", daemon=True).start()
+
+    on_match = None
+    if record_events:
+        # Thumbnail (jika diaktifkan) diperkecil di sini agar yang dikirim lewat pipe hanya beberapa puluh KB
+        def on_match(track_id, name, similarity, face_rgb):
+            thumbnail_rgb = event_thumbnail(face_rgb) if event_thumbnails else None
+            connection.send(("match", (time.time(), track_id, name, similarity, thumbnail_rgb)))
+
+    frames = process_frames(video_stream, matcher, thumbnail_store,
+                            lambda data: connection.send(("comparison", data)), config, on_match)
+    next_metrics_at = 0.0
+    try:
+        for frame_bytes in frames:
+            connection.send(("frame", frame_bytes))
+            now = time.monotonic()
+            if now >= next_metrics_at:
+                connection.send(("metrics", pipeline_registry.collect()))
+                next_metrics_at = now + METRICS_INTERVAL
+            if stop_event.is_set():
+                break
+    except (BrokenPipeError, EOFError, OSError):
+        # Server sudah menutup pipe
+        pass
+    finally:
+        frames.close()
+        video_stream.release()
+        thumbnail_store.close()
+        connection.close()
+        print(f"[INFO] Proses kamera {camera_id} berhenti.")
+
+
+class CameraProcess(_Camera):
+    """Pipeline di proses terpisah (mode "process").
+
+    Proses dijalankan ulang oleh FrameBroadcaster jika berhenti dan ada
+    penonton baru, sama seperti pipeline di mode thread.
+    """
+
+    def __init__(self, camera_id, source, loop, config, gallery_handle, thumbnail_options, debug_dump=False,
+                 event_log=None):
+        super().__init__(camera_id, source, loop, config, debug_dump, event_log)
+        self.gallery_handle = gallery_handle
+        self.thumbnail_options = thumbnail_options
+        self._metrics = []
+        self._process = None
+        self._stop_event = None
+
+    def _frames(self):
+        # spawn: aman dipakai dari thread, dan proses kamera tidak mewarisi state server
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        stop_event = context.Event()
+        process = context.Process(target=run_camera_process, name=f"camera-{self.camera_id}",
+                                  args=(self.camera_id, self.source, self.loop, self.config, self.gallery_handle,
+                                        self.thumbnail_options, sender, stop_event, self.event_log is not None,
+                                        self.event_log is not None and self.event_log.store_thumbnails))
+        process.start()
+        # Hanya proses kamera yang memegang ujung kirim, sehingga recv() mendapat EOF saat proses berhenti
+        sender.close()
+        self._process, self._stop_event = process, stop_event
+        try:
+            while True:
+                try:
+                    kind, payload = receiver.recv()
+                except (EOFError, OSError):
+                    break
+                if kind == "frame":
+                    yield payload
+                elif kind == "comparison":
+                    self.comparison.update(payload)
+                elif kind == "match":
+                    self.record_match(*payload)
+                elif kind == "metrics":
+                    self._metrics = payload
+        finally:
+            stop_event.set()
+            receiver.close()
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def stop(self):
+        process, stop_event = self._process, self._stop_event
+        if process is None:
+            return
+        stop_event.set()
+        process.join(timeout=5)
+        if process.is_alive():
+            print(f"Peringatan: Proses kamera {self.camera_id} tidak berhenti, dihentikan paksa.")
+            process.terminate()
+            process.join(timeout=1)
+
+    def pipeline_metrics(self):
+        return self._metrics
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+
+import cv2
+
+from thumbnails import IMAGE_EXTENSIONS
+
+# --- Sumber frame & thread capture "frame terbaru" ---
+# Thread grabber membaca kamera terus-menerus dan hanya menyimpan frame
+# terbaru. Loop pemrosesan yang tertinggal tidak lagi mendapat frame lama dari
+# buffer driver; frame yang terlewat dihitung sebagai drop.
+# Sumber yang didukung (WAIFU_CAPTURE_SOURCE):
+#   "0", "1", ...          -> indeks webcam
+#   folder                 -> urutan gambar (diurutkan berdasarkan nama file)
+#   file video / URL rtsp  -> cv2.VideoCapture
+
+
+class ImageSequenceCapture:
+    """Folder gambar yang dibaca seperti cv2.VideoCapture (satu gambar per frame)."""
+
+    def __init__(self, directory, fps=30.0):
+        self.directory = directory
+        self.fps = fps
+        self.paths = sorted(os.path.join(directory, filename) for filename in os.listdir(directory)
+                            if filename.lower().endswith(IMAGE_EXTENSIONS))
+        self._index = 0
+        self._opened = bool(self.paths)
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        while self._opened and self._index < len(self.paths):
+            frame = cv2.imread(self.paths[self._index])
+            self._index += 1
+            if frame is not None and frame.size > 0:
+                return True, frame
+            print(f"Peringatan: Gagal membaca gambar {self.paths[self._index - 1]}. Dilewati.")
+        return False, None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.paths))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._index)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._index = int(value)
+            return True
+        if prop == cv2.CAP_PROP_FPS:
+            self.fps = value
+            return True
+        return False
+
+    def release(self):
+        self._opened = False
+
+
+def open_source(spec, width=640, height=480, fps=30):
+    """Membuka sumber frame dari string konfigurasi.
+
+    Mengembalikan (capture, live): live=True untuk webcam (laju diatur driver),
+    False untuk file/folder yang perlu diputar sesuai FPS-nya sendiri.
+    """
+    spec = str(spec).strip()
+    if spec.isdigit():
+        capture = cv2.VideoCapture(int(spec))
+        if capture.isOpened():
+            capture.set(cv2.CAP_PROP_FPS, fps)
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            # Buffer driver sekecil mungkin; tidak semua backend mendukungnya
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return capture, True
+    if os.path.isdir(spec):
+        return ImageSequenceCapture(spec, fps=fps), False
+    capture = cv2.VideoCapture(spec)
+    # Stream jaringan (rtsp/http) berjalan real-time seperti webcam
+    return capture, "://" in spec
+
+
+class LatestFrameGrabber:
+    """Membaca sumber frame di thread sendiri dan hanya menyimpan frame terbaru.
+
+    API-nya meniru cv2.VideoCapture (isOpened/read/get/set/release) sehingga
+    bisa dipakai sebagai video_stream. read() menunggu frame yang belum pernah
+    diambil, lalu mencatat umurnya (staleness).
+
+    Penghitung:
+      frames_captured: frame yang dibaca dari sumber
+      frames_dropped: frame yang ditimpa sebelum sempat diambil read()
+      frame_age: umur frame terakhir yang dikembalikan read() (detik)
+    """
+
+    def __init__(self, capture, live=True, loop=False, read_timeout=1.0):
+        self.capture = capture
+        self.live = live
+        self.loop = loop
+        self.read_timeout = read_timeout
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frame_age = 0.0
+        self._condition = threading.Condition()
+        self._frame = None
+        self._captured_at = None
+        self._sequence = 0
+        self._read_sequence = 0
+        self._running = capture.isOpened()
+        self._thread = None
+        if self._running:
+            self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            self._capture_loop()
+        except Exception as e:
+            # Driver/RTSP bisa melempar exception dari read()/set(); stream diakhiri, bukan menggantung
+            print(f"Error: Thread capture berhenti karena exception: {e}")
+        finally:
+            with self._condition:
+                self._running = False
+                self._condition.notify_all()
+
+    def _capture_loop(self):
+        fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_period = 1.0 / fps
+        next_frame_at = time.perf_counter()
+        while self._running:
+            ret, frame = self.capture.read()
+            if not ret or frame is None:
+                if self.loop and not self.live and self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                    continue
+                print("[INFO] Sumber frame habis atau gagal dibaca. Thread capture berhenti.")
+                break
+
+            with self._condition:
+                if self._sequence > self._read_sequence:
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._captured_at = time.perf_counter()
+                self._sequence += 1
+                self.frames_captured += 1
+                self._condition.notify_all()
+
+            if not self.live:
+                # File/folder diputar sesuai FPS aslinya, bukan secepat decode
+                next_frame_at += frame_period
+                delay = next_frame_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame_at = time.perf_counter()
+
+    def isOpened(self):
+        with self._condition:
+            return self._running or self._sequence > self._read_sequence
+
+    def read(self):
+        """Mengembalikan (True, frame terbaru yang belum diambil), atau (False, None)
+        hanya jika sumber berhenti. Sumber yang tersendat (warm-up webcam, USB,
+        jitter RTSP) ditunggu; peringatan dicetak setiap read_timeout detik."""
+        with self._condition:
+            stalled_since = None
+            while self._sequence <= self._read_sequence:
+                if not self._running:
+                    return False, None
+                if not self._condition.wait(timeout=self.read_timeout):
+                    stalled_since = stalled_since or time.perf_counter() - self.read_timeout
+                    print(f"Peringatan: Tidak ada frame baru selama {time.perf_counter() - stalled_since:.1f} detik; menunggu sumber frame...")
+            self._read_sequence = self._sequence
+            self.frame_age = time.perf_counter() - self._captured_at
+            return True, self._frame
+
+    def get(self, prop):
+        return self.capture.get(prop)
+
+    def set(self, prop, value):
+        return self.capture.set(prop, value)
+
+    def stop(self):
+        """Menghentikan thread capture dan membangunkan read() yang sedang menunggu, tanpa melepas sumber."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+    def release(self):
+        self.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.capture.release()
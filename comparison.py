@@ -0,0 +1,229 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# --- Gambar perbandingan untuk /compare_frame ---
+# Gambar gabungan hanya dirender dan di-encode ulang saat data perbandingan
+# berubah (kunci cache = nomor generasi); polling selanjutnya memakai bytes
+# JPEG yang sama dan ETag yang sama sehingga browser cukup menerima 304.
+
+PADDING = 50 # Padding lebih besar
+# --- PERBAIKAN: Meningkatkan text_area_height untuk ruang teks yang lebih besar ---
+TEXT_AREA_HEIGHT = 200 # Ditingkatkan lagi dari 180
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 1.0 # Skala font lebih besar
+FONT_THICKNESS = 2
+TEXT_COLOR = (255, 255, 255)
+
+
+def render_placeholder(text):
+    placeholder_img = np.zeros((350, 700, 3), dtype=np.uint8) # Diperbesar placeholder
+    cv2.putText(placeholder_img, text, (70, 175), FONT, 1.2, (255, 255, 255), 2) # Teks diperbesar
+    return placeholder_img
+
+
+_template_cache = {}
+
+
+def _comparison_template(h1, w1, h2, w2):
+    """Latar belakang + teks statis, dibuat sekali per kombinasi ukuran gambar."""
+    key = (h1, w1, h2, w2)
+    template = _template_cache.get(key)
+    if template is None:
+        combined_width = w1 + w2 + PADDING * 3
+        combined_height = max(h1, h2) + PADDING * 2 + TEXT_AREA_HEIGHT
+        template = np.full((combined_height, combined_width, 3), 50, dtype=np.uint8)
+        cv2.putText(template, "Wajah Anda", (PADDING, PADDING + h1 + 90), FONT, FONT_SCALE, TEXT_COLOR, FONT_THICKNESS)
+        _template_cache[key] = template
+    return template
+
+
+def render_comparison(user_face_rgb, waifu_face_rgb, waifu_name, similarity):
+    """Menggabungkan wajah pengguna dan waifu menjadi satu gambar BGR siap di-encode."""
+    h1, w1, _ = user_face_rgb.shape
+    h2, w2, _ = waifu_face_rgb.shape
+
+    # Dirender langsung dalam BGR: hanya kedua wajah yang perlu dikonversi, bukan seluruh kanvas
+    combined_img = _comparison_template(h1, w1, h2, w2).copy()
+    combined_img[PADDING:PADDING+h1, PADDING:PADDING+w1] = cv2.cvtColor(user_face_rgb, cv2.COLOR_RGB2BGR)
+    combined_img[PADDING:PADDING+h2, PADDING + w1 + PADDING:PADDING + w1 + PADDING + w2] = cv2.cvtColor(waifu_face_rgb, cv2.COLOR_RGB2BGR)
+
+    waifu_text = f"Waifu: {waifu_name}"
+    similarity_text = f"Kemiripan: {similarity:.2f}%"
+    cv2.putText(combined_img, waifu_text, (PADDING + w1 + PADDING, PADDING + h2 + 90), FONT, FONT_SCALE, TEXT_COLOR, FONT_THICKNESS)
+    cv2.putText(combined_img, similarity_text, (PADDING + w1 + PADDING, PADDING + h2 + 170), FONT, FONT_SCALE, TEXT_COLOR, FONT_THICKNESS)
+    return combined_img
+
+
+NO_COMPARISON = (None, None, "Tidak Ada", 0.0)
+
+
+class ComparisonState:
+    """Data perbandingan terakhir yang berhasil untuk satu kamera.
+
+    Data dibuat "lengket": hanya diganti saat ada wajah baru yang dikenali.
+    generation naik setiap pembaruan dan dipakai sebagai kunci cache
+    /compare_frame. drops menghitung pembaruan yang tertimpa sebelum sempat
+    diambil oleh /compare_frame.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = NO_COMPARISON
+        self._detection_time = time.time() # Waktu terakhir deteksi wajah yang berhasil
+        self._consumed = True
+        self.generation = 0
+        self.drops = 0
+
+    def update(self, data):
+        """data: (wajah pengguna RGB, thumbnail waifu RGB, nama, kemiripan)."""
+        with self._lock:
+            if not self._consumed:
+                self.drops += 1
+            self._data = data
+            self._detection_time = time.time()
+            self._consumed = False
+            self.generation += 1
+
+    def snapshot(self):
+        """Mengembalikan (generation, data, detik sejak deteksi terakhir)."""
+        with self._lock:
+            self._consumed = True
+            return self.generation, self._data, time.time() - self._detection_time
+
+
+class DebugImageWriter:
+    """Menulis gambar debug ke disk di thread terpisah (hanya gambar terbaru yang disimpan)."""
+
+    def __init__(self, filename="debug_combined_img.jpg"):
+        self.filename = filename
+        self._pending = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, name="debug-image-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, image_bgr):
+        try:
+            self._pending.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._pending.put_nowait(image_bgr)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            image_bgr = self._pending.get()
+            try:
+                cv2.imwrite(self.filename, image_bgr)
+            except Exception as e_imwrite:
+                print(f"DEBUG [compare_frame]: Gagal menyimpan {self.filename}: {e_imwrite}")
+
+
+# Header untuk stream (tidak boleh disimpan) dan gambar perbandingan (boleh disimpan, wajib validasi ulang);
+# dipakai server Flask (match.py) dan server asyncio (stream_server.py)
+NO_STORE_HEADERS = {"Cache-Control": "no-cache, no-store, must-revalidate", "Pragma": "no-cache", "Expires": "0"}
+NO_CACHE_HEADERS = {"Cache-Control": "no-cache, must-revalidate", "Pragma": "no-cache", "Expires": "0"}
+
+
+class ComparisonCache:
+    """Menyimpan JPEG gambar perbandingan terakhir beserta ETag-nya."""
+
+    def __init__(self, debug_writer=None):
+        self.debug_writer = debug_writer
+        # Prefix unik per proses agar ETag lama tidak cocok lagi setelah restart
+        self._etag_prefix = f"cmp-{int(time.time() * 1000):x}"
+        self._lock = threading.Lock()
+        self._key = None
+        self._entry = None
+
+    def get(self, key, render):
+        """Mengembalikan (jpeg_bytes, etag) untuk key; render() hanya dipanggil jika key berubah.
+
+        render() mengembalikan gambar BGR, atau (gambar, False) jika hasilnya
+        tidak boleh di-cache (misalnya placeholder error).
+        """
+        with self._lock:
+            if key == self._key and self._entry is not None:
+                return self._entry
+
+            image_bgr = render()
+            cacheable = True
+            if isinstance(image_bgr, tuple):
+                image_bgr, cacheable = image_bgr
+
+            ret, buffer = cv2.imencode('.jpg', image_bgr)
+            if not ret or len(buffer) == 0:
+                print("DEBUG [compare_frame]: Gagal meng-encode gambar perbandingan ke JPEG (ret=False atau buffer kosong).")
+                ret, buffer = cv2.imencode('.jpg', render_placeholder("Encoding Failed!"))
+                return buffer.tobytes(), None
+
+            if self.debug_writer is not None:
+                self.debug_writer.submit(image_bgr)
+
+            if not cacheable:
+                return buffer.tobytes(), None
+
+            self._key = key
+            self._entry = (buffer.tobytes(), f"{self._etag_prefix}-{'-'.join(str(part) for part in key)}")
+            return self._entry
+
+
+def comparison_image(camera):
+    """(bytes JPEG, ETag atau None) gambar perbandingan kamera (LocalCamera/CameraProcess)."""
+    generation, comparison_data, seconds_since_detection = camera.comparison.snapshot()
+    user_face_to_display, waifu_face_to_display, waifu_name_to_display, similarity_to_display = comparison_data
+
+    # Kriteria untuk menampilkan placeholder:
+    # 1. Belum pernah ada deteksi yang berhasil (data perbandingan masih None)
+    # ATAU
+    # 2. Sudah lama tidak ada deteksi wajah yang berhasil (misal > 5 detik)
+    if (user_face_to_display is None or waifu_face_to_display is None) or \
+    (seconds_since_detection > 5 and waifu_name_to_display == "Tidak Ada"): # 5 detik tanpa deteksi
+        cache_key = ("placeholder",)
+
+        def render():
+            return render_placeholder("Menunggu Deteksi Wajah...")
+
+    # Jika ada data yang valid, gambar gabungan hanya dirender ulang saat generasinya berubah
+    else:
+        cache_key = (generation,)
+
+        def render():
+            try:
+                return render_comparison(user_face_to_display, waifu_face_to_display, waifu_name_to_display, similarity_to_display)
+            except ValueError as e:
+                print(f"ERROR: ValueError saat menempatkan gambar ke combined_img: {e}")
+                print(f"  user_face_to_display shape: {user_face_to_display.shape}")
+                print(f"  waifu_face_to_display shape: {waifu_face_to_display.shape}")
+                # Fallback to placeholder on error (tidak di-cache)
+                return render_placeholder("Image Combine Error!"), False
+
+    return camera.comparison_cache.get(cache_key, render)
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def comparison_response(camera, if_none_match=None):
+    """Isi respons /compare_frame: (status HTTP, headers, body); dipakai Flask dan server asyncio.
+
+    no-cache (bukan no-store): browser boleh menyimpan gambar, tetapi wajib
+    memvalidasi ulang dengan If-None-Match sehingga server bisa menjawab 304
+    tanpa body selama generasinya belum berubah.
+    """
+    frame_bytes, etag = comparison_image(camera)
+    headers = dict(NO_CACHE_HEADERS)
+    if etag is not None:
+        headers["ETag"] = f'"{etag}"'
+        if etag_matches(if_none_match, headers["ETag"]):
+            return 304, headers, b""
+    headers["Content-Type"] = "image/jpeg"
+    return 200, headers, frame_bytes
@@ -0,0 +1,3 @@
+# Berkas ini sengaja (hampir) kosong: keberadaannya di root repo membuat pytest
+# menambahkan folder ini ke sys.path, sehingga `pytest` biasa (bukan hanya
+# `python -m pytest`) bisa mengimpor modul seperti gallery, capture, dan events.
@@ -0,0 +1,177 @@
+import math
+import multiprocessing
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import face_recognition
+
+from detectors import get_detector
+from tracking import location_iou
+
+# --- Worker deteksi & encoding wajah di latar belakang ---
+# Loop streaming hanya mengirim frame kecil ke worker lalu lanjut melakukan
+# tracking; hasil deteksi diambil saat sudah siap. Setelah hasil diambil,
+# worker diistirahatkan beberapa frame sesuai latensi terukur dan budget CPU
+# (bagian waktu worker boleh sibuk), sehingga beban deteksi per kamera terbatas.
+
+# timings: {"detection": detik, "encoding": detik}; cycle_time: detik dari submit() sampai hasil diambil poll()
+# searched: kotak skala penuh yang diperiksa detektor, atau None untuk seluruh frame
+DetectionResult = namedtuple("DetectionResult", "frame frame_index locations encodings latency timings cycle_time searched error")
+
+# Potongan frame (RGB, sudah diskalakan) yang dikirim ke detektor beserta posisinya di frame penuh
+DetectionRegion = namedtuple("DetectionRegion", "image top left scale")
+
+
+def make_region(frame_bgr, scale, box=None):
+    """Memotong box (top, right, bottom, left) dari frame BGR, lalu skala & ubah ke RGB.
+
+    box None = seluruh frame.
+    """
+    if box is None:
+        top, left, crop = 0, 0, frame_bgr
+    else:
+        top, right, bottom, left = box
+        crop = frame_bgr[top:bottom, left:right]
+    if scale != 1.0:
+        crop = cv2.resize(crop, (0, 0), fx=scale, fy=scale)
+    return DetectionRegion(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), top, left, scale)
+
+
+def _to_frame_location(region, location):
+    top, right, bottom, left = location
+    return (region.top + int(top / region.scale), region.left + int(right / region.scale),
+            region.top + int(bottom / region.scale), region.left + int(left / region.scale))
+
+
+def detect_and_encode(regions, skip_locations=(), skip_iou_threshold=0.5, detector="hog"):
+    """Deteksi semua wajah di setiap DetectionRegion dengan backend detector
+    (spesifikasi, lihat detectors.py), tetapi hanya encode wajah
+    yang tidak tumpang-tindih dengan skip_locations (track yang identitasnya
+    masih segar, skala frame penuh).
+
+    Mengembalikan (locations skala frame penuh, encodings, timings) dengan
+    encodings[i] None untuk wajah yang dilewati dan
+    timings = {"detection": detik, "encoding": detik}.
+    """
+    # Dijalankan di worker (thread atau proses terpisah)
+    face_detector = get_detector(detector)
+    start = time.perf_counter()
+    found = []  # (indeks region, lokasi di region, lokasi di frame penuh)
+    for r, region in enumerate(regions):
+        for location in face_detector.detect(region.image):
+            found.append((r, location, _to_frame_location(region, location)))
+    detected_at = time.perf_counter()
+
+    locations = [frame_location for _, _, frame_location in found]
+    encodings = [None] * len(found)
+    to_encode = {}
+    for i, (r, region_location, frame_location) in enumerate(found):
+        if all(location_iou(frame_location, skip) < skip_iou_threshold for skip in skip_locations):
+            to_encode.setdefault(r, []).append(i)
+    for r, indices in to_encode.items():
+        computed = face_recognition.face_encodings(regions[r].image, [found[i][1] for i in indices])
+        for i, encoding in zip(indices, computed):
+            encodings[i] = encoding
+    return locations, encodings, {"detection": detected_at - start, "encoding": time.perf_counter() - detected_at}
+
+
+class DetectionWorker:
+    """Satu deteksi berjalan pada satu waktu; hasil diambil lewat poll() tanpa memblokir.
+
+    mode="process" menjalankan deteksi & face_recognition di proses terpisah sehingga
+    tidak berebut GIL dengan loop streaming; mode="thread" lebih ringan tetapi
+    bisa tetap membuat stream tersendat jika dlib menahan GIL.
+    """
+
+    def __init__(self, mode="process", target_fps=30, min_interval=1, max_interval=30, smoothing=0.2, detector="hog",
+                 budget=0.5):
+        self.mode = mode
+        # Spesifikasi backend (string); detektornya dibuat sekali di dalam worker
+        self.detector = detector
+        self.target_fps = target_fps
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        # Bagian waktu (0-1] worker boleh sibuk; 1.0 = kirim lagi segera setelah hasil diambil
+        if not 0.0 < budget <= 1.0:
+            raise ValueError(f"budget deteksi harus di antara 0 (eksklusif) dan 1, bukan {budget}.")
+        self.budget = budget
+        self.latency = None  # rata-rata eksponensial latensi deteksi (detik)
+        self._executor = None
+        self._pending = None
+        self._ready_index = None  # frame saat hasil terakhir diambil poll()
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.mode == "process":
+            # spawn, bukan fork: proses induk punya thread (capture, server) dan state dlib/OpenCV
+            # yang tidak aman disalin oleh fork
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detection")
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._pending = None
+
+    @property
+    def busy(self):
+        return self._pending is not None
+
+    @property
+    def interval(self):
+        """Jumlah frame jeda antara hasil deteksi diambil dan pengiriman berikutnya.
+
+        Deteksi selama latency detik diikuti jeda latency * (1 - budget) / budget
+        detik, sehingga worker sibuk paling banyak budget dari waktunya;
+        dibatasi min_interval..max_interval frame.
+        """
+        if self.latency is None:
+            return self.min_interval
+        idle_frames = math.ceil(self.latency * self.target_fps * (1.0 - self.budget) / self.budget)
+        return max(self.min_interval, min(self.max_interval, idle_frames))
+
+    def should_submit(self, frame_index):
+        if self._executor is None or self._pending is not None:
+            return False
+        if self._ready_index is None:
+            return True
+        return frame_index - self._ready_index >= self.interval
+
+    def submit(self, frame, regions, frame_index, skip_locations=(), searched=None):
+        """frame: salinan frame penuh (BGR) yang belum dianotasi, dipakai saat hasil diterapkan.
+        regions: list DetectionRegion yang dideteksi.
+        skip_locations: kotak (skala frame penuh) yang tidak perlu di-encode ulang.
+        searched: kotak yang diwakili regions, atau None jika seluruh frame."""
+        future = self._executor.submit(detect_and_encode, list(regions), list(skip_locations), detector=self.detector)
+        self._pending = (future, frame, frame_index, time.perf_counter(), searched)
+
+    def poll(self, current_index):
+        """Mengembalikan DetectionResult jika deteksi terakhir sudah selesai, selain itu None.
+
+        current_index: nomor frame saat ini; jeda interval dihitung mulai frame ini.
+        """
+        if self._pending is None or not self._pending[0].done():
+            return None
+
+        future, frame, frame_index, submitted_at, searched = self._pending
+        self._pending = None
+        self._ready_index = current_index
+        cycle_time = time.perf_counter() - submitted_at
+        try:
+            locations, encodings, timings = future.result()
+        except Exception as e:
+            return DetectionResult(frame, frame_index, [], [], None, {}, cycle_time, searched, e)
+
+        latency = timings["detection"] + timings["encoding"]
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+        return DetectionResult(frame, frame_index, locations, encodings, latency, timings, cycle_time, searched, None)
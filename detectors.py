@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+from capture import open_source
+from tracking import location_iou
+
+# --- Backend detektor wajah ---
+# Semua backend menerima gambar RGB dan mengembalikan kotak
+# (top, right, bottom, left) seperti face_recognition.face_locations, sehingga
+# bisa dipakai bergantian oleh worker deteksi. Backend dipilih lewat string:
+#   "hog"                          face_recognition (dlib HOG), default
+#   "haar" / "haar:<file.xml>"     OpenCV Haar cascade (default: frontalface bawaan OpenCV)
+#   "lbp:<file.xml>"               OpenCV LBP cascade (lebih cepat dari Haar, file dari repo OpenCV)
+#   "dnn:<model>[,<config>]"       OpenCV DNN: SSD (mis. res10_300x300_ssd_iter_140000.caffemodel,deploy.prototxt)
+#                                  atau YuNet (file .onnx, via cv2.FaceDetectorYN)
+# Kalibrasi (python detectors.py --clip ...) mengukur semua kandidat pada
+# klip contoh dan memilih yang tercepat dengan recall minimal tertentu.
+
+DEFAULT_HAAR_CASCADE = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+
+
+class HOGDetector:
+    def __init__(self, upsample=1):
+        # Diimpor di sini agar backend OpenCV tetap bisa dipakai tanpa dlib
+        import face_recognition
+        self._face_locations = face_recognition.face_locations
+        self.upsample = upsample
+
+    def detect(self, rgb_image):
+        return self._face_locations(rgb_image, number_of_times_to_upsample=self.upsample, model="hog")
+
+
+class CascadeDetector:
+    """Haar atau LBP cascade; sangat cepat, tetapi lebih banyak salah deteksi dan hanya wajah frontal."""
+
+    def __init__(self, cascade_path=DEFAULT_HAAR_CASCADE, scale_factor=1.1, min_neighbors=5, min_size=20):
+        self.classifier = cv2.CascadeClassifier(cascade_path)
+        if self.classifier.empty():
+            raise ValueError(f"Gagal memuat cascade '{cascade_path}'.")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = (min_size, min_size)
+
+    def detect(self, rgb_image):
+        gray = cv2.equalizeHist(cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY))
+        boxes = self.classifier.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                                 minSize=self.min_size)
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in boxes]
+
+
+class DNNDetector:
+    """Detektor SSD OpenCV DNN (mis. res10 300x300 Caffe) dari file model lokal."""
+
+    def __init__(self, model_path, config_path="", confidence=0.5, input_size=300, mean=(104.0, 177.0, 123.0)):
+        self.net = cv2.dnn.readNet(model_path, config_path)
+        self.confidence = confidence
+        self.input_size = (input_size, input_size)
+        self.mean = mean
+
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        # Model dilatih dengan input BGR; swapRB mengubah RGB -> BGR
+        blob = cv2.dnn.blobFromImage(rgb_image, 1.0, self.input_size, self.mean, swapRB=True, crop=False)
+        self.net.setInput(blob)
+        detections = self.net.forward().reshape(-1, 7)
+        locations = []
+        for _, _, score, x1, y1, x2, y2 in detections:
+            if score < self.confidence:
+                continue
+            left, top = max(0, int(x1 * width)), max(0, int(y1 * height))
+            right, bottom = min(width, int(x2 * width)), min(height, int(y2 * height))
+            if right > left and bottom > top:
+                locations.append((top, right, bottom, left))
+        return locations
+
+
+class YuNetDetector:
+    """Detektor YuNet (cv2.FaceDetectorYN, OpenCV 4.5.4+) dari file .onnx lokal."""
+
+    def __init__(self, model_path, confidence=0.6):
+        if not hasattr(cv2, "FaceDetectorYN"):
+            raise ValueError("cv2.FaceDetectorYN tidak tersedia (butuh OpenCV 4.5.4+).")
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), confidence)
+
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        self.detector.setInputSize((width, height))
+        _, faces = self.detector.detect(cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+        locations = []
+        for x, y, w, h in faces[:, :4]:
+            left, top = max(0, int(x)), max(0, int(y))
+            right, bottom = min(width, int(x + w)), min(height, int(y + h))
+            if right > left and bottom > top:
+                locations.append((top, right, bottom, left))
+        return locations
+
+
+def create_detector(spec):
+    """Membuat backend dari string spesifikasi (lihat komentar di atas)."""
+    kind, _, argument = spec.strip().partition(":")
+    kind = kind.lower()
+    if kind == "hog":
+        return HOGDetector(upsample=int(argument) if argument else 1)
+    if kind == "haar":
+        return CascadeDetector(argument or DEFAULT_HAAR_CASCADE)
+    if kind == "lbp":
+        if not argument:
+            raise ValueError("Detektor LBP butuh path file cascade, mis. lbp:lbpcascade_frontalface_improved.xml")
+        return CascadeDetector(argument)
+    if kind == "dnn":
+        model_path, _, config_path = argument.partition(",")
+        if not model_path or not os.path.exists(model_path):
+            raise ValueError(f"File model DNN tidak ditemukan: '{model_path}'")
+        if model_path.lower().endswith(".onnx") and not config_path:
+            return YuNetDetector(model_path)
+        return DNNDetector(model_path, config_path)
+    raise ValueError(f"Detektor tidak dikenal: '{spec}' (pilihan: hog, haar, lbp:<xml>, dnn:<model>[,<config>])")
+
+
+# Satu instance per spesifikasi per proses; objek OpenCV tidak bisa di-pickle ke worker,
+# jadi worker deteksi hanya menerima string spesifikasi dan membuat detektornya sendiri.
+_detector_cache = {}
+
+
+def get_detector(spec):
+    detector = _detector_cache.get(spec)
+    if detector is None:
+        detector = _detector_cache[spec] = create_detector(spec)
+    return detector
+
+
+# --- Kalibrasi: pilih backend tercepat yang memenuhi recall minimal ---
+
+def read_calibration_frames(source, max_frames=100, stride=5):
+    """Membaca frame BGR dari file video atau folder gambar (setiap frame ke-stride)."""
+    capture, _ = open_source(source)
+    if not capture.isOpened():
+        raise ValueError(f"Tidak dapat membuka klip kalibrasi '{source}'.")
+    frames = []
+    frame_index = 0
+    while len(frames) < max_frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        if frame_index % stride == 0:
+            frames.append(frame)
+        frame_index += 1
+    capture.release()
+    if not frames:
+        raise ValueError(f"Tidak ada frame yang bisa dibaca dari '{source}'.")
+    return frames
+
+
+def _detect_frames(detector, frames, scale):
+    """Deteksi pada setiap frame (diskalakan); mengembalikan (lokasi skala penuh per frame, ms per frame)."""
+    images = [cv2.cvtColor(cv2.resize(frame, (0, 0), fx=scale, fy=scale) if scale != 1.0 else frame, cv2.COLOR_BGR2RGB)
+              for frame in frames]
+    # Pemanasan agar inisialisasi pertama (mis. alokasi model) tidak ikut terukur
+    detector.detect(images[0])
+    start = time.perf_counter()
+    detections = [detector.detect(image) for image in images]
+    elapsed = time.perf_counter() - start
+    detections = [[tuple(int(v / scale) for v in location) for location in locations] for locations in detections]
+    return detections, 1000.0 * elapsed / len(images)
+
+
+def detection_recall(predicted, truth, iou_threshold=0.4):
+    """Pecahan kotak acuan yang punya pasangan prediksi dengan IoU >= iou_threshold."""
+    matched = 0
+    total = 0
+    for predicted_locations, truth_locations in zip(predicted, truth):
+        available = list(predicted_locations)
+        total += len(truth_locations)
+        for truth_location in truth_locations:
+            best = max(available, key=lambda location: location_iou(location, truth_location), default=None)
+            if best is not None and location_iou(best, truth_location) >= iou_threshold:
+                matched += 1
+                available.remove(best)
+    return matched / total if total else None
+
+
+def calibrate(frames, candidates, reference="hog", reference_scale=1.0, scale=0.25, min_recall=0.9, iou_threshold=0.4):
+    """Mengukur setiap kandidat pada frames dan memilih yang tercepat dengan recall >= min_recall.
+
+    Kotak acuan berasal dari detektor reference pada reference_scale (tanpa
+    anotasi manual). Jika tidak ada kandidat yang memenuhi, yang recall-nya
+    tertinggi dipilih. Mengembalikan (spesifikasi terpilih, list hasil per kandidat).
+    """
+    truth, _ = _detect_frames(create_detector(reference), frames, reference_scale)
+    if not any(truth):
+        raise ValueError("Detektor acuan tidak menemukan wajah di klip kalibrasi; gunakan klip yang berisi wajah.")
+
+    results = []
+    for spec in candidates:
+        try:
+            predicted, ms_per_frame = _detect_frames(create_detector(spec), frames, scale)
+        except Exception as e:
+            print(f"Peringatan: Detektor '{spec}' dilewati: {e}")
+            continue
+        recall = detection_recall(predicted, truth, iou_threshold)
+        results.append({"detector": spec, "recall": round(recall, 4), "ms_per_frame": round(ms_per_frame, 2),
+                        "faces": sum(len(locations) for locations in predicted)})
+    if not results:
+        raise ValueError("Tidak ada kandidat detektor yang bisa dijalankan.")
+
+    passing = [result for result in results if result["recall"] >= min_recall]
+    if passing:
+        chosen = min(passing, key=lambda result: result["ms_per_frame"])
+    else:
+        chosen = max(results, key=lambda result: (result["recall"], -result["ms_per_frame"]))
+        print(f"Peringatan: Tidak ada detektor dengan recall >= {min_recall}; memakai recall tertinggi.")
+    return chosen["detector"], results
+
+
+def save_calibration(path, chosen, results, settings):
+    report = dict(settings, detector=chosen, results=results, timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def resolve_detector(spec, calibration_path="", clip="", candidates=("hog", "haar"), min_recall=0.9, scale=0.25):
+    """Mengubah "auto" menjadi spesifikasi detektor: kalibrasi ulang jika clip diberikan,
+    selain itu pakai hasil kalibrasi tersimpan, dan "hog" jika keduanya tidak ada."""
+    if spec != "auto":
+        return spec
+    if clip:
+        print(f"[INFO] Kalibrasi detektor pada '{clip}' ({', '.join(candidates)})...")
+        chosen, results = calibrate(read_calibration_frames(clip), candidates, scale=scale, min_recall=min_recall)
+        for result in results:
+            print(f"  {result['detector']:<40} recall={result['recall']:.3f}  {result['ms_per_frame']:.1f} ms/frame")
+        if calibration_path:
+            save_calibration(calibration_path, chosen, results,
+                             {"clip": clip, "scale": scale, "min_recall": min_recall})
+        return chosen
+    if calibration_path and os.path.exists(calibration_path):
+        with open(calibration_path, "r", encoding="utf-8") as f:
+            return json.load(f)["detector"]
+    print("Peringatan: Detektor 'auto' tanpa klip maupun hasil kalibrasi. Memakai 'hog'.")
+    return "hog"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memilih detektor wajah tercepat yang memenuhi recall minimal pada klip kalibrasi.")
+    parser.add_argument("--clip", required=True, help="File video atau folder gambar berisi wajah, diambil di lokasi")
+    parser.add_argument("--candidates", nargs="+", default=["hog", "haar"],
+                        help="Spesifikasi detektor yang diuji, mis. hog haar lbp:lbp.xml dnn:res10.caffemodel,deploy.prototxt")
+    parser.add_argument("--reference", default="hog", help="Detektor acuan untuk kotak 'benar' (dijalankan di --reference-scale)")
+    parser.add_argument("--reference-scale", type=float, default=1.0, help="Skala frame untuk detektor acuan")
+    parser.add_argument("--scale", type=float, default=0.25, help="Skala frame kandidat (sama dengan WAIFU_DETECTION_SCALE)")
+    parser.add_argument("--min-recall", type=float, default=0.9, help="Recall minimal terhadap detektor acuan")
+    parser.add_argument("--iou", type=float, default=0.4, help="IoU minimal agar deteksi dianggap cocok")
+    parser.add_argument("--frames", type=int, default=100, help="Jumlah frame kalibrasi maksimal")
+    parser.add_argument("--stride", type=int, default=5, help="Ambil setiap frame ke-N dari klip")
+    parser.add_argument("--output", default="detector_calibration.json", help="File hasil (dibaca WAIFU_DETECTOR=auto)")
+    args = parser.parse_args()
+
+    frames = read_calibration_frames(args.clip, args.frames, args.stride)
+    print(f"[INFO] {len(frames)} frame kalibrasi dari {args.clip}.")
+    try:
+        chosen, results = calibrate(frames, args.candidates, args.reference, args.reference_scale, args.scale,
+                                    args.min_recall, args.iou)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"\n{'detektor':<44}{'recall':>8}{'ms/frame':>10}{'wajah':>7}")
+    for result in sorted(results, key=lambda result: result["ms_per_frame"]):
+        marker = "  <- dipilih" if result["detector"] == chosen else ""
+        print(f"{result['detector']:<44}{result['recall']:>8.3f}{result['ms_per_frame']:>10.1f}{result['faces']:>7}{marker}")
+
+    save_calibration(args.output, chosen, results,
+                     {"clip": args.clip, "reference": args.reference, "scale": args.scale, "min_recall": args.min_recall})
+    print(f"\nDetektor terpilih: {chosen} (disimpan ke {args.output})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import queue
+import sqlite3
+import threading
+import time
+
+import cv2
+
+# --- Log kejadian pencocokan (append-only, SQLite WAL) ---
+# Loop frame hanya memasukkan kejadian ke antrean terbatas (put_nowait, tidak
+# pernah menunggu disk). Thread penulis mengambil kejadian dalam batch,
+# meng-encode thumbnail JPEG, dan menulis satu transaksi per batch. Jika
+# antrean penuh (disk lambat), kejadian baru dibuang dan dihitung, bukan
+# ditunggu. Pembacaan (/history) memakai koneksi sendiri; WAL mengizinkan
+# baca bersamaan dengan penulisan.
+
+THUMBNAIL_SIZE = 96
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS match_events (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    camera TEXT NOT NULL,
+    track INTEGER,
+    name TEXT NOT NULL,
+    similarity REAL NOT NULL,
+    thumbnail BLOB
+);
+CREATE INDEX IF NOT EXISTS match_events_time ON match_events (timestamp, id);
+CREATE INDEX IF NOT EXISTS match_events_name_time ON match_events (name, timestamp, id);
+"""
+
+_STOP = object()
+
+
+def event_thumbnail(face_rgb, size=THUMBNAIL_SIZE):
+    """Mengecilkan wajah RGB untuk log; cukup murah untuk loop frame (encode JPEG di thread penulis)."""
+    if face_rgb is None or face_rgb.size == 0:
+        return None
+    return cv2.resize(face_rgb, (size, size), interpolation=cv2.INTER_AREA)
+
+
+class MatchEventLog:
+    """Log kejadian pencocokan di file SQLite dengan penulis batch di thread latar belakang."""
+
+    def __init__(self, path, batch_size=200, flush_interval=1.0, max_queue=10000, store_thumbnails=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.store_thumbnails = store_thumbnails
+        self.written = 0
+        self.dropped = 0  # kejadian yang dibuang karena antrean penuh
+        self.write_errors = 0
+        self.thumbnail_errors = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+        self._thread = threading.Thread(target=self._run, name="match-event-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        # WAL + NORMAL: commit tidak menunggu fsync per transaksi; aman dari korupsi, paling banyak kehilangan batch terakhir
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # --- Penulisan (dipanggil dari loop frame / thread penerima proses kamera) ---
+    def record(self, camera, track, name, similarity, thumbnail_rgb=None, timestamp=None):
+        """Tidak pernah memblokir: kejadian dibuang (dan dihitung) jika antrean penuh."""
+        event = (time.time() if timestamp is None else timestamp, camera, track, name, float(similarity),
+                 thumbnail_rgb if self.store_thumbnails else None)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def queue_size(self):
+        return self._queue.qsize()
+
+    def _encode(self, event):
+        timestamp, camera, track, name, similarity, thumbnail_rgb = event
+        thumbnail = None
+        if thumbnail_rgb is not None:
+            # Thumbnail yang rusak (dtype/shape salah) disimpan sebagai NULL, kejadiannya tetap ditulis
+            try:
+                ret, buffer = cv2.imencode('.jpg', cv2.cvtColor(thumbnail_rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 80])
+                if ret:
+                    thumbnail = sqlite3.Binary(buffer.tobytes())
+            except Exception as e:
+                self.thumbnail_errors += 1
+                print(f"Peringatan: Gagal meng-encode thumbnail kejadian pencocokan ({name}): {e}")
+        return (timestamp, camera, track, name, similarity, thumbnail)
+
+    def _write(self, connection, batch):
+        # Semua error ditangkap: jika thread penulis mati, antrean penuh dan semua kejadian berikutnya dibuang
+        try:
+            rows = [self._encode(event) for event in batch]
+            with connection:
+                connection.executemany(
+                    "INSERT INTO match_events (timestamp, camera, track, name, similarity, thumbnail) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows)
+            self.written += len(batch)
+        except Exception as e:
+            self.write_errors += 1
+            print(f"Error saat menulis {len(batch)} kejadian pencocokan ke '{self.path}': {e}")
+
+    def _run(self):
+        connection = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                batch = []
+                try:
+                    event = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                # Kumpulkan kejadian yang datang dalam flush_interval menjadi satu transaksi
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if event is _STOP:
+                        stopping = True
+                        break
+                    batch.append(event)
+                    if len(batch) >= self.batch_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    try:
+                        event = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._write(connection, batch)
+        finally:
+            connection.close()
+
+    def close(self, timeout=5.0):
+        """Menulis sisa antrean lalu menghentikan thread penulis."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print("Peringatan: Antrean log kejadian tidak kosong saat ditutup; sisa kejadian dibuang.")
+            return
+        self._thread.join(timeout)
+
+    # --- Pembacaan (/history) ---
+    def query(self, name=None, camera=None, since=None, until=None, cursor=None, limit=50):
+        """Kejadian terbaru lebih dulu, per halaman.
+
+        cursor: (timestamp, id) kejadian terakhir halaman sebelumnya. Mengembalikan
+        (list dict kejadian, cursor halaman berikutnya atau None).
+        """
+        conditions = []
+        params = []
+        if name is not None:
+            conditions.append("name = ?")
+            params.append(name)
+        if camera is not None:
+            conditions.append("camera = ?")
+            params.append(camera)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        if cursor is not None:
+            # Keyset pagination: tetap cepat di halaman jauh, dan stabil meski ada kejadian baru
+            conditions.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend((cursor[0], cursor[0], cursor[1]))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                f"SELECT id, timestamp, camera, track, name, similarity, thumbnail IS NOT NULL FROM match_events {where} "
+                "ORDER BY timestamp DESC, id DESC LIMIT ?", params + [limit + 1]).fetchall()
+        finally:
+            connection.close()
+
+        events = [{"id": row[0], "timestamp": row[1], "camera": row[2], "track": row[3], "name": row[4],
+                   "similarity": row[5], "has_thumbnail": bool(row[6])} for row in rows[:limit]]
+        next_cursor = (events[-1]["timestamp"], events[-1]["id"]) if len(rows) > limit else None
+        return events, next_cursor
+
+    def thumbnail(self, event_id):
+        """Bytes JPEG thumbnail kejadian, atau None."""
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT thumbnail FROM match_events WHERE id = ?", (event_id,)).fetchone()
+        finally:
+            connection.close()
+        return bytes(row[0]) if row is not None and row[0] is not None else None
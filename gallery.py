@@ -0,0 +1,489 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# --- Pencocokan wajah terhadap galeri waifu ---
+# Galeri disimpan sebagai satu matriks float32 yang kontigu beserta norma
+# kuadrat setiap baris, sehingga semua wajah dalam satu frame bisa dicocokkan
+# sekaligus dengan satu perkalian matriks.
+
+ENCODING_DIM = 128
+# Jarak maksimal agar sebuah wajah dianggap cocok dengan waifu di galeri
+MATCH_THRESHOLD = 0.6
+LEGACY_PICKLE_PATH = "waifu_encodings.pickle"
+
+
+def face_distance_to_confidence(face_distance, threshold=MATCH_THRESHOLD):
+    if face_distance > threshold:
+        return round(100 * (1.0 - face_distance), 2)
+    else:
+        return round(100 * (1.0 - face_distance * face_distance), 2)
+
+
+def identify_faces(matcher, face_encodings, threshold=MATCH_THRESHOLD):
+    """(nama, kemiripan %) per wajah; ("Unknown", 0.0) jika tidak ada yang cukup dekat."""
+    identities = []
+    for face_matches in matcher.match(face_encodings, k=1):
+        if face_matches and face_matches[0][1] < threshold:
+            name, best_distance = face_matches[0]
+            identities.append((name, face_distance_to_confidence(best_distance)))
+        else:
+            identities.append(("Unknown", 0.0))
+    return identities
+
+
+class GalleryMatcher:
+    """Pencocokan brute-force (eksak) berbasis jarak Euclidean, sama seperti
+    face_recognition.face_distance tetapi dibatch untuk banyak wajah."""
+
+    def __init__(self, encodings, names, sq_norms=None):
+        encodings = np.asarray(encodings, dtype=np.float32)
+        if encodings.size == 0:
+            encodings = encodings.reshape(0, ENCODING_DIM)
+        # Untuk array memmap float32 yang sudah kontigu, tidak ada salinan yang dibuat
+        self.encodings = np.ascontiguousarray(encodings)
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+        self.sq_norms = np.asarray(sq_norms, dtype=np.float32)
+        # Array nama (mis. dari shared memory) dipakai apa adanya tanpa disalin ke list
+        self.names = names if isinstance(names, np.ndarray) else list(names)
+
+        if len(self.names) != len(self.encodings):
+            raise ValueError(f"Jumlah nama ({len(self.names)}) tidak sama dengan jumlah enkripsi ({len(self.encodings)}).")
+
+    def __len__(self):
+        return len(self.names)
+
+    def distances(self, face_encodings):
+        """Mengembalikan matriks jarak berukuran (jumlah wajah, ukuran galeri)."""
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.encodings.shape[1])
+        query_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b
+        sq_distances = query_sq_norms[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.encodings.T)
+        np.maximum(sq_distances, 0.0, out=sq_distances)
+        return np.sqrt(sq_distances, out=sq_distances)
+
+    def match(self, face_encodings, k=1):
+        """Top-k per wajah: list berisi list (nama, jarak) terurut dari yang terdekat."""
+        if len(face_encodings) == 0 or len(self) == 0:
+            return [[] for _ in range(len(face_encodings))]
+
+        top_ids, top_distances = top_k_smallest(self.distances(face_encodings), k)
+        return self._to_names(top_ids, top_distances)
+
+    def _to_names(self, top_ids, top_distances):
+        return [
+            [(self.names[gallery_id], float(distance)) for gallery_id, distance in zip(row_ids, row_distances)]
+            for row_ids, row_distances in zip(top_ids, top_distances)
+        ]
+
+
+def top_k_smallest(distances, k):
+    """Indeks dan nilai k jarak terkecil per baris, terurut naik."""
+    k = min(k, distances.shape[1])
+    if k < distances.shape[1]:
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+    candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+    order = np.argsort(candidate_distances, axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_distances, order, axis=1)
+
+
+def _assign_to_nearest(points, centroids, chunk_size=8192):
+    """Indeks centroid terdekat untuk setiap titik, dihitung per potongan agar hemat memori."""
+    centroid_sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignments = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start:start + chunk_size]
+        # ||a||^2 konstan per baris, jadi cukup ||c||^2 - 2 a.c
+        scores = centroid_sq_norms[None, :] - 2.0 * (chunk @ centroids.T)
+        assignments[start:start + chunk_size] = np.argmin(scores, axis=1)
+    return assignments
+
+
+def kmeans(points, n_clusters, n_iter=20, sample_size=None, seed=0):
+    """k-means sederhana (Lloyd) murni NumPy untuk partisi kasar galeri."""
+    rng = np.random.default_rng(seed)
+    if sample_size is not None and len(points) > sample_size:
+        points = points[rng.choice(len(points), sample_size, replace=False)]
+
+    centroids = points[rng.choice(len(points), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign_to_nearest(points, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, points)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Cluster kosong diisi ulang dengan titik acak
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Indeks perkiraan (approximate) bergaya IVF untuk galeri sangat besar.
+
+    Galeri dipartisi dengan k-means menjadi n_lists daftar; saat pencarian
+    hanya n_probe daftar terdekat yang dipindai secara eksak.
+    """
+
+    FORMAT = "waifu-ivf-index"
+    FORMAT_VERSION = 2
+    INDEX_FILENAME = "index.json"
+    ARRAY_KEYS = ("centroids", "encodings", "sq_norms", "ids", "list_offsets", "names")
+
+    def __init__(self, centroids, encodings, ids, list_offsets, names, n_probe=8, sq_norms=None, gallery_checksum=None):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+        self.sq_norms = np.asarray(sq_norms, dtype=np.float32)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.names = names if isinstance(names, np.ndarray) else list(names)
+        self.n_probe = n_probe
+        # Checksum galeri sumber (manifest galeri atau file pickle), untuk mendeteksi indeks yang basi
+        self.gallery_checksum = gallery_checksum
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, encodings, names, n_lists=None, n_iter=20, n_probe=8, seed=0, gallery_checksum=None):
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+        if n_lists is None:
+            # Aturan praktis: sekitar sqrt(N) daftar
+            n_lists = max(1, int(np.sqrt(len(encodings))))
+        n_lists = min(n_lists, len(encodings))
+
+        centroids = kmeans(encodings, n_lists, n_iter=n_iter, sample_size=256 * n_lists, seed=seed)
+        assignments = _assign_to_nearest(encodings, centroids)
+
+        # Urutkan galeri per daftar agar setiap daftar menjadi potongan kontigu
+        order = np.argsort(assignments, kind='stable')
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=list_offsets[1:])
+        return cls(centroids, encodings[order], order, list_offsets, names, n_probe=n_probe,
+                   gallery_checksum=gallery_checksum)
+
+    # Indeks disimpan sebagai folder seperti galeri: satu .npy per array (dibuka dengan mmap,
+    # halaman memorinya dibagi antar proses) dan index.json yang ditulis paling akhir.
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        tag = f"{int(time.time() * 1000):x}"
+        arrays = {"centroids": self.centroids, "encodings": self.encodings, "sq_norms": self.sq_norms,
+                  "ids": self.ids, "list_offsets": self.list_offsets, "names": np.asarray(self.names, dtype=str)}
+        files = {}
+        for key, array in arrays.items():
+            files[key] = f"{key}-{tag}.npy"
+            np.save(os.path.join(path, files[key]), array)
+
+        index_json_path = os.path.join(path, self.INDEX_FILENAME)
+        previous = None
+        if os.path.exists(index_json_path):
+            with open(index_json_path, "r", encoding="utf-8") as f:
+                previous = json.load(f).get("files")
+        metadata = {
+            "format": self.FORMAT,
+            "version": self.FORMAT_VERSION,
+            "count": len(self),
+            "n_lists": self.n_lists,
+            "gallery_checksum": self.gallery_checksum,
+            "files": files,
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(index_json_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        os.replace(index_json_path + ".tmp", index_json_path)
+
+        if previous:
+            for name in previous.values():
+                if name not in files.values():
+                    try:
+                        os.remove(os.path.join(path, name))
+                    except OSError:
+                        pass
+
+    @classmethod
+    def load(cls, path, n_probe=8, gallery_checksum=None):
+        """Membuka indeks dengan mmap. gallery_checksum: checksum galeri yang sedang dipakai;
+        ValueError jika indeks dibangun dari galeri lain (perlu build_index.py ulang)."""
+        index_json_path = os.path.join(path, cls.INDEX_FILENAME)
+        if not os.path.isfile(index_json_path):
+            raise ValueError(f"'{path}' bukan folder indeks IVF (format .npz lama: jalankan ulang build_index.py)")
+        with open(index_json_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("format") != cls.FORMAT or metadata.get("version") != cls.FORMAT_VERSION:
+            raise ValueError(f"Format/versi indeks IVF tidak didukung: {metadata.get('format')} {metadata.get('version')}")
+        if gallery_checksum is not None and metadata.get("gallery_checksum") != gallery_checksum:
+            raise ValueError(f"Indeks dibangun dari galeri lain ({metadata.get('gallery_checksum')}, galeri saat ini "
+                             f"{gallery_checksum}); jalankan ulang build_index.py")
+
+        arrays = {key: np.load(os.path.join(path, metadata["files"][key]), mmap_mode='r') for key in cls.ARRAY_KEYS}
+        if len(arrays["names"]) != metadata["count"] or len(arrays["encodings"]) != metadata["count"]:
+            raise ValueError("Isi indeks IVF tidak sesuai index.json")
+        return cls(arrays["centroids"], arrays["encodings"], arrays["ids"], arrays["list_offsets"], arrays["names"],
+                   n_probe=n_probe, sq_norms=arrays["sq_norms"], gallery_checksum=metadata.get("gallery_checksum"))
+
+    def match(self, face_encodings, k=1):
+        """Antarmuka sama dengan GalleryMatcher.match()."""
+        if len(face_encodings) == 0 or len(self) == 0:
+            return [[] for _ in range(len(face_encodings))]
+
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.encodings.shape[1])
+        n_probe = min(self.n_probe, self.n_lists)
+        probed_lists = top_k_smallest(self._coarse_distances(queries), n_probe)[0]
+
+        results = []
+        for query, lists in zip(queries, probed_lists):
+            query_sq_norm = query @ query
+            candidate_ids = []
+            candidate_distances = []
+            # Setiap daftar adalah potongan kontigu, jadi cukup slicing tanpa menyalin enkripsi
+            for l in lists:
+                start, end = self.list_offsets[l], self.list_offsets[l + 1]
+                if start == end:
+                    continue
+                sq_distances = self.sq_norms[start:end] + query_sq_norm - 2.0 * (self.encodings[start:end] @ query)
+                candidate_distances.append(np.sqrt(np.maximum(sq_distances, 0.0)))
+                candidate_ids.append(self.ids[start:end])
+            if not candidate_ids:
+                results.append([])
+                continue
+            candidate_ids = np.concatenate(candidate_ids)
+            top_idx, top_distances = top_k_smallest(np.concatenate(candidate_distances)[None, :], k)
+            results.append([(self.names[gallery_id], float(distance))
+                            for gallery_id, distance in zip(candidate_ids[top_idx[0]], top_distances[0])])
+        return results
+
+    def _coarse_distances(self, queries):
+        centroid_sq_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        return centroid_sq_norms[None, :] - 2.0 * (queries @ self.centroids.T)
+
+
+# --- Format galeri di disk (pengganti waifu_encodings.pickle) ---
+# Sebuah folder berisi:
+#   manifest.json            versi format, dimensi, jumlah baris, checksum, nama & sumber per baris
+#   encodings-<hash>.npy     matriks float32 (N, 128), dibuka dengan mmap
+#   sq_norms-<hash>.npy      norma kuadrat per baris, agar startup tidak perlu menyentuh semua data
+# Manifest ditulis paling akhir (atomic rename), sehingga pembaca selalu melihat
+# versi yang konsisten dan proses yang sedang berjalan tetap memakai file lamanya.
+
+GALLERY_FORMAT = "waifu-gallery"
+GALLERY_FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return "sha256:" + digest.hexdigest()
+
+
+def save_gallery(gallery_path, encodings, names, sources=None):
+    """Menulis galeri ke gallery_path. sources: path gambar asal per baris (untuk build inkremental)."""
+    encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+    names = list(names)
+    sources = list(sources) if sources is not None else [None] * len(names)
+    if not (len(encodings) == len(names) == len(sources)):
+        raise ValueError("Jumlah enkripsi, nama, dan sumber harus sama.")
+
+    os.makedirs(gallery_path, exist_ok=True)
+    previous = _read_manifest(gallery_path) if os.path.exists(os.path.join(gallery_path, MANIFEST_FILENAME)) else None
+
+    tag = f"{int(time.time() * 1000):x}"
+    encodings_file = f"encodings-{tag}.npy"
+    sq_norms_file = f"sq_norms-{tag}.npy"
+    np.save(os.path.join(gallery_path, encodings_file), encodings)
+    np.save(os.path.join(gallery_path, sq_norms_file), np.einsum('ij,ij->i', encodings, encodings))
+
+    manifest = {
+        "format": GALLERY_FORMAT,
+        "version": GALLERY_FORMAT_VERSION,
+        "dtype": "float32",
+        "dim": ENCODING_DIM,
+        "count": len(names),
+        "encodings_file": encodings_file,
+        "sq_norms_file": sq_norms_file,
+        "checksum": file_checksum(os.path.join(gallery_path, encodings_file)),
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "names": names,
+        "sources": sources,
+    }
+    manifest_path = os.path.join(gallery_path, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    # File versi sebelumnya boleh dihapus; proses yang masih memetakannya tetap aman di Linux
+    if previous is not None:
+        for key in ("encodings_file", "sq_norms_file"):
+            if previous[key] != manifest[key]:
+                try:
+                    os.remove(os.path.join(gallery_path, previous[key]))
+                except OSError:
+                    pass
+    return manifest
+
+
+def _read_manifest(gallery_path):
+    with open(os.path.join(gallery_path, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != GALLERY_FORMAT:
+        raise ValueError(f"'{gallery_path}' bukan folder galeri waifu.")
+    if manifest.get("version") != GALLERY_FORMAT_VERSION:
+        raise ValueError(f"Versi format galeri tidak didukung: {manifest.get('version')}")
+    return manifest
+
+
+def load_gallery(gallery_path, verify_checksum=False):
+    """Membuka galeri dengan mmap. Mengembalikan (encodings, sq_norms, manifest).
+
+    Tanpa verify_checksum, waktu muat hampir konstan karena data tidak dibaca
+    sampai benar-benar dipakai, dan halaman memorinya dibagi antar proses.
+    """
+    manifest = _read_manifest(gallery_path)
+    encodings_path = os.path.join(gallery_path, manifest["encodings_file"])
+    if verify_checksum:
+        checksum = file_checksum(encodings_path)
+        if checksum != manifest["checksum"]:
+            raise ValueError(f"Checksum galeri tidak cocok: {checksum} != {manifest['checksum']}")
+
+    encodings = np.load(encodings_path, mmap_mode='r')
+    sq_norms = np.load(os.path.join(gallery_path, manifest["sq_norms_file"]), mmap_mode='r')
+    if encodings.dtype != np.float32 or encodings.shape != (manifest["count"], manifest["dim"]):
+        raise ValueError(f"Isi galeri tidak sesuai manifest: {encodings.dtype} {encodings.shape}")
+    if len(manifest["names"]) != manifest["count"] or len(sq_norms) != manifest["count"]:
+        raise ValueError("Jumlah nama atau norma tidak sesuai manifest.")
+    return encodings, sq_norms, manifest
+
+
+def load_matcher(gallery_path="waifu_gallery", pickle_path=LEGACY_PICKLE_PATH, index_path="", n_probe=8,
+                 verify_checksum=False):
+    """Memuat galeri (format folder, atau pickle lama jika folder tidak ada) lalu
+    mengembalikan matcher: IVFIndex jika index_path diberikan, selain itu GalleryMatcher.
+
+    Dengan index_path, galeri sendiri tidak dimuat: hanya checksum-nya yang
+    dibandingkan dengan indeks. Indeks yang basi (galeri sudah berubah) atau
+    rusak diabaikan dengan peringatan dan pencarian eksak dipakai.
+    FileNotFoundError dilempar jika galeri maupun pickle tidak ditemukan.
+    """
+    has_gallery = os.path.exists(os.path.join(gallery_path, MANIFEST_FILENAME))
+    if index_path:
+        gallery_checksum = None
+        if has_gallery:
+            manifest = _read_manifest(gallery_path)
+            gallery_checksum = manifest["checksum"]
+            if verify_checksum:
+                gallery_checksum = file_checksum(os.path.join(gallery_path, manifest["encodings_file"]))
+        elif os.path.exists(pickle_path):
+            gallery_checksum = file_checksum(pickle_path)
+        try:
+            matcher = IVFIndex.load(index_path, n_probe=n_probe, gallery_checksum=gallery_checksum)
+            print(f"Indeks IVF '{index_path}' dimuat ({len(matcher)} enkripsi, {matcher.n_lists} daftar, n_probe={n_probe}).")
+            return matcher
+        except Exception as e:
+            print(f"Peringatan: Gagal memuat indeks IVF '{index_path}': {e}. Menggunakan pencarian eksak.")
+
+    sq_norms = None
+    if has_gallery:
+        encodings, sq_norms, manifest = load_gallery(gallery_path, verify_checksum=verify_checksum)
+        names = manifest["names"]
+        print(f"Galeri '{gallery_path}' berhasil dimuat ({len(names)} enkripsi, {manifest['checksum'][:19]}).")
+    else:
+        # Format lama. Jalankan `python build_gallery.py --from-pickle waifu_encodings.pickle` untuk konversi.
+        with open(pickle_path, "rb") as f:
+            encodings, names = pickle.load(f)
+        print(f"File '{pickle_path}' berhasil dimuat.")
+
+    # Galeri sebagai matriks float32 kontigu agar semua wajah dalam satu frame dicocokkan sekaligus
+    return GalleryMatcher(encodings, names, sq_norms=sq_norms)
+
+
+# --- Galeri di shared memory untuk banyak proses kamera ---
+# Proses utama memuat galeri satu kali lalu menyalin array-nya (termasuk nama)
+# ke blok shared memory. Proses kamera hanya menerima handle kecil berisi nama
+# blok, dtype, dan shape, lalu membangun matcher di atas memori yang sama.
+
+class SharedGallery:
+    """Pemilik blok shared memory galeri; close() dipanggil proses utama saat selesai."""
+
+    def __init__(self, matcher):
+        if isinstance(matcher, IVFIndex):
+            kind = "ivf"
+            arrays = {"centroids": matcher.centroids, "encodings": matcher.encodings, "sq_norms": matcher.sq_norms,
+                      "ids": matcher.ids, "list_offsets": matcher.list_offsets}
+        else:
+            kind = "exact"
+            arrays = {"encodings": matcher.encodings, "sq_norms": matcher.sq_norms}
+        # Nama sebagai array unicode lebar tetap, agar tidak ada list string per proses
+        arrays["names"] = np.asarray(matcher.names, dtype=str)
+
+        self._blocks = []
+        specs = {}
+        try:
+            for key, array in arrays.items():
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self._blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                specs[key] = (block.name, array.dtype.str, array.shape)
+        except Exception:
+            self.close()
+            raise
+        self.handle = {"kind": kind, "arrays": specs, "n_probe": getattr(matcher, "n_probe", None)}
+
+    @property
+    def nbytes(self):
+        return sum(block.size for block in self._blocks)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+        self._blocks = []
+
+
+def _attach_block(name):
+    try:
+        # Python 3.13+: proses kamera tidak ikut mendaftarkan blok ke resource tracker
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach_matcher(handle):
+    """Membangun matcher di atas shared memory dari SharedGallery.handle (tanpa menyalin galeri)."""
+    blocks = []
+    arrays = {}
+    for key, (name, dtype, shape) in handle["arrays"].items():
+        block = _attach_block(name)
+        blocks.append(block)
+        arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        # Hanya-baca: semua proses berbagi data yang sama
+        arrays[key].flags.writeable = False
+
+    if handle["kind"] == "ivf":
+        matcher = IVFIndex(arrays["centroids"], arrays["encodings"], arrays["ids"], arrays["list_offsets"],
+                           arrays["names"], n_probe=handle["n_probe"], sq_norms=arrays["sq_norms"])
+    else:
+        matcher = GalleryMatcher(arrays["encodings"], arrays["names"], sq_norms=arrays["sq_norms"])
+    # Blok harus tetap terbuka selama matcher dipakai
+    matcher.shared_blocks = blocks
+    return matcher
@@ -1,439 +1,367 @@
-import cv2
-import face_recognition
-import pickle
-import numpy as np
-from flask import Flask, Response, render_template, send_file
+from flask import Flask, Response, abort, jsonify, render_template, request
 import os
-import threading
 import time
 import sys
 import queue 
-import io 
+
+from cameras import CameraProcess, LocalCamera, parse_camera_sources
+from comparison import NO_STORE_HEADERS, comparison_response
+from detectors import create_detector, resolve_detector
+from events import MatchEventLog
+from gallery import SharedGallery, load_matcher
+from metrics import registry as metrics_registry
+from pipeline import PipelineConfig
+from thumbnails import ThumbnailStore
 
 # Mengatur encoding output konsol ke UTF-8
 sys.stdout.reconfigure(encoding='utf-8')
 
+# --- Konfigurasi (dapat diubah lewat variabel lingkungan) ---
+# WAIFU_GALLERY_PATH: folder galeri hasil build_gallery.py (dibuka dengan mmap). Jika tidak ada, waifu_encodings.pickle dipakai.
+WAIFU_GALLERY_PATH = os.environ.get("WAIFU_GALLERY_PATH", "waifu_gallery")
+# WAIFU_GALLERY_VERIFY: "1" = verifikasi checksum galeri saat startup (membaca seluruh file)
+WAIFU_GALLERY_VERIFY = os.environ.get("WAIFU_GALLERY_VERIFY", "0") == "1"
+# WAIFU_INDEX_PATH: folder indeks IVF hasil build_index.py. Kosong = pencarian eksak (brute-force).
+WAIFU_INDEX_PATH = os.environ.get("WAIFU_INDEX_PATH", "")
+# WAIFU_INDEX_NPROBE: jumlah daftar IVF yang dipindai per wajah (lebih besar = recall lebih tinggi, lebih lambat)
+WAIFU_INDEX_NPROBE = int(os.environ.get("WAIFU_INDEX_NPROBE", "8"))
+# WAIFU_THUMBNAIL_CACHE_SIZE: jumlah maksimal thumbnail waifu 350x350 yang disimpan di memori (LRU, ~370 KB per
+# thumbnail). Di mode "process" jumlah ini dibagi rata antar proses kamera; untuk galeri besar dan banyak kamera
+# pakai WAIFU_THUMBNAIL_MEMMAP agar semua proses berbagi page cache yang sama.
+WAIFU_THUMBNAIL_CACHE_SIZE = int(os.environ.get("WAIFU_THUMBNAIL_CACHE_SIZE", "256"))
+# WAIFU_THUMBNAIL_MEMMAP: prefix file hasil `python thumbnails.py` untuk galeri besar. Kosong = baca dari waifu_dataset/
+WAIFU_THUMBNAIL_MEMMAP = os.environ.get("WAIFU_THUMBNAIL_MEMMAP", "")
+# WAIFU_THUMBNAIL_PRELOAD: "1" = isi cache thumbnail saat startup, selain itu dimuat saat pertama kali cocok
+WAIFU_THUMBNAIL_PRELOAD = os.environ.get("WAIFU_THUMBNAIL_PRELOAD", "0") == "1"
+
+# WAIFU_CAPTURE_SOURCE: indeks webcam ("0"), file video / URL rtsp, atau folder urutan gambar
+CAPTURE_SOURCE = os.environ.get("WAIFU_CAPTURE_SOURCE", "0")
+# WAIFU_CAMERAS: beberapa kamera, mis. "0,1" atau "lobby=0,booth=/data/booth.mp4". Kosong = satu kamera WAIFU_CAPTURE_SOURCE
+CAMERA_SOURCES = os.environ.get("WAIFU_CAMERAS", "")
+# WAIFU_CAMERA_MODE: "process" (satu proses per kamera, galeri di shared memory), "thread" (di proses server, satu kamera),
+# atau "auto" (thread untuk satu kamera, process untuk lebih)
+CAMERA_MODE = os.environ.get("WAIFU_CAMERA_MODE", "auto")
+# WAIFU_CAPTURE_LOOP: "1" = putar ulang file video / folder gambar dari awal setelah habis
+CAPTURE_LOOP = os.environ.get("WAIFU_CAPTURE_LOOP", "0") == "1"
+
+# TARGET_FPS: laju frame keluaran stream; juga dipakai untuk menyesuaikan interval deteksi
+TARGET_FPS = int(os.environ.get("WAIFU_TARGET_FPS", "30"))
+# DETECTION_WORKER_MODE: "process" (default, tidak berebut GIL) atau "thread"
+DETECTION_WORKER_MODE = os.environ.get("WAIFU_DETECTION_WORKER", "process")
+# MIN/MAX_DETECTION_INTERVAL: batas jeda (dalam frame) antara hasil deteksi diterapkan dan pengiriman berikutnya
+MIN_DETECTION_INTERVAL = int(os.environ.get("WAIFU_MIN_DETECTION_INTERVAL", "1"))
+MAX_DETECTION_INTERVAL = int(os.environ.get("WAIFU_MAX_DETECTION_INTERVAL", "30"))
+# DETECTION_BUDGET: bagian waktu (0-1] worker deteksi boleh sibuk per kamera; 1.0 = deteksi terus-menerus
+DETECTION_BUDGET = float(os.environ.get("WAIFU_DETECTION_BUDGET", "0.5"))
+
+# DETECTION_SCALE: skala frame untuk sapuan deteksi seluruh frame (lebih besar = wajah kecil lebih terdeteksi, lebih lambat)
+DETECTION_SCALE = float(os.environ.get("WAIFU_DETECTION_SCALE", "0.25"))
+# MOTION_GATING: "1" = lewati deteksi pada adegan statis dan deteksi hanya di ROI sekitar gerakan/track
+MOTION_GATING = os.environ.get("WAIFU_MOTION_GATING", "1") == "1"
+# FULL_SWEEP_INTERVAL: detik antar sapuan seluruh frame saat ada gerakan (gating aktif)
+FULL_SWEEP_INTERVAL = float(os.environ.get("WAIFU_FULL_SWEEP_INTERVAL", "2.0"))
+# IDLE_SWEEP_INTERVAL: detik antar sapuan seluruh frame saat adegan statis (wajah yang diam tetap ditemukan)
+IDLE_SWEEP_INTERVAL = float(os.environ.get("WAIFU_IDLE_SWEEP_INTERVAL", "10.0"))
+# ROI_MAX_SIDE: sisi terpanjang ROI (piksel) setelah diskalakan; ROI yang lebih kecil dideteksi di resolusi penuh
+ROI_MAX_SIDE = int(os.environ.get("WAIFU_ROI_MAX_SIDE", "320"))
+# MOTION_THRESHOLD / MOTION_MIN_AREA: selisih intensitas (0-255) dan luas minimal (pecahan frame) untuk dianggap gerakan
+MOTION_THRESHOLD = int(os.environ.get("WAIFU_MOTION_THRESHOLD", "25"))
+MOTION_MIN_AREA = float(os.environ.get("WAIFU_MOTION_MIN_AREA", "0.002"))
+
+# DETECTOR: backend detektor wajah: "hog" (face_recognition), "haar", "lbp:<xml>", "dnn:<model>[,<config>]",
+# atau "auto" = pilih yang tercepat dengan recall cukup (lihat `python detectors.py --clip ...`)
+DETECTOR = os.environ.get("WAIFU_DETECTOR", "hog")
+# DETECTOR_CALIBRATION: file hasil kalibrasi yang dibaca saat DETECTOR=auto
+DETECTOR_CALIBRATION = os.environ.get("WAIFU_DETECTOR_CALIBRATION", "detector_calibration.json")
+# CALIBRATION_CLIP: jika diisi (video/folder gambar), kalibrasi dijalankan ulang saat startup dengan kandidat di bawah
+CALIBRATION_CLIP = os.environ.get("WAIFU_CALIBRATION_CLIP", "")
+# DETECTOR_CANDIDATES: kandidat kalibrasi dipisah ";" (spesifikasi dnn memakai koma); DETECTOR_MIN_RECALL: recall minimal
+DETECTOR_CANDIDATES = [spec.strip() for spec in os.environ.get("WAIFU_DETECTOR_CANDIDATES", "hog;haar").split(";") if spec.strip()]
+DETECTOR_MIN_RECALL = float(os.environ.get("WAIFU_DETECTOR_MIN_RECALL", "0.9"))
+
+# TRACKER_TYPE: "CSRT" (akurat), "KCF" atau "MOSSE" (lebih cepat untuk adegan ramai)
+TRACKER_TYPE = os.environ.get("WAIFU_TRACKER_TYPE", "CSRT")
+# TRACK_REFRESH_INTERVAL: detik sebelum identitas track yang sudah dikenali di-encode ulang
+TRACK_REFRESH_INTERVAL = float(os.environ.get("WAIFU_TRACK_REFRESH_INTERVAL", "2.0"))
+# TRACK_MIN_CONFIDENCE: kemiripan (%) di bawah nilai ini selalu di-encode ulang di siklus berikutnya
+TRACK_MIN_CONFIDENCE = float(os.environ.get("WAIFU_TRACK_MIN_CONFIDENCE", "70.0"))
+
+# SERVER: "flask" (server bawaan, satu thread per penonton) atau "asyncio" (satu event loop untuk
+# ratusan penonton; juga melayani WebSocket di /ws/video_feed/<id>)
+SERVER_MODE = os.environ.get("WAIFU_SERVER", "flask")
+
+# DEBUG_DUMP_COMPARISON: "1" = simpan gambar perbandingan ke debug_combined_img.jpg (di thread terpisah)
+DEBUG_DUMP_COMPARISON = os.environ.get("WAIFU_DEBUG_DUMP", "0") == "1"
+
+# EVENT_LOG: file SQLite log kejadian pencocokan (dibaca lewat /history). Kosong = tidak dicatat
+EVENT_LOG = os.environ.get("WAIFU_EVENT_LOG", "match_events.sqlite3")
+# EVENT_THUMBNAILS: "1" = juga simpan thumbnail wajah pengguna (JPEG 96x96) di setiap kejadian.
+# Nonaktif secara default: wajah pengunjung tidak disimpan ke disk tanpa diminta
+EVENT_THUMBNAILS = os.environ.get("WAIFU_EVENT_THUMBNAILS", "0") == "1"
+
 # Inisialisasi aplikasi Flask
-app = Flask(_name_)
-
-# Variabel global untuk menyimpan objek webcam dan statusnya
-video_stream = None
-video_stream_lock = threading.Lock()
-
-# --- Queue untuk berbagi data perbandingan ---
-# generate_frames akan memasukkan data ke queue ini
-# compare_frame akan mengambil data dari queue ini
-comparison_data_queue = queue.Queue(maxsize=1) # Maxsize 1 agar hanya menyimpan data terbaru
-
-# --- Variabel global untuk menyimpan data perbandingan terakhir yang berhasil ---
-# Ini akan membuat gambar perbandingan "lengket"
-last_successful_comparison_data = (None, None, "Tidak Ada", 0.0)
-last_detection_time = time.time() # Waktu terakhir deteksi wajah yang berhasil
-
-# --- Bagian 1: Memuat Enkripsi Waifu ---
-waifu_encodings = []
-waifu_names = []
-try:
-    with open("waifu_encodings.pickle", "rb") as f:
-        waifu_encodings, waifu_names = pickle.load(f)
-    print("File 'waifu_encodings.pickle' berhasil dimuat.")
-except FileNotFoundError:
-    print("Error: File 'waifu_encodings.pickle' tidak ditemukan.")
-    print("Pastikan Anda telah membuat file ini dengan enkripsi wajah waifu yang benar.")
-    print("Program akan berhenti.")
-    exit()
-except Exception as e:
-    print(f"Error saat memuat file pickle: {e}")
-    exit()
-
-# --- Bagian 2: Fungsi Pembantu ---
-def face_distance_to_confidence(face_distance, threshold=0.6):
-    if face_distance > threshold:
-        return round(100 * (1.0 - face_distance), 2)
+app = Flask(__name__)
+
+pipeline_config = PipelineConfig(target_fps=TARGET_FPS, detection_worker_mode=DETECTION_WORKER_MODE,
+                                 min_detection_interval=MIN_DETECTION_INTERVAL,
+                                 max_detection_interval=MAX_DETECTION_INTERVAL, tracker_type=TRACKER_TYPE,
+                                 track_refresh_interval=TRACK_REFRESH_INTERVAL,
+                                 track_min_confidence=TRACK_MIN_CONFIDENCE, detection_scale=DETECTION_SCALE,
+                                 motion_gating=MOTION_GATING, full_sweep_interval=FULL_SWEEP_INTERVAL,
+                                 roi_max_side=ROI_MAX_SIDE, motion_threshold=MOTION_THRESHOLD,
+                                 motion_min_area=MOTION_MIN_AREA, idle_sweep_interval=IDLE_SWEEP_INTERVAL,
+                                 detection_budget=DETECTION_BUDGET)
+
+cameras = {}
+shared_gallery = None
+event_log = None
+
+# Proses kamera (multiprocessing spawn) mengimpor ulang file ini sebagai __mp_main__;
+# galeri dan kamera hanya disiapkan di proses server.
+if __name__ != "__mp_main__":
+    # --- Bagian 1: Memuat Enkripsi Waifu ---
+    try:
+        waifu_matcher = load_matcher(WAIFU_GALLERY_PATH, "waifu_encodings.pickle", WAIFU_INDEX_PATH, WAIFU_INDEX_NPROBE,
+                                     verify_checksum=WAIFU_GALLERY_VERIFY)
+    except FileNotFoundError:
+        print("Error: File 'waifu_encodings.pickle' tidak ditemukan.")
+        print("Pastikan Anda telah membuat file ini dengan enkripsi wajah waifu yang benar.")
+        print("Program akan berhenti.")
+        exit()
+    except Exception as e:
+        print(f"Error saat memuat galeri waifu: {e}")
+        exit()
+    waifu_names = waifu_matcher.names
+
+    # --- Detektor wajah ---
+    try:
+        detector_spec = resolve_detector(DETECTOR, DETECTOR_CALIBRATION, CALIBRATION_CLIP, DETECTOR_CANDIDATES,
+                                         DETECTOR_MIN_RECALL, DETECTION_SCALE)
+        # Dibuat sekali di sini hanya untuk memeriksa spesifikasi; worker membuat detektornya sendiri
+        create_detector(detector_spec)
+    except Exception as e:
+        print(f"Peringatan: Detektor '{DETECTOR}' tidak dapat dipakai: {e}. Menggunakan 'hog'.")
+        detector_spec = "hog"
+    pipeline_config = pipeline_config._replace(detector=detector_spec)
+    print(f"Detektor wajah: {detector_spec}")
+
+    # Log kejadian pencocokan; semua kamera (termasuk proses kamera) menulis lewat satu penulis di proses ini
+    if EVENT_LOG:
+        try:
+            event_log = MatchEventLog(EVENT_LOG, store_thumbnails=EVENT_THUMBNAILS)
+        except Exception as e:
+            print(f"Peringatan: Gagal membuka log kejadian '{EVENT_LOG}': {e}. Kejadian tidak dicatat.")
+
+    # --- Bagian 2: Kamera ---
+    try:
+        camera_sources = parse_camera_sources(CAMERA_SOURCES or CAPTURE_SOURCE)
+    except ValueError as e:
+        print(f"Error: Konfigurasi WAIFU_CAMERAS tidak valid: {e}")
+        exit()
+
+    camera_mode = CAMERA_MODE
+    if camera_mode == "auto":
+        camera_mode = "thread" if len(camera_sources) == 1 else "process"
+    elif camera_mode == "thread" and len(camera_sources) > 1:
+        # Metrik & GIL dipakai bersama di satu proses; beberapa kamera selalu dijalankan di proses sendiri
+        print("Peringatan: Mode kamera 'thread' hanya untuk satu kamera. Menggunakan mode 'process'.")
+        camera_mode = "process"
+
+    if camera_mode == "process":
+        # Satu salinan galeri di shared memory, dipakai bersama oleh semua proses kamera
+        shared_gallery = SharedGallery(waifu_matcher)
+        print(f"Galeri dibagikan lewat shared memory ({shared_gallery.nbytes / 1e6:.1f} MB) ke {len(camera_sources)} proses kamera.")
+        # Batas LRU thumbnail berlaku untuk total semua proses, bukan per proses
+        thumbnail_options = {"max_items": max(1, WAIFU_THUMBNAIL_CACHE_SIZE // len(camera_sources)),
+                             "memmap_path": WAIFU_THUMBNAIL_MEMMAP or None,
+                             "preload": WAIFU_THUMBNAIL_PRELOAD}
+        for camera_id, source in camera_sources.items():
+            cameras[camera_id] = CameraProcess(camera_id, source, CAPTURE_LOOP, pipeline_config, shared_gallery.handle,
+                                               thumbnail_options, debug_dump=DEBUG_DUMP_COMPARISON,
+                                               event_log=event_log)
     else:
-        return round(100 * (1.0 - face_distance * face_distance), 2)
-
-def get_waifu_image_path(waifu_name, dataset_base_path="waifu_dataset"):
-    waifu_folder = os.path.join(dataset_base_path, waifu_name)
-    if os.path.isdir(waifu_folder):
-        for filename in os.listdir(waifu_folder):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                found_path = os.path.join(waifu_folder, filename)
-                return found_path
-    return None
-
-def initialize_webcam():
-    global video_stream
-    with video_stream_lock:
-        if video_stream is None or not video_stream.isOpened():
-            print("[INFO] Mencoba membuka webcam (indeks 1) di startup aplikasi...")
-            temp_cap = cv2.VideoCapture(0)
-            
-            if not temp_cap.isOpened():
-                print("[INFO] Webcam indeks 1 gagal. Mencoba membuka webcam (indeks 0) di startup aplikasi...")
-                temp_cap = cv2.VideoCapture(0)
-            
-            if not temp_cap.isOpened():
-                print("Error: Tidak dapat membuka webcam saat startup. Pastikan webcam terhubung dengan benar, drivernya terinstal, dan tidak sedang digunakan oleh aplikasi lain (misalnya Zoom, Skype, aplikasi Kamera).")
-                temp_cap.release()
-                video_stream = None
-            else:
-                video_stream = temp_cap
-                video_stream.set(cv2.CAP_PROP_FPS, 30)
-                video_stream.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                video_stream.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                print("Webcam berhasil diinisialisasi saat startup.")
-        else:
-            print("Webcam sudah aktif dari inisialisasi sebelumnya.")
+        # Thumbnail waifu siap tampil, agar loop frame tidak membaca ulang gambar dari disk
+        try:
+            thumbnail_store = ThumbnailStore(max_items=WAIFU_THUMBNAIL_CACHE_SIZE, memmap_path=WAIFU_THUMBNAIL_MEMMAP or None)
+        except Exception as e:
+            print(f"Peringatan: Gagal memuat thumbnail memmap '{WAIFU_THUMBNAIL_MEMMAP}': {e}. Thumbnail dibaca dari disk.")
+            thumbnail_store = ThumbnailStore(max_items=WAIFU_THUMBNAIL_CACHE_SIZE)
+        for camera_id, source in camera_sources.items():
+            cameras[camera_id] = LocalCamera(camera_id, source, CAPTURE_LOOP, pipeline_config, waifu_matcher,
+                                             thumbnail_store, debug_dump=DEBUG_DUMP_COMPARISON, event_log=event_log)
 
-# --- Bagian 3: Fungsi Generator untuk Streaming Video Utama ---
-def generate_frames():
-    global video_stream, last_successful_comparison_data, last_detection_time
+    # Rute tanpa id kamera (/video_feed, /compare_frame) memakai kamera pertama
+    default_camera_id = next(iter(cameras))
 
-    with video_stream_lock:
-        if video_stream is None or not video_stream.isOpened():
-            print("Webcam tidak tersedia. Streaming tidak dapat dimulai.")
-            return
 
-    active_face_trackers = []
-    frame_count = 0
-    DETECTION_INTERVAL = 5
+def get_camera(camera_id):
+    camera = cameras.get(default_camera_id if camera_id is None else camera_id)
+    if camera is None:
+        abort(404, description=f"Kamera '{camera_id}' tidak dikenal.")
+    return camera
 
-    while True:
-        try:
-            with video_stream_lock:
-                if video_stream is None or not video_stream.isOpened():
-                    print("Webcam tidak lagi tersedia atau ditutup. Menghentikan streaming.")
-                    break
 
-                ret, frame = video_stream.read()
+def initialize_cameras():
+    # Pipeline berjalan sejak startup agar /compare_frame tetap terisi tanpa penonton
+    for camera in cameras.values():
+        camera.start()
 
-            if not ret:
-                print("Gagal membaca frame dari webcam. Streaming berhenti.")
-                break
 
-            if frame is None or frame.size == 0:
-                print("Peringatan: Frame kosong atau tidak valid diterima dari webcam. Melewatkan frame ini.")
+# --- Bagian 3: Fungsi Generator untuk Streaming Video Utama (per penonton) ---
+def generate_frames(camera):
+    broadcaster = camera.broadcaster
+    subscriber = broadcaster.subscribe()
+    try:
+        while True:
+            try:
+                frame_bytes = subscriber.get(timeout=5)
+            except queue.Empty:
+                if not broadcaster.is_running():
+                    print("Pipeline kamera tidak berjalan. Menghentikan streaming.")
+                    break
                 continue
 
-            current_user_face_img_rgb = None
-            current_matched_waifu_img_rgb = None
-            current_matched_waifu_name = "Tidak Ada"
-            current_matched_similarity = 0.0
-            
-            face_detected_in_this_frame = False
-
-            if frame_count % DETECTION_INTERVAL == 0:
-                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                if small_frame is None or small_frame.size == 0:
-                    print("Peringatan: small_frame kosong atau tidak valid setelah resize. Melewatkan frame ini.")
-                    continue
-                rgb_small = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                if rgb_small is None or rgb_small.size == 0:
-                    print("Peringatan: rgb_small kosong atau tidak valid setelah konversi warna. Melewatkan frame ini.")
-                    continue
-
-                try:
-                    locations = face_recognition.face_locations(rgb_small)
-                    encodings = face_recognition.face_encodings(rgb_small, locations)
-
-                    active_face_trackers = []
-
-                    for i, face_encoding in enumerate(encodings):
-                        distances = face_recognition.face_distance(waifu_encodings, face_encoding)
-                        best_match_idx = np.argmin(distances)
-
-                        name = "Unknown"
-                        similarity = 0.0
-
-                        if distances[best_match_idx] < 0.6:
-                            name = waifu_names[best_match_idx]
-                            similarity = face_distance_to_confidence(distances[best_match_idx])
-
-                            if name != "Unknown":
-                                face_detected_in_this_frame = True # Tandai bahwa wajah terdeteksi
-                                top, right, bottom, left = locations[i]
-                                top *= 4
-                                right *= 4
-                                bottom *= 4
-                                left *= 4
-
-                                user_face_cropped = frame[top:bottom, left:right]
-                                if user_face_cropped.size > 0:
-                                    # --- Memperbesar ukuran gambar wajah yang dipotong ---
-                                    user_face_resized = cv2.resize(user_face_cropped, (350, 350), interpolation=cv2.INTER_AREA) 
-                                    current_user_face_img_rgb = cv2.cvtColor(user_face_resized, cv2.COLOR_BGR2RGB)
-
-                                    waifu_img_path = get_waifu_image_path(name)
-                                    if waifu_img_path:
-                                        waifu_img_bgr = cv2.imread(waifu_img_path)
-                                        if waifu_img_bgr is not None and waifu_img_bgr.size > 0:
-                                            if waifu_img_bgr.dtype != np.uint8:
-                                                waifu_img_bgr = waifu_img_bgr.astype(np.uint8)
-                                            # --- Memperbesar ukuran gambar waifu yang dipotong ---
-                                            waifu_img_resized = cv2.resize(waifu_img_bgr, (350, 350), interpolation=cv2.INTER_AREA) 
-                                            current_matched_waifu_img_rgb = cv2.cvtColor(waifu_img_resized, cv2.COLOR_BGR2RGB)
-                                        else:
-                                            print(f"DEBUG: cv2.imread gagal memuat gambar waifu: {waifu_img_path}")
-                                    else:
-                                        print(f"DEBUG: Path gambar waifu tidak ditemukan untuk {name}.")
-                                    
-                                    current_matched_waifu_name = name
-                                    current_matched_similarity = similarity
-                                    
-                                    # print(f"DEBUG: Data perbandingan diperbarui. User face: {current_user_face_img_rgb is not None}, Waifu face: {current_matched_waifu_img_rgb is not None}, Nama: {current_matched_waifu_name}, Kemiripan: {current_matched_similarity:.2f}%")
-                                else:
-                                    print(f"Peringatan: Wajah pengguna yang dipotong kosong untuk {name}.")
-
-                        top, right, bottom, left = locations[i]
-                        top *= 4
-                        right *= 4
-                        bottom *= 4
-                        left *= 4
-
-                        tracker = cv2.TrackerCSRT_create()
-                        bbox = (left, top, right - left, bottom - top)
-
-                        try:
-                            tracker.init(frame, bbox)
-                            active_face_trackers.append((tracker, name, similarity))
-                        except Exception as e_init:
-                            print(f"Error saat inisialisasi tracker: {e_init}")
-
-                except Exception as e:
-                    print(f"Error saat memproses face_recognition (locations/encodings): {e}")
-                    active_face_trackers = []
-                    pass
-
-            else:
-                updated_trackers = []
-                for tracker, name, similarity in active_face_trackers:
-                    success, bbox = tracker.update(frame)
-
-                    if success:
-                        updated_trackers.append((tracker, name, similarity))
-                        face_detected_in_this_frame = True # Tandai bahwa wajah terdeteksi (melalui tracking)
-
-                        left, top, w, h = [int(v) for v in bbox]
-                        right = left + w
-                        bottom = top + h
-
-                        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                        
-                        # --- Bagian yang menampilkan nama dan persentase ---
-                        label = f"{name} ({similarity:.2f}%)"
-                        if frame_count % DETECTION_INTERVAL != 0:
-                            label += " (Tracked)"
-
-                        # Dapatkan ukuran teks untuk menggambar latar belakang
-                        (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
-                        
-                        # Gambar persegi panjang terisi sebagai latar belakang teks
-                        # Posisikan persegi panjang sedikit di atas kotak pembatas
-                        cv2.rectangle(frame, (left, top - text_height - baseline - 10), (left + text_width, top - 10), (0, 0, 0), cv2.FILLED) # Latar belakang hitam
-                        
-                        # Tampilkan teks pada frame
-                        cv2.putText(frame, label, (left, top - baseline - 5), # Sesuaikan posisi Y sedikit
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2) # Teks putih
-                        # --- Akhir bagian tampilan teks ---
-                    else:
-                        pass
-                active_face_trackers = updated_trackers
-
-            # --- Masukkan data perbandingan ke queue ---
-            # Data ini akan digunakan oleh rute /compare_frame
-            if current_user_face_img_rgb is not None and current_matched_waifu_img_rgb is not None:
-                try:
-                    # Hapus item lama jika ada (agar selalu menyimpan data terbaru)
-                    if not comparison_data_queue.empty():
-                        comparison_data_queue.get_nowait()
-                    comparison_data_queue.put_nowait((current_user_face_img_rgb, 
-                                                    current_matched_waifu_img_rgb, 
-                                                    current_matched_waifu_name, 
-                                                    current_matched_similarity))
-                    last_successful_comparison_data = (current_user_face_img_rgb, current_matched_waifu_img_rgb, current_matched_waifu_name, current_matched_similarity)
-                    last_detection_time = time.time() # Update waktu deteksi terakhir
-                    # print("DEBUG: Data perbandingan dimasukkan ke queue.") # Matikan agar tidak terlalu banyak log
-                except queue.Full:
-                    # Queue penuh, berarti item sebelumnya belum diambil, lewati saja
-                    pass
-                except Exception as e_queue:
-                    print(f"Error saat memasukkan data ke queue: {e_queue}")
-            else:
-                # Jika tidak ada wajah yang dikenali atau gambar waifu tidak dimuat,
-                # masukkan None ke queue, tetapi JANGAN reset last_successful_comparison_data
-                try:
-                    if not comparison_data_queue.empty():
-                        comparison_data_queue.get_nowait()
-                    comparison_data_queue.put_nowait((None, None, "Tidak Ada", 0.0))
-                except queue.Full:
-                    pass # Biarkan saja jika queue penuh dengan data lama
-
-
-            frame_count += 1
-
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                print("Gagal meng-encode frame ke JPEG.")
-                continue
-            frame = buffer.tobytes()
+            if frame_bytes is None:
+                break
+
             yield (b'--frame\r\n'
-                b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-        
-        except Exception as e:
-            print(f"Error tak terduga saat memproses frame: {e}")
-            break
+                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    finally:
+        broadcaster.unsubscribe(subscriber)
 
 # --- Bagian 4: Rute Flask ---
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/video_feed')
-def video_feed():
-    response = Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+@app.route('/video_feed', defaults={'camera_id': None})
+@app.route('/video_feed/<camera_id>')
+def video_feed(camera_id):
+    camera = get_camera(camera_id)
+    response = Response(generate_frames(camera), mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.headers.update(NO_STORE_HEADERS)
     return response
 
-@app.route('/compare_frame') # Rute untuk mendapatkan satu frame perbandingan
-def compare_frame():
-    global last_successful_comparison_data, last_detection_time
-    
-    user_face_to_display = None
-    waifu_face_to_display = None
-    waifu_name_to_display = "Tidak Ada"
-    similarity_to_display = 0.0
-
+@app.route('/compare_frame', defaults={'camera_id': None}) # Rute untuk mendapatkan satu frame perbandingan
+@app.route('/compare_frame/<camera_id>')
+def compare_frame(camera_id):
+    status, headers, body = comparison_response(get_camera(camera_id), request.headers.get("If-None-Match"))
+    return Response(body, status=status, headers=headers)
+
+
+# --- Metrik server per kamera (metrik pipeline dikumpulkan dari setiap kamera) ---
+metrics_registry.gauge("waifu_camera_up", "1 jika pipeline kamera sedang berjalan.", labelnames=("camera",),
+                       callback=lambda: {(camera_id,): int(camera.broadcaster.is_running()) for camera_id, camera in cameras.items()})
+metrics_registry.gauge("waifu_stream_clients", "Jumlah penonton /video_feed yang terhubung.", labelnames=("camera",),
+                       callback=lambda: {(camera_id,): camera.broadcaster.subscriber_count() for camera_id, camera in cameras.items()})
+metrics_registry.gauge("waifu_detector_info", "Backend detektor wajah yang dipakai pipeline.", labelnames=("detector",),
+                       callback=lambda: {(pipeline_config.detector,): 1})
+metrics_registry.counter("waifu_subscriber_frame_drops_total", "Frame yang dibuang karena buffer penonton lambat penuh.",
+                         labelnames=("camera",),
+                         callback=lambda: {(camera_id,): camera.broadcaster.frame_drops for camera_id, camera in cameras.items()})
+metrics_registry.counter("waifu_comparison_drops_total", "Data perbandingan yang tertimpa sebelum diambil /compare_frame.",
+                         labelnames=("camera",),
+                         callback=lambda: {(camera_id,): camera.comparison.drops for camera_id, camera in cameras.items()})
+
+@app.route('/metrics')
+def metrics():
+    # Format teks Prometheus; dibaca oleh scraper, bukan browser
+    pipeline_metrics = [({"camera": camera_id}, camera.pipeline_metrics()) for camera_id, camera in cameras.items()]
+    return Response(metrics_registry.render(extra=pipeline_metrics), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+# --- Riwayat kejadian pencocokan ---
+def _query_float(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
     try:
-        # Coba ambil data terbaru dari queue (non-blocking)
-        # Jika ada data baru, gunakan itu dan update last_successful_comparison_data
-        temp_user_face, temp_waifu_face, temp_waifu_name, temp_similarity = comparison_data_queue.get_nowait()
-        
-        if temp_user_face is not None and temp_waifu_face is not None:
-            user_face_to_display = temp_user_face
-            waifu_face_to_display = temp_waifu_face
-            waifu_name_to_display = temp_waifu_name
-            similarity_to_display = temp_similarity
-            last_successful_comparison_data = (user_face_to_display, waifu_face_to_display, waifu_name_to_display, similarity_to_display)
-            last_detection_time = time.time() # Update waktu deteksi terakhir yang berhasil
-            # print(f"DEBUG [compare_frame]: Data baru diambil dari queue. Nama: {waifu_name_to_display}")
-        else:
-            # Jika data dari queue tidak lengkap (misalnya None), gunakan data terakhir yang berhasil
-            user_face_to_display, waifu_face_to_display, waifu_name_to_display, similarity_to_display = last_successful_comparison_data
-            # print(f"DEBUG [compare_frame]: Queue kosong/data tidak lengkap, menggunakan data terakhir yang berhasil. Nama: {waifu_name_to_display}")
-
-    except queue.Empty:
-        # Jika queue kosong, gunakan data terakhir yang berhasil
-        user_face_to_display, waifu_face_to_display, waifu_name_to_display, similarity_to_display = last_successful_comparison_data
-        # print(f"DEBUG [compare_frame]: Queue kosong, menggunakan data terakhir yang berhasil. Nama: {waifu_name_to_display}")
-    
-    # Kriteria untuk menampilkan placeholder:
-    # 1. Belum pernah ada deteksi yang berhasil (last_successful_comparison_data masih None)
-    # ATAU
-    # 2. Sudah lama tidak ada deteksi wajah yang berhasil (misal > 5 detik)
-    if (user_face_to_display is None or waifu_face_to_display is None) or \
-    (time.time() - last_detection_time > 5 and waifu_name_to_display == "Tidak Ada"): # 5 detik tanpa deteksi
-        
-        # print("DEBUG [compare_frame]: Mengirim placeholder karena tidak ada data yang valid atau sudah lama tidak ada deteksi.")
-        placeholder_img = np.zeros((350, 700, 3), dtype=np.uint8) # Diperbesar placeholder
-        cv2.putText(placeholder_img, "Menunggu Deteksi Wajah...", (70, 175), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2) # Teks diperbesar
-        ret, buffer = cv2.imencode('.jpg', placeholder_img)
-        frame_bytes = buffer.tobytes()
-        return Response(frame_bytes, mimetype='image/jpeg', headers={'Cache-Control': 'no-cache, no-store', 'must-revalidate': 'no-cache, no-store', 'Pragma': 'no-cache', 'Expires': '0'})
-    
-    # Jika ada data yang valid (baik baru dari queue atau yang terakhir berhasil)
-    else:
-        h1, w1, _ = user_face_to_display.shape
-        h2, w2, _ = waifu_face_to_display.shape
-        
-        padding = 50 # Padding lebih besar
-        # --- PERBAIKAN: Meningkatkan text_area_height untuk ruang teks yang lebih besar ---
-        text_area_height = 200 # Ditingkatkan lagi dari 180
-        combined_width = w1 + w2 + padding * 3
-        combined_height = max(h1, h2) + padding * 2 + text_area_height # Menggunakan text_area_height baru
-        
-        combined_img = np.full((combined_height, combined_width, 3), 50, dtype=np.uint8)
-
-        try:
-            combined_img[padding:padding+h1, padding:padding+w1] = user_face_to_display
-            combined_img[padding:padding+h2, padding + w1 + padding:padding + w1 + padding + w2] = waifu_face_to_display
-        except ValueError as e:
-            print(f"ERROR: ValueError saat menempatkan gambar ke combined_img: {e}")
-            print(f"  combined_img shape: {combined_img.shape}")
-            print(f"  user_face_to_display shape: {user_face_to_display.shape}")
-            print(f"  waifu_face_to_display shape: {waifu_face_to_display.shape}")
-            # Fallback to placeholder on error
-            placeholder_img = np.zeros((350, 700, 3), dtype=np.uint8)
-            cv2.putText(placeholder_img, "Image Combine Error!", (70, 175), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
-            ret, buffer = cv2.imencode('.jpg', placeholder_img)
-            frame_bytes = buffer.tobytes()
-            return Response(frame_bytes, mimetype='image/jpeg', headers={'Cache-Control': 'no-cache, no-store', 'must-revalidate': 'no-cache, no-store', 'Pragma': 'no-cache', 'Expires': '0'})
-
-
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 1.0 # Skala font lebih besar
-        font_thickness = 2
-        text_color = (255, 255, 255)
-
-        # --- PERBAIKAN: Menyesuaikan posisi Y teks lebih lanjut ---
-        cv2.putText(combined_img, "Wajah Anda", (padding, padding + h1 + 90), font, font_scale, text_color, font_thickness) # Y disesuaikan
-        
-        waifu_text = f"Waifu: {waifu_name_to_display}"
-        similarity_text = f"Kemiripan: {similarity_to_display:.2f}%"
-        
-        cv2.putText(combined_img, waifu_text, (padding + w1 + padding, padding + h2 + 90), font, font_scale, text_color, font_thickness) # Y disesuaikan
-        cv2.putText(combined_img, similarity_text, (padding + w1 + padding, padding + h2 + 170), font, font_scale, text_color, font_thickness) # Posisi Y disesuaikan lagi (dari 150 menjadi 170)
-        # --- AKHIR PERBAIKAN POSISI TEKS ---
-
-        combined_img_bgr = cv2.cvtColor(combined_img, cv2.COLOR_RGB2BGR)
-        
-        # --- DEBUG: Simpan gambar gabungan ke file sebelum encode ---
-        debug_filename = "debug_combined_img.jpg"
+        return float(value)
+    except ValueError:
+        abort(400, description=f"Parameter '{name}' harus berupa angka (detik Unix).")
+
+@app.route('/history')
+def history():
+    # Parameter: name, camera, since, until (detik Unix), limit (maks 500), cursor (dari next_cursor)
+    if event_log is None:
+        abort(404, description="Log kejadian tidak aktif (WAIFU_EVENT_LOG kosong).")
+    cursor = None
+    if request.args.get("cursor"):
         try:
-            cv2.imwrite(debug_filename, combined_img_bgr)
-            # print(f"DEBUG [compare_frame]: Menyimpan gambar gabungan ke {debug_filename}") # Matikan agar tidak terlalu banyak log
-        except Exception as e_imwrite:
-            print(f"DEBUG [compare_frame]: Gagal menyimpan debug_combined_img.jpg: {e_imwrite}")
-        # --- END DEBUG ---
-
-        ret, buffer = cv2.imencode('.jpg', combined_img_bgr)
-        
-        if not ret or len(buffer.tobytes()) == 0:
-            print("DEBUG [compare_frame]: Gagal meng-encode gambar perbandingan ke JPEG (ret=False atau buffer kosong).")
-            placeholder_img = np.zeros((350, 700, 3), dtype=np.uint8)
-            cv2.putText(placeholder_img, "Encoding Failed!", (70, 175), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
-            ret, buffer = cv2.imencode('.jpg', placeholder_img)
-            frame_bytes = buffer.tobytes()
-            return Response(frame_bytes, mimetype='image/jpeg', headers={'Cache-Control': 'no-cache, no-store', 'must-revalidate': 'no-cache, no-store', 'Pragma': 'no-cache', 'Expires': '0'})
-        
-        frame_bytes = buffer.tobytes()
-        return Response(frame_bytes, mimetype='image/jpeg', headers={'Cache-Control': 'no-cache, no-store', 'must-revalidate': 'no-cache, no-store', 'Pragma': 'no-cache', 'Expires': '0'})
+            timestamp, event_id = request.args["cursor"].split(":")
+            cursor = (float(timestamp), int(event_id))
+        except ValueError:
+            abort(400, description="Parameter 'cursor' tidak valid.")
+    try:
+        limit = min(500, max(1, int(request.args.get("limit", "50"))))
+    except ValueError:
+        abort(400, description="Parameter 'limit' harus berupa bilangan bulat.")
+
+    events, next_cursor = event_log.query(name=request.args.get("name"), camera=request.args.get("camera"),
+                                          since=_query_float("since"), until=_query_float("until"),
+                                          cursor=cursor, limit=limit)
+    for event in events:
+        event["time"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(event["timestamp"]))
+        event["thumbnail_url"] = f"/history/{event['id']}/thumbnail" if event.pop("has_thumbnail") else None
+    return jsonify({"events": events,
+                    "next_cursor": f"{next_cursor[0]!r}:{next_cursor[1]}" if next_cursor is not None else None})
+
+@app.route('/history/<int:event_id>/thumbnail')
+def history_thumbnail(event_id):
+    thumbnail = event_log.thumbnail(event_id) if event_log is not None else None
+    if thumbnail is None:
+        abort(404)
+    # Kejadian tidak pernah berubah setelah ditulis
+    response = Response(thumbnail, mimetype='image/jpeg')
+    response.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+    return response
+
+metrics_registry.counter("waifu_match_events_written_total", "Kejadian pencocokan yang sudah ditulis ke log.",
+                         callback=lambda: event_log.written if event_log is not None else 0)
+metrics_registry.counter("waifu_match_events_dropped_total", "Kejadian pencocokan yang dibuang karena antrean log penuh.",
+                         callback=lambda: event_log.dropped if event_log is not None else 0)
+metrics_registry.gauge("waifu_match_event_queue_size", "Kejadian pencocokan yang menunggu ditulis.",
+                       callback=lambda: event_log.queue_size() if event_log is not None else 0)
 
 
 # --- Bagian 5: Fungsi Cleanup saat aplikasi ditutup ---
-def teardown_webcam(exception=None):
-    global video_stream
-    with video_stream_lock:
-        if video_stream is not None:
-            video_stream.release()
-            print("Webcam berhasil dilepaskan.")
-            video_stream = None
+def teardown_cameras(exception=None):
+    for camera in cameras.values():
+        camera.stop()
+    if shared_gallery is not None:
+        shared_gallery.close()
+    if event_log is not None:
+        event_log.close()
 
 # --- Bagian 6: Menjalankan Aplikasi Flask ---
-if _name_ == '_main_':
+if __name__ == '__main__':
     if not os.path.exists('templates'):
         os.makedirs('templates')
 
     html_file_path = os.path.join('templates', 'index.html')
     # Pastikan file 'templates/index.html' sudah ada dan berisi konten yang benar.
 
-    initialize_webcam()
+    if WAIFU_THUMBNAIL_PRELOAD and camera_mode == "thread":
+        thumbnail_store.preload(waifu_names)
+        print("Cache thumbnail waifu telah diisi.")
+
+    initialize_cameras()
 
-    print("\n[INFO] Menjalankan aplikasi Flask...")
+    print(f"\n[INFO] Menjalankan aplikasi ({'asyncio' if SERVER_MODE == 'asyncio' else 'Flask'})...")
     print("Akses aplikasi di: http://127.0.0.1:5000/")
+    for camera_id in cameras:
+        print(f"  Kamera {camera_id}: /video_feed/{camera_id}  /compare_frame/{camera_id}")
+    if event_log is not None:
+        print(f"  Riwayat pencocokan: /history (log: {EVENT_LOG})")
     try:
-        app.run(host='0.0.0.0', port=5000, debug=False)
+        if SERVER_MODE == "asyncio":
+            # Server asyncio opsional; mode flask tidak perlu mengimpornya
+            from stream_server import StreamServer
+            try:
+                StreamServer(cameras, default_camera_id, wsgi_app=app).run(host='0.0.0.0', port=5000)
+            except KeyboardInterrupt:
+                pass
+        else:
+            app.run(host='0.0.0.0', port=5000, debug=False)
     finally:
-        teardown_webcam()    
+        teardown_cameras()    
@@ -0,0 +1,244 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Metrik ringan untuk /metrics (format teks Prometheus) ---
+# Tanpa dependensi tambahan: setiap metrik hanya berupa beberapa angka yang
+# dilindungi satu lock, sehingga aman dipanggil dari loop frame.
+# collect() menghasilkan data biasa (list/tuple) yang bisa dikirim antar
+# proses, sehingga proses kamera cukup mengirim hasil collect() ke server dan
+# server menggabungkannya dengan label camera="...".
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = ((name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # callback: fungsi tanpa argumen yang dibaca saat scrape. Untuk metrik berlabel,
+        # callback mengembalikan dict {tuple nilai label: nilai}.
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Label untuk {self.name} harus {self.labelnames}, bukan {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self):
+        """List (nama sampel, pasangan label, nilai)."""
+        if self.callback is not None:
+            values = self.callback()
+            items = list(values.items()) if self.labelnames else [((), values)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [(self.name, tuple(zip(self.labelnames, labelvalues)), value) for labelvalues, value in items]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames, callback)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames, callback)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class RateGauge(_Metric):
+    """Laju per detik (mis. FPS atau byte/detik), dihitung per jendela waktu."""
+
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), window=1.0):
+        super().__init__(name, documentation, labelnames)
+        self.window = window
+        self._windows = {}
+
+    def add(self, amount=1, **labels):
+        key = self._key(labels)
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._windows:
+                # Kejadian pertama hanya membuka jendela
+                self._windows[key] = (now, 0)
+                return
+            window_start, window_amount = self._windows[key]
+            window_amount += amount
+            elapsed = now - window_start
+            if elapsed >= self.window:
+                self._values[key] = (window_amount / elapsed, now)
+                window_start, window_amount = now, 0
+            self._windows[key] = (window_start, window_amount)
+
+    def samples(self):
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._values.items())
+        samples = []
+        for labelvalues, (rate, updated_at) in items:
+            # Tidak ada data lagi (mis. kamera berhenti): laju dianggap nol
+            if now - updated_at > 2 * self.window:
+                rate = 0.0
+            samples.append((self.name, tuple(zip(self.labelnames, labelvalues)), rate))
+        return samples
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [jumlah per bucket (non-kumulatif) + bucket +Inf, total, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        samples = []
+        for labelvalues, (bucket_counts, total, count) in items:
+            labels = tuple(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", labels + (("le", _format_value(upper_bound)),), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+def render_families(labelled_families):
+    """labelled_families: list (label tambahan dict, hasil MetricsRegistry.collect()).
+
+    Metrik bernama sama dari beberapa sumber digabung di bawah satu HELP/TYPE.
+    """
+    families = {}
+    for extra_labels, collected in labelled_families:
+        extra_pairs = tuple(extra_labels.items())
+        for name, documentation, metric_type, samples in collected:
+            family = families.setdefault(name, (documentation, metric_type, []))
+            for sample_name, labels, value in samples:
+                family[2].append(f"{sample_name}{_format_labels(extra_pairs + tuple(labels))} {_format_value(value)}")
+
+    lines = []
+    for name, (documentation, metric_type, sample_lines) in families.items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(sample_lines)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def rate_gauge(self, *args, **kwargs):
+        return self.register(RateGauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def collect(self):
+        """List (nama, dokumentasi, tipe, sampel); aman di-pickle untuk dikirim antar proses."""
+        return [(metric.name, metric.documentation, metric.metric_type, metric.samples()) for metric in self._metrics]
+
+    def render(self, extra=()):
+        """extra: list (label tambahan dict, hasil collect() registry lain) yang ikut dirender."""
+        return render_families([({}, self.collect())] + list(extra))
+
+
+# Metrik server (Flask): didefinisikan di match.py, berlabel camera
+registry = MetricsRegistry()
+
+# --- Metrik pipeline kamera ---
+# Satu registry per proses pipeline; server menambahkan label camera saat merender.
+pipeline_registry = MetricsRegistry()
+
+# Bucket tambahan di bawah 1 ms: tahap seperti tracker_update/annotation biasanya jauh di bawah itu
+PIPELINE_STAGE_SECONDS = pipeline_registry.histogram(
+    "waifu_pipeline_stage_seconds", "Durasi setiap tahap loop frame.", labelnames=("stage",),
+    buckets=(0.0001, 0.00025, 0.0005) + DEFAULT_BUCKETS)
+CAPTURE_FRAME_AGE_SECONDS = pipeline_registry.histogram(
+    "waifu_capture_frame_age_seconds", "Umur frame kamera saat diambil loop frame (staleness).")
+CAPTURE_FRAMES_DROPPED_TOTAL = pipeline_registry.counter(
+    "waifu_capture_frames_dropped_total", "Frame kamera yang ditimpa sebelum sempat diproses.")
+DETECTION_CYCLE_SECONDS = pipeline_registry.histogram(
+    "waifu_detection_cycle_seconds", "Waktu dari frame dikirim ke worker deteksi sampai hasilnya diterapkan.")
+DETECTION_SUBMISSIONS_TOTAL = pipeline_registry.counter(
+    "waifu_detection_submissions_total", "Deteksi yang dikirim ke worker, per jenis (full = seluruh frame, roi).",
+    labelnames=("kind",))
+DETECTION_GATED_FRAMES_TOTAL = pipeline_registry.counter(
+    "waifu_detection_gated_frames_total", "Kesempatan deteksi yang dilewati karena adegan statis.")
+FRAMES_TOTAL = pipeline_registry.counter("waifu_frames_total", "Jumlah frame yang diproses dan di-encode.")
+FRAMES_PER_SECOND = pipeline_registry.rate_gauge("waifu_frames_per_second", "FPS yang tercapai oleh loop frame.")
+ENCODED_BYTES_TOTAL = pipeline_registry.counter("waifu_encoded_bytes_total", "Total byte JPEG hasil encode frame stream.")
+ENCODED_BYTES_PER_SECOND = pipeline_registry.rate_gauge(
+    "waifu_encoded_bytes_per_second", "Byte JPEG per detik yang dihasilkan stream.")
+ACTIVE_TRACKERS = pipeline_registry.gauge("waifu_active_trackers", "Jumlah track wajah yang aktif.")
@@ -0,0 +1,160 @@
+import time
+
+import cv2
+
+# --- Gating gerakan & region of interest (ROI) untuk deteksi ---
+# Deteksi wajah adalah tahap termahal. Sebelum mengirim frame ke detektor,
+# frame dibandingkan dengan frame saat deteksi terakhir pada salinan grayscale
+# yang sangat kecil. Adegan statis tidak dideteksi ulang; jika ada gerakan,
+# deteksi hanya dijalankan di sekitar gerakan dan track yang ada, dengan
+# resolusi lebih tinggi daripada sapuan seluruh frame. Sapuan seluruh frame
+# tetap dilakukan berkala untuk menangkap wajah baru yang tidak bergerak.
+
+
+def expand_box(location, padding, width, height):
+    """Memperbesar kotak (top, right, bottom, left) sebesar padding x ukurannya di setiap sisi."""
+    top, right, bottom, left = location
+    pad_y = int((bottom - top) * padding)
+    pad_x = int((right - left) * padding)
+    return (max(0, top - pad_y), min(width, right + pad_x), min(height, bottom + pad_y), max(0, left - pad_x))
+
+
+def _overlaps(a, b):
+    return a[3] < b[1] and b[3] < a[1] and a[0] < b[2] and b[0] < a[2]
+
+
+def merge_boxes(boxes):
+    """Menggabungkan kotak yang tumpang-tindih sampai tidak ada lagi yang beririsan."""
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        while boxes:
+            box = boxes.pop()
+            for i, other in enumerate(boxes):
+                if _overlaps(box, other):
+                    boxes[i] = (min(box[0], other[0]), max(box[1], other[1]), max(box[2], other[2]), min(box[3], other[3]))
+                    merged = True
+                    break
+            else:
+                result.append(box)
+        boxes = result
+    return boxes
+
+
+class MotionDetector:
+    """Frame differencing pada salinan grayscale kecil terhadap frame referensi."""
+
+    def __init__(self, width=160, threshold=25, min_area=0.002):
+        self.width = width
+        self.threshold = threshold
+        # Luas minimal gumpalan gerakan, sebagai pecahan luas frame kecil
+        self.min_area = min_area
+        self._reference = None
+        self._last_tiny = None
+
+    def _tiny(self, frame):
+        height, width = frame.shape[:2]
+        tiny_height = max(1, int(height * self.width / width))
+        gray = cv2.cvtColor(cv2.resize(frame, (self.width, tiny_height), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def motion_boxes(self, frame):
+        """Kotak (top, right, bottom, left) skala penuh di mana frame berubah dibanding referensi.
+
+        Tanpa referensi (frame pertama), seluruh frame dianggap bergerak.
+        """
+        height, width = frame.shape[:2]
+        self._last_tiny = tiny = self._tiny(frame)
+        if self._reference is None or self._reference.shape != tiny.shape:
+            return [(0, width, height, 0)]
+
+        diff = cv2.absdiff(tiny, self._reference)
+        _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, None, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        factor = width / float(tiny.shape[1])
+        min_area = self.min_area * tiny.shape[0] * tiny.shape[1]
+        boxes = []
+        for contour in contours:
+            if cv2.contourArea(contour) < min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((int(y * factor), min(width, int((x + w) * factor)), min(height, int((y + h) * factor)), int(x * factor)))
+        return boxes
+
+    def set_reference(self):
+        """Menjadikan frame terakhir yang diperiksa motion_boxes() sebagai referensi."""
+        self._reference = self._last_tiny
+
+
+class DetectionPlanner:
+    """Memutuskan apakah dan di mana deteksi berikutnya dijalankan.
+
+    plan() mengembalikan None (lewati deteksi) atau list (box, skala) dengan
+    box None berarti seluruh frame.
+    """
+
+    def __init__(self, frame_scale=0.25, full_sweep_interval=2.0, roi_max_side=320, roi_padding=0.5,
+                 max_roi_coverage=0.5, min_region_side=16, motion_detector=None, idle_sweep_interval=None):
+        # Skala sapuan seluruh frame
+        self.frame_scale = frame_scale
+        self.full_sweep_interval = full_sweep_interval
+        # Interval sapuan saat adegan statis (boleh lebih jarang); tetap ada agar wajah
+        # yang terlewat saat bergerak lalu diam tetap terdeteksi. None = full_sweep_interval
+        self.idle_sweep_interval = full_sweep_interval if idle_sweep_interval is None else idle_sweep_interval
+        # ROI diperkecil sampai sisi terpanjangnya maksimal roi_max_side piksel (tidak pernah diperbesar,
+        # dan tidak lebih kecil dari frame_scale), sehingga wajah kecil/jauh tetap terdeteksi
+        self.roi_max_side = roi_max_side
+        self.roi_padding = roi_padding
+        # Jika ROI menutupi lebih dari pecahan ini, sapuan seluruh frame lebih murah
+        self.max_roi_coverage = max_roi_coverage
+        self.min_region_side = min_region_side
+        # None = tanpa gating: selalu seluruh frame (perilaku lama)
+        self.motion_detector = motion_detector
+        self._last_full_sweep = None
+
+    def roi_scale(self, box):
+        top, right, bottom, left = box
+        longest_side = max(bottom - top, right - left, 1)
+        return min(1.0, max(self.frame_scale, self.roi_max_side / float(longest_side)))
+
+    def plan(self, frame, track_locations=(), stale_track_locations=(), now=None):
+        """track_locations: kotak semua track; stale_track_locations: track yang perlu di-encode ulang."""
+        now = time.time() if now is None else now
+        full_frame = [(None, self.frame_scale)]
+        if self.motion_detector is None:
+            return full_frame
+
+        height, width = frame.shape[:2]
+        motion_boxes = self.motion_detector.motion_boxes(frame)
+        static = not motion_boxes and not stale_track_locations
+        # Sapuan berkala diperiksa sebelum gating, sehingga adegan statis tetap disapu
+        sweep_interval = self.idle_sweep_interval if static else self.full_sweep_interval
+        if self._last_full_sweep is None or now - self._last_full_sweep >= sweep_interval:
+            self.motion_detector.set_reference()
+            self._last_full_sweep = now
+            return full_frame
+        if static:
+            # Adegan statis dan semua identitas masih segar: tidak ada yang perlu dideteksi
+            return None
+
+        self.motion_detector.set_reference()
+
+        # Saat ada gerakan, semua track ikut diperiksa untuk mengoreksi drift tracker
+        boxes = list(motion_boxes) + list(stale_track_locations) + (list(track_locations) if motion_boxes else [])
+        boxes = merge_boxes(expand_box(box, self.roi_padding, width, height) for box in boxes)
+        coverage = sum((bottom - top) * (right - left) for top, right, bottom, left in boxes)
+        if coverage > self.max_roi_coverage * width * height:
+            self._last_full_sweep = now
+            return full_frame
+
+        regions = []
+        for box in boxes:
+            scale = self.roi_scale(box)
+            top, right, bottom, left = box
+            if min(bottom - top, right - left) * scale >= self.min_region_side:
+                regions.append((box, scale))
+        return regions or None
@@ -0,0 +1,219 @@
+import time
+from collections import namedtuple
+
+import cv2
+
+from detection import DetectionWorker, make_region
+from gallery import identify_faces
+from metrics import (ACTIVE_TRACKERS, CAPTURE_FRAME_AGE_SECONDS, CAPTURE_FRAMES_DROPPED_TOTAL, DETECTION_CYCLE_SECONDS,
+                     DETECTION_GATED_FRAMES_TOTAL, DETECTION_SUBMISSIONS_TOTAL, ENCODED_BYTES_PER_SECOND,
+                     ENCODED_BYTES_TOTAL, FRAMES_PER_SECOND, FRAMES_TOTAL, PIPELINE_STAGE_SECONDS)
+from motion import DetectionPlanner, MotionDetector
+from tracking import TrackManager, draw_track
+
+# --- Pipeline capture & inferensi untuk satu kamera ---
+# Tidak bergantung pada state global, sehingga bisa dijalankan di thread
+# server (satu kamera) maupun di proses kamera terpisah (multi-kamera).
+
+PipelineConfig = namedtuple("PipelineConfig", [
+    "target_fps",
+    "detection_worker_mode",
+    "min_detection_interval",
+    "max_detection_interval",
+    "tracker_type",
+    "track_refresh_interval",
+    "track_min_confidence",
+    # Skala sapuan seluruh frame yang dikirim ke detektor
+    "detection_scale",
+    # Gating gerakan: False = selalu deteksi seluruh frame (tanpa ROI)
+    "motion_gating",
+    # Detik antar sapuan seluruh frame saat gating aktif
+    "full_sweep_interval",
+    # Sisi terpanjang ROI setelah diskalakan (piksel); ROI kecil dideteksi di resolusi lebih tinggi
+    "roi_max_side",
+    # Selisih intensitas (0-255) dan luas minimal (pecahan frame) agar dianggap gerakan
+    "motion_threshold",
+    "motion_min_area",
+    # Backend detektor wajah (lihat detectors.py), mis. "hog", "haar", "dnn:<model>"
+    "detector",
+    # Detik antar sapuan seluruh frame saat adegan statis (tanpa gerakan)
+    "idle_sweep_interval",
+    # Bagian waktu (0-1] worker deteksi boleh sibuk (lihat DetectionWorker.interval)
+    "detection_budget",
+], defaults=[0.25, True, 2.0, 320, 25, 0.002, "hog", 10.0, 0.5])
+
+
+def process_frames(video_stream, matcher, thumbnail_store, on_comparison, config, on_match=None):
+    """Loop capture -> deteksi -> tracking -> anotasi -> encode JPEG.
+
+    video_stream: LatestFrameGrabber (atau objek mirip cv2.VideoCapture).
+    on_comparison: dipanggil dengan (wajah pengguna RGB, thumbnail waifu RGB,
+    nama, kemiripan) setiap kali wajah baru dikenali.
+    on_match: opsional, dipanggil dengan (id track, nama, kemiripan, wajah
+    pengguna RGB) saat track pertama kali dikenali atau namanya berubah, dan
+    paling banyak sekali per track_refresh_interval selama nama sama (track
+    dengan kemiripan rendah di-encode setiap siklus); tidak boleh memblokir.
+    Menghasilkan bytes JPEG per frame sampai sumber frame berhenti.
+    """
+    if video_stream is None or not video_stream.isOpened():
+        print("Webcam tidak tersedia. Streaming tidak dapat dimulai.")
+        return
+
+    track_manager = TrackManager(tracker_type=config.tracker_type, refresh_interval=config.track_refresh_interval,
+                                 min_confidence=config.track_min_confidence)
+    frame_count = 0
+    frame_period = 1.0 / config.target_fps
+    capture_drops = getattr(video_stream, "frames_dropped", 0)
+
+    # Deteksi & encoding berjalan di worker; loop ini hanya tracking dan menyajikan frame
+    detection_worker = DetectionWorker(mode=config.detection_worker_mode, target_fps=config.target_fps,
+                                       min_interval=config.min_detection_interval,
+                                       max_interval=config.max_detection_interval, detector=config.detector,
+                                       budget=config.detection_budget)
+    detection_worker.start()
+    motion_detector = None
+    if config.motion_gating:
+        motion_detector = MotionDetector(threshold=config.motion_threshold, min_area=config.motion_min_area)
+    detection_planner = DetectionPlanner(frame_scale=config.detection_scale, full_sweep_interval=config.full_sweep_interval,
+                                         roi_max_side=config.roi_max_side, motion_detector=motion_detector,
+                                         idle_sweep_interval=config.idle_sweep_interval)
+
+    try:
+        while True:
+            loop_start = time.perf_counter()
+            try:
+                if not video_stream.isOpened():
+                    print("Webcam tidak lagi tersedia atau ditutup. Menghentikan streaming.")
+                    break
+
+                with PIPELINE_STAGE_SECONDS.time(stage="capture_read"):
+                    ret, frame = video_stream.read()
+
+                if not ret:
+                    print("Gagal membaca frame dari webcam. Streaming berhenti.")
+                    break
+
+                if frame is None or frame.size == 0:
+                    print("Peringatan: Frame kosong atau tidak valid diterima dari webcam. Melewatkan frame ini.")
+                    continue
+
+                if hasattr(video_stream, "frame_age"):
+                    CAPTURE_FRAME_AGE_SECONDS.observe(video_stream.frame_age)
+                    CAPTURE_FRAMES_DROPPED_TOTAL.inc(video_stream.frames_dropped - capture_drops)
+                    capture_drops = video_stream.frames_dropped
+
+                comparison_data = None
+                detection_applied = False
+
+                # --- Terapkan hasil deteksi jika worker sudah selesai ---
+                detection_result = detection_worker.poll(frame_count)
+                if detection_result is not None and detection_result.error is not None:
+                    print(f"Error saat memproses face_recognition (locations/encodings): {detection_result.error}")
+                    track_manager.clear()
+                elif detection_result is not None:
+                    detection_applied = True
+                    PIPELINE_STAGE_SECONDS.observe(detection_result.timings["detection"], stage="detection")
+                    PIPELINE_STAGE_SECONDS.observe(detection_result.timings["encoding"], stage="encoding")
+                    DETECTION_CYCLE_SECONDS.observe(detection_result.cycle_time)
+                    # Frame saat deteksi dikirim; koordinat wajah (skala penuh) mengacu ke frame ini
+                    source_frame = detection_result.frame
+                    locations = detection_result.locations
+
+                    try:
+                        # Hanya wajah yang di-encode ulang yang dicocokkan; sisanya memakai identitas track
+                        encoded_indices = [i for i, encoding in enumerate(detection_result.encodings) if encoding is not None]
+                        # Satu operasi matriks untuk semua wajah di frame ini
+                        with PIPELINE_STAGE_SECONDS.time(stage="matching"):
+                            identities = identify_faces(matcher, [detection_result.encodings[i] for i in encoded_indices])
+
+                        observations = [None] * len(locations)
+                        for i, identity in zip(encoded_indices, identities):
+                            observations[i] = identity
+
+                        # Inisialisasi di frame sumber, lalu update di bawah menyusul ke frame saat ini
+                        with PIPELINE_STAGE_SECONDS.time(stage="tracker_init"):
+                            encoded_tracks = track_manager.apply_detections(source_frame, locations, observations,
+                                                                            searched=detection_result.searched)
+                        for track, (top, right, bottom, left) in encoded_tracks:
+                            name = track.name
+                            similarity = track.similarity
+
+                            if name != "Unknown":
+                                user_face_cropped = source_frame[top:bottom, left:right]
+                                if user_face_cropped.size > 0:
+                                    # --- Memperbesar ukuran gambar wajah yang dipotong ---
+                                    user_face_resized = cv2.resize(user_face_cropped, (350, 350), interpolation=cv2.INTER_AREA)
+                                    user_face_rgb = cv2.cvtColor(user_face_resized, cv2.COLOR_BGR2RGB)
+                                    if on_match is not None and track.claim_match_event(time.time(),
+                                                                                        config.track_refresh_interval):
+                                        on_match(track.track_id, name, similarity, user_face_rgb)
+
+                                    # Thumbnail 350x350 RGB dari cache (tanpa I/O disk di sini)
+                                    waifu_face_rgb = thumbnail_store.get(name)
+                                    if waifu_face_rgb is not None:
+                                        comparison_data = (user_face_rgb, waifu_face_rgb, name, similarity)
+                                else:
+                                    print(f"Peringatan: Wajah pengguna yang dipotong kosong untuk {name}.")
+
+                    except Exception as e:
+                        print(f"Error saat menerapkan hasil deteksi: {e}")
+                        track_manager.clear()
+
+                # --- Tracking di setiap frame ---
+                with PIPELINE_STAGE_SECONDS.time(stage="tracker_update"):
+                    tracks = track_manager.update(frame)
+                ACTIVE_TRACKERS.set(len(tracks))
+
+                # --- Kirim frame ke worker deteksi jika sudah waktunya (sebelum frame dianotasi) ---
+                if detection_worker.should_submit(frame_count):
+                    # Adegan statis dilewati; selain itu seluruh frame atau hanya ROI di sekitar gerakan & track
+                    with PIPELINE_STAGE_SECONDS.time(stage="motion"):
+                        plan = detection_planner.plan(frame, [track.location for track in tracks],
+                                                      track_manager.stale_locations())
+                    if plan is None:
+                        DETECTION_GATED_FRAMES_TOTAL.inc()
+                    else:
+                        regions = [make_region(frame, scale, box) for box, scale in plan]
+                        searched = None if plan[0][0] is None else [box for box, _ in plan]
+                        DETECTION_SUBMISSIONS_TOTAL.inc(kind="full" if searched is None else "roi")
+                        # Track dengan identitas yang masih segar tidak perlu di-encode ulang
+                        detection_worker.submit(frame.copy(), regions, frame_count, track_manager.cached_locations(),
+                                                searched)
+
+                # --- Anotasi ---
+                with PIPELINE_STAGE_SECONDS.time(stage="annotation"):
+                    for track in tracks:
+                        draw_track(frame, track, tracked=not detection_applied)
+
+                # --- Data perbandingan untuk /compare_frame ---
+                # Hanya dikirim saat ada wajah yang dikenali; data lama tetap ditampilkan sampai itu terjadi
+                if comparison_data is not None:
+                    try:
+                        on_comparison(comparison_data)
+                    except Exception as e_comparison:
+                        print(f"Error saat menyimpan data perbandingan: {e_comparison}")
+
+                frame_count += 1
+
+                with PIPELINE_STAGE_SECONDS.time(stage="jpeg_encode"):
+                    ret, buffer = cv2.imencode('.jpg', frame)
+                if not ret:
+                    print("Gagal meng-encode frame ke JPEG.")
+                    continue
+
+                FRAMES_TOTAL.inc()
+                FRAMES_PER_SECOND.add()
+                ENCODED_BYTES_TOTAL.inc(len(buffer))
+                ENCODED_BYTES_PER_SECOND.add(len(buffer))
+
+                # Jaga jarak antar frame tetap rata sesuai TARGET_FPS
+                elapsed = time.perf_counter() - loop_start
+                if elapsed < frame_period:
+                    time.sleep(frame_period - elapsed)
+                yield buffer.tobytes()
+
+            except Exception as e:
+                print(f"Error tak terduga saat memproses frame: {e}")
+                break
+    finally:
+        detection_worker.stop()
@@ -0,0 +1,439 @@
+import asyncio
+import base64
+import hashlib
+import io
+import sys
+from http import HTTPStatus
+from urllib.parse import unquote
+
+from comparison import NO_STORE_HEADERS, comparison_response
+from metrics import registry
+
+# --- Server streaming berbasis asyncio (WAIFU_SERVER=asyncio) ---
+# Server Flask bawaan memakai satu thread OS per penonton /video_feed. Di sini
+# semua penonton dilayani oleh satu event loop: setiap kamera punya satu hub
+# yang menerima frame dari FrameBroadcaster dan hanya menyimpan frame terbaru.
+# Setiap koneksi mengirim frame terbaru lalu menunggu drain() socket-nya
+# sendiri; penonton lambat melewatkan frame di antaranya (tanpa antrean per
+# penonton), dan penonton yang macet terlalu lama diputus.
+# /video_feed (multipart), /ws/video_feed (WebSocket biner) dan /compare_frame
+# dilayani langsung; rute lain (/, /metrics, ...) diteruskan ke aplikasi Flask
+# lewat WSGI di thread pool.
+
+MAX_HEADER_BYTES = 65536
+MAX_BODY_BYTES = 1024 * 1024
+KEEPALIVE_TIMEOUT = 15.0
+# Batas buffer tulis per koneksi; di atas ini drain() menunggu socket kosong
+WRITE_BUFFER_HIGH = 256 * 1024
+# Penonton yang tidak bisa menerima satu frame pun selama ini dianggap macet dan diputus
+STALL_TIMEOUT = 10.0
+# Seberapa sering penonton yang menunggu frame memeriksa apakah pipeline masih berjalan
+FRAME_WAIT_TIMEOUT = 5.0
+MAX_WEBSOCKET_MESSAGE = 64 * 1024
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+ASYNC_STREAM_CLIENTS = registry.gauge(
+    "waifu_async_stream_clients", "Penonton yang terhubung ke server asyncio, per transport (multipart/websocket).",
+    labelnames=("camera", "transport"))
+ASYNC_FRAME_SKIPS_TOTAL = registry.counter(
+    "waifu_async_frame_skips_total", "Frame yang dilewati penonton server asyncio karena koneksinya lambat.",
+    labelnames=("camera",))
+ASYNC_STALLED_CLIENTS_TOTAL = registry.counter(
+    "waifu_async_stalled_clients_total", "Penonton yang diputus karena tidak menerima data selama STALL_TIMEOUT.",
+    labelnames=("camera",))
+
+
+class _LoopSubscriber:
+    """Subscriber FrameBroadcaster yang meneruskan frame ke event loop (dipanggil dari thread broadcaster)."""
+
+    def __init__(self, loop, publish):
+        self._loop = loop
+        self._publish = publish
+
+    def put_nowait(self, frame_bytes):
+        try:
+            self._loop.call_soon_threadsafe(self._publish, frame_bytes)
+        except RuntimeError:
+            # Event loop sudah ditutup (server berhenti)
+            pass
+
+
+class FrameHub:
+    """Frame terbaru satu kamera untuk semua penonton asyncio.
+
+    Hanya terdaftar di FrameBroadcaster selama ada penonton, sehingga
+    pipeline tetap bisa dijalankan ulang seperti di mode Flask.
+    """
+
+    def __init__(self, camera_id, broadcaster, loop):
+        self.camera_id = camera_id
+        self.broadcaster = broadcaster
+        self.loop = loop
+        self.frame = None
+        self.generation = 0
+        self.viewers = {"multipart": 0, "websocket": 0}
+        self._subscriber = None
+        self._new_frame = asyncio.Event()
+
+    def _publish(self, frame_bytes):
+        # None = pipeline berhenti; penonton yang menunggu menutup stream-nya
+        self.frame = frame_bytes
+        self.generation += 1
+        new_frame, self._new_frame = self._new_frame, asyncio.Event()
+        new_frame.set()
+
+    def attach(self, transport):
+        self.viewers[transport] += 1
+        ASYNC_STREAM_CLIENTS.set(self.viewers[transport], camera=self.camera_id, transport=transport)
+        if self._subscriber is None:
+            self._subscriber = _LoopSubscriber(self.loop, self._publish)
+            self.frame = None
+            self.broadcaster.subscribe(self._subscriber)
+        else:
+            # Mulai ulang pipeline jika sudah berhenti sebelumnya
+            self.broadcaster.start()
+        # Penonton baru langsung menerima frame terakhir jika ada
+        return self.generation - 1 if self.frame is not None else self.generation
+
+    def detach(self, transport):
+        self.viewers[transport] -= 1
+        ASYNC_STREAM_CLIENTS.set(self.viewers[transport], camera=self.camera_id, transport=transport)
+        if not any(self.viewers.values()) and self._subscriber is not None:
+            self.broadcaster.unsubscribe(self._subscriber)
+            self._subscriber = None
+            self.frame = None
+
+    async def next_frame(self, seen_generation):
+        """Menunggu frame yang lebih baru dari seen_generation; (None, ...) jika pipeline berhenti."""
+        while self.generation == seen_generation:
+            new_frame = self._new_frame
+            try:
+                await asyncio.wait_for(new_frame.wait(), FRAME_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                if not self.broadcaster.is_running():
+                    print("Pipeline kamera tidak berjalan. Menghentikan streaming.")
+                    return None, seen_generation
+        if seen_generation is not None and self.generation - seen_generation > 1:
+            ASYNC_FRAME_SKIPS_TOTAL.inc(self.generation - seen_generation - 1, camera=self.camera_id)
+        return self.frame, self.generation
+
+
+class _Request:
+    def __init__(self, method, path, query, version, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+class _BadRequest(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+def _response_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+    lines.extend(f"{name}: {value}" for name, value in headers)
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _websocket_frame(payload, opcode=0x2):
+    """Frame WebSocket tunggal (FIN) tanpa mask, sesuai arah server -> klien."""
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x80 | opcode, length))
+    elif length < 65536:
+        header = bytes((0x80 | opcode, 126)) + length.to_bytes(2, "big")
+    else:
+        header = bytes((0x80 | opcode, 127)) + length.to_bytes(8, "big")
+    return header + payload
+
+
+async def _read_websocket_frame(reader):
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = int.from_bytes(await reader.readexactly(2), "big")
+    elif length == 127:
+        length = int.from_bytes(await reader.readexactly(8), "big")
+    if length > MAX_WEBSOCKET_MESSAGE:
+        raise _BadRequest(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    mask = await reader.readexactly(4) if second & 0x80 else b""
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return first & 0x0F, payload
+
+
+class StreamServer:
+    """cameras: dict {id: kamera} dari cameras.py; wsgi_app: aplikasi Flask untuk rute lain."""
+
+    def __init__(self, cameras, default_camera_id, wsgi_app=None):
+        self.cameras = cameras
+        self.default_camera_id = default_camera_id
+        self.wsgi_app = wsgi_app
+        self.hubs = {}
+        self._server = None
+
+    # --- Menjalankan server ---
+    def run(self, host="0.0.0.0", port=5000):
+        asyncio.run(self.serve(host, port))
+
+    async def serve(self, host="0.0.0.0", port=5000):
+        loop = asyncio.get_running_loop()
+        self.hubs = {camera_id: FrameHub(camera_id, camera.broadcaster, loop) for camera_id, camera in self.cameras.items()}
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _camera_id(self, parts):
+        """parts: sisa path setelah nama rute; None jika bukan rute kamera yang valid."""
+        if not parts:
+            return self.default_camera_id
+        if len(parts) == 1 and parts[0] in self.cameras:
+            return parts[0]
+        return None
+
+    # --- HTTP ---
+    async def _read_request(self, reader):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+        except asyncio.LimitOverrunError:
+            raise _BadRequest(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+            # Klien menutup koneksi atau idle terlalu lama
+            return None
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        try:
+            content_length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        if content_length > MAX_BODY_BYTES:
+            raise _BadRequest(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(content_length) if content_length else b""
+
+        path, _, query = target.partition("?")
+        return _Request(method.upper(), unquote(path), query, version, headers, body)
+
+    async def _send(self, writer, status, headers, body=b"", keep_alive=False, head_only=False):
+        headers = list(headers.items() if isinstance(headers, dict) else headers)
+        if not any(name.lower() == "content-length" for name, _ in headers):
+            headers.append(("Content-Length", str(len(body))))
+        headers.append(("Connection", "keep-alive" if keep_alive else "close"))
+        writer.write(_response_head(status, headers) + (b"" if head_only else body))
+        await writer.drain()
+
+    async def _send_error(self, writer, status, message=""):
+        body = (message or HTTPStatus(status).phrase).encode("utf-8")
+        await self._send(writer, status, {"Content-Type": "text/plain; charset=utf-8"}, body)
+
+    async def _handle_connection(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except _BadRequest as e:
+                    await self._send_error(writer, e.status)
+                    break
+                if request is None:
+                    break
+                keep_alive = await self._dispatch(request, reader, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Error tak terduga di server asyncio: {e}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _dispatch(self, request, reader, writer):
+        """Melayani satu request; mengembalikan True jika koneksi boleh dipakai lagi."""
+        parts = [part for part in request.path.split("/") if part]
+        route = parts[0] if parts else ""
+
+        if route == "video_feed" or (route == "ws" and parts[1:2] == ["video_feed"]):
+            websocket = route == "ws"
+            camera_id = self._camera_id(parts[2:] if websocket else parts[1:])
+            if camera_id is None:
+                await self._send_error(writer, HTTPStatus.NOT_FOUND, f"Kamera '{parts[-1]}' tidak dikenal.")
+                return False
+            if request.method != "GET":
+                await self._send_error(writer, HTTPStatus.METHOD_NOT_ALLOWED)
+                return False
+            if websocket:
+                await self._stream_websocket(request, reader, writer, camera_id)
+            else:
+                await self._stream_multipart(reader, writer, camera_id)
+            return False
+
+        if route == "compare_frame" and request.method in ("GET", "HEAD"):
+            camera_id = self._camera_id(parts[1:])
+            if camera_id is None:
+                await self._send_error(writer, HTTPStatus.NOT_FOUND, f"Kamera '{parts[-1]}' tidak dikenal.")
+                return False
+            return await self._compare_frame(request, writer, camera_id)
+
+        if self.wsgi_app is None:
+            await self._send_error(writer, HTTPStatus.NOT_FOUND)
+            return False
+        return await self._forward_to_wsgi(request, writer)
+
+    async def _compare_frame(self, request, writer, camera_id):
+        # Render (jika generasi berubah) berjalan di thread pool agar loop tidak tertahan
+        loop = asyncio.get_running_loop()
+        # Respons yang sama dengan rute Flask /compare_frame (comparison.comparison_response)
+        status, headers, body = await loop.run_in_executor(None, comparison_response, self.cameras[camera_id],
+                                                           request.headers.get("if-none-match"))
+        await self._send(writer, HTTPStatus(status), headers, body, keep_alive=request.keep_alive,
+                         head_only=request.method == "HEAD")
+        return request.keep_alive
+
+    # --- Streaming ---
+    async def _send_frames(self, hub, writer, encode):
+        seen = None
+        try:
+            seen = hub.attach("websocket" if encode is _websocket_frame else "multipart")
+            while True:
+                frame_bytes, seen = await hub.next_frame(seen)
+                if frame_bytes is None:
+                    break
+                writer.write(encode(frame_bytes))
+                try:
+                    # Backpressure: koneksi ini menunggu socket-nya sendiri; frame baru yang datang
+                    # selama menunggu hanya menimpa frame terbaru di hub
+                    await asyncio.wait_for(writer.drain(), STALL_TIMEOUT)
+                except asyncio.TimeoutError:
+                    ASYNC_STALLED_CLIENTS_TOTAL.inc(camera=hub.camera_id)
+                    writer.transport.abort()
+                    break
+        finally:
+            if seen is not None:
+                hub.detach("websocket" if encode is _websocket_frame else "multipart")
+
+    async def _run_stream(self, sender, receiver):
+        """Menjalankan pengirim frame sampai selesai atau klien memutus koneksi."""
+        tasks = {asyncio.ensure_future(sender), asyncio.ensure_future(receiver)}
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _wait_disconnect(self, reader):
+        while await reader.read(4096):
+            pass
+
+    async def _stream_multipart(self, reader, writer, camera_id):
+        headers = dict(NO_STORE_HEADERS, **{"Content-Type": "multipart/x-mixed-replace; boundary=frame",
+                                            "Connection": "close"})
+        writer.write(_response_head(HTTPStatus.OK, headers.items()))
+
+        def encode(frame_bytes):
+            return (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ' + str(len(frame_bytes)).encode() +
+                    b'\r\n\r\n' + frame_bytes + b'\r\n')
+
+        await self._run_stream(self._send_frames(self.hubs[camera_id], writer, encode), self._wait_disconnect(reader))
+
+    async def _receive_websocket(self, reader, writer):
+        """Hanya menangani frame kontrol dari klien (ping, close); pesan lain diabaikan."""
+        while True:
+            try:
+                opcode, payload = await _read_websocket_frame(reader)
+            except _BadRequest:
+                writer.write(_websocket_frame((1009).to_bytes(2, "big"), opcode=0x8))
+                return
+            if opcode == 0x8:
+                writer.write(_websocket_frame(payload[:2], opcode=0x8))
+                return
+            if opcode == 0x9:
+                writer.write(_websocket_frame(payload, opcode=0xA))
+
+    async def _stream_websocket(self, request, reader, writer, camera_id):
+        key = request.headers.get("sec-websocket-key")
+        if request.headers.get("upgrade", "").lower() != "websocket" or not key:
+            await self._send_error(writer, HTTPStatus.BAD_REQUEST, "Butuh upgrade WebSocket.")
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        writer.write(_response_head(HTTPStatus.SWITCHING_PROTOCOLS, [
+            ("Upgrade", "websocket"), ("Connection", "Upgrade"), ("Sec-WebSocket-Accept", accept)]))
+        await writer.drain()
+        await self._run_stream(self._send_frames(self.hubs[camera_id], writer, _websocket_frame),
+                               self._receive_websocket(reader, writer))
+
+    # --- Rute lain lewat Flask (WSGI) ---
+    def _wsgi_environ(self, request, writer):
+        host, _, port = request.headers.get("host", "localhost").partition(":")
+        peer = writer.get_extra_info("peername") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": request.path,
+            "QUERY_STRING": request.query,
+            "SERVER_NAME": host,
+            "SERVER_PORT": port or "80",
+            "SERVER_PROTOCOL": request.version,
+            "REMOTE_ADDR": peer[0],
+            "CONTENT_TYPE": request.headers.get("content-type", ""),
+            "CONTENT_LENGTH": str(len(request.body)) if request.body else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(request.body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in request.headers.items():
+            if name not in ("content-type", "content-length"):
+                environ["HTTP_" + name.upper().replace("-", "_")] = value
+        return environ
+
+    def _call_wsgi(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = headers
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            body = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response["status"], response["headers"], body
+
+    async def _forward_to_wsgi(self, request, writer):
+        loop = asyncio.get_running_loop()
+        status, headers, body = await loop.run_in_executor(None, self._call_wsgi, self._wsgi_environ(request, writer))
+        headers = [(name, value) for name, value in headers if name.lower() != "connection"]
+        await self._send(writer, status, headers, body, keep_alive=request.keep_alive, head_only=request.method == "HEAD")
+        return request.keep_alive
@@ -0,0 +1,30 @@
+import argparse
+
+import pytest
+
+pytest.importorskip("face_recognition")
+
+from benchmark import FakeCamera, histogram_quantile, pipeline_config, run_pipeline, synthetic_gallery
+from thumbnails import ThumbnailStore
+
+
+def test_histogram_quantile_interpolates_within_bucket():
+    bounds = [0.001, 0.01, float("inf")]
+    assert histogram_quantile(0.5, bounds, [0, 10, 10]) == pytest.approx(0.0055)
+    assert histogram_quantile(0.5, bounds, [10, 10, 10]) == pytest.approx(0.0005)
+    # Kuantil di bucket +Inf dilaporkan sebagai batas bucket terakhir yang terhingga
+    assert histogram_quantile(0.99, bounds, [0, 0, 10]) == pytest.approx(0.01)
+
+
+def test_run_pipeline_reports_production_stages(tmp_path):
+    args = argparse.Namespace(target_fps=1000, detection_worker="thread", detection_interval=2, tracker="KCF",
+                              scale=0.25, motion_gating=False, detector="hog")
+    camera = FakeCamera.synthetic([], faces_per_frame=0, n_frames=5, size=(160, 120))
+    result = run_pipeline(camera, synthetic_gallery(10), ThumbnailStore(str(tmp_path), recheck_interval=None), 12,
+                          pipeline_config(args))
+
+    assert result["frames"] == 12
+    # Durasi berasal dari histogram process_frames(), hanya untuk run ini
+    assert result["stages"]["jpeg_encode"]["count"] == 12
+    assert result["stages"]["tracker_update"]["count"] == 12
+    assert result["detections"] >= 1
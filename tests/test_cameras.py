@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("face_recognition")
+
+from cameras import parse_camera_sources  # noqa: E402
+
+
+def test_unnamed_sources_use_position_as_id():
+    assert parse_camera_sources("0, 1 ,rtsp://kamera/stream") == {"0": "0", "1": "1", "2": "rtsp://kamera/stream"}
+
+
+def test_named_sources_keep_order():
+    cameras = parse_camera_sources("lobby=0, booth = /data/booth.mp4,")
+    assert list(cameras.items()) == [("lobby", "0"), ("booth", "/data/booth.mp4")]
+
+
+def test_mixed_sources_use_position_for_unnamed_entries():
+    assert parse_camera_sources("lobby=0,1") == {"lobby": "0", "1": "1"}
+
+
+@pytest.mark.parametrize("spec", ["", " , ", "lobi utama=0", "a/b=0", "lobby=0,lobby=1", "0,0=/data/a.mp4"])
+def test_invalid_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_camera_sources(spec)
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import numpy as np
+
+from capture import LatestFrameGrabber
+
+
+class StallingCapture:
+    """Sumber live palsu: beberapa frame, satu jeda panjang, lalu beberapa frame lagi."""
+
+    def __init__(self, frames_before=3, stall=1.5, frames_after=3):
+        self.schedule = [0.01] * frames_before + [stall] + [0.01] * (frames_after - 1)
+        self.released = False
+
+    def isOpened(self):
+        return not self.released
+
+    def read(self):
+        if not self.schedule:
+            return False, None
+        time.sleep(self.schedule.pop(0))
+        return True, np.zeros((4, 4, 3), dtype=np.uint8)
+
+    def get(self, prop):
+        return 30.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self.released = True
+
+
+def test_read_waits_through_stall_longer_than_timeout():
+    grabber = LatestFrameGrabber(StallingCapture(), live=True, read_timeout=0.2)
+    frames = 0
+    while True:
+        ret, _ = grabber.read()
+        if not ret:
+            break
+        frames += 1
+    # Jeda 1.5 detik (> read_timeout) tidak mengakhiri stream; hanya habisnya sumber yang mengakhiri
+    assert frames >= 4
+    assert grabber.frames_captured == 6
+    assert not grabber.isOpened()
+    grabber.release()
+
+
+def test_release_unblocks_pending_read():
+    capture = StallingCapture(frames_before=0, stall=5.0, frames_after=1)
+    grabber = LatestFrameGrabber(capture, live=True, read_timeout=0.1)
+    start = time.perf_counter()
+    threading.Timer(0.3, grabber.release).start()
+    ret, frame = grabber.read()
+    assert not ret and frame is None
+    assert time.perf_counter() - start < 2.0
+
+
+class FailingCapture(StallingCapture):
+    """Sumber yang melempar exception dari read(), seperti driver/RTSP yang putus."""
+
+    def read(self):
+        if self.schedule:
+            return super().read()
+        raise RuntimeError("koneksi RTSP terputus")
+
+
+def test_exception_in_capture_ends_stream():
+    grabber = LatestFrameGrabber(FailingCapture(frames_before=2, stall=0.01, frames_after=1),
+                                 live=True, read_timeout=0.1)
+    start = time.perf_counter()
+    frames = 0
+    while grabber.read()[0]:
+        frames += 1
+    assert frames >= 1
+    assert not grabber.isOpened()
+    assert time.perf_counter() - start < 2.0
+    grabber.release()
+
+
+def test_stop_unblocks_pending_read_without_releasing_source():
+    capture = StallingCapture(frames_before=0, stall=5.0, frames_after=1)
+    grabber = LatestFrameGrabber(capture, live=True, read_timeout=0.1)
+    threading.Timer(0.3, grabber.stop).start()
+    assert grabber.read() == (False, None)
+    assert not capture.released
@@ -0,0 +1,104 @@
+import numpy as np
+
+from comparison import ComparisonCache, ComparisonState, comparison_response, etag_matches, render_placeholder
+
+
+class CountingRender:
+    def __init__(self, result=None):
+        self.calls = 0
+        self.result = result if result is not None else render_placeholder("Tes")
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+def test_same_key_reuses_jpeg_and_etag():
+    cache = ComparisonCache()
+    render = CountingRender()
+    first = cache.get((1, "tersedia"), render)
+    second = cache.get((1, "tersedia"), render)
+
+    assert render.calls == 1
+    assert second == first
+    assert first[0][:2] == b"\xff\xd8"  # JPEG
+    assert first[1] is not None
+
+
+def test_new_key_renders_again_with_new_etag():
+    cache = ComparisonCache()
+    render = CountingRender()
+    _, first_etag = cache.get((1, "tersedia"), render)
+    _, second_etag = cache.get((2, "tersedia"), render)
+
+    assert render.calls == 2
+    assert second_etag != first_etag
+
+
+def test_uncacheable_render_has_no_etag_and_is_not_kept():
+    cache = ComparisonCache()
+    render = CountingRender((np.zeros((10, 10, 3), dtype=np.uint8), False))
+    jpeg, etag = cache.get((1, "error"), render)
+    cache.get((1, "error"), render)
+
+    assert jpeg and etag is None
+    assert render.calls == 2
+
+
+def test_etag_matches_if_none_match_header():
+    assert etag_matches('"cmp-1-2"', '"cmp-1-2"')
+    assert etag_matches('W/"cmp-1-2", "lain"', '"cmp-1-2"')
+    assert etag_matches("*", '"cmp-1-2"')
+    assert not etag_matches('"cmp-1-1"', '"cmp-1-2"')
+    assert not etag_matches(None, '"cmp-1-2"')
+
+
+class FakeCamera:
+    def __init__(self):
+        self.comparison = ComparisonState()
+        self.comparison_cache = ComparisonCache()
+
+
+def _comparison_data(name="Rem"):
+    user_face = np.full((60, 50, 3), 120, dtype=np.uint8)
+    waifu_face = np.full((70, 70, 3), 200, dtype=np.uint8)
+    return user_face, waifu_face, name, 87.5
+
+
+def test_comparison_response_placeholder_then_304():
+    camera = FakeCamera()
+    status, headers, body = comparison_response(camera)
+    assert status == 200
+    assert headers["Content-Type"] == "image/jpeg"
+    assert headers["Cache-Control"] == "no-cache, must-revalidate"
+    assert body[:2] == b"\xff\xd8"
+
+    status, revalidated_headers, body = comparison_response(camera, headers["ETag"])
+    assert status == 304
+    assert body == b""
+    assert revalidated_headers["ETag"] == headers["ETag"]
+
+
+def test_comparison_response_changes_etag_on_new_match():
+    camera = FakeCamera()
+    _, placeholder_headers, _ = comparison_response(camera)
+    camera.comparison.update(_comparison_data())
+
+    status, headers, body = comparison_response(camera, placeholder_headers["ETag"])
+    assert status == 200 and body[:2] == b"\xff\xd8"
+    assert headers["ETag"] != placeholder_headers["ETag"]
+    assert comparison_response(camera, headers["ETag"])[0] == 304
+
+    camera.comparison.update(_comparison_data("Asuna"))
+    assert comparison_response(camera, headers["ETag"])[0] == 200
+
+
+def test_comparison_response_does_not_cache_render_errors():
+    camera = FakeCamera()
+    # Thumbnail grayscale (2 dimensi) memicu ValueError saat digabung -> placeholder tanpa ETag
+    user_face, waifu_face, name, similarity = _comparison_data()
+    camera.comparison.update((user_face, waifu_face[:, :, 0], name, similarity))
+
+    status, headers, body = comparison_response(camera)
+    assert status == 200 and body
+    assert "ETag" not in headers
@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+
+import detection
+from detection import DetectionWorker, make_region
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    # Deteksi palsu yang melaporkan latensi 0.2 detik tanpa menjalankan detektor
+    monkeypatch.setattr(detection, "detect_and_encode",
+                        lambda regions, skip_locations, detector: ([], [], {"detection": 0.2, "encoding": 0.0}))
+    workers = []
+
+    def make(**kwargs):
+        created = DetectionWorker(mode="thread", target_fps=30, **kwargs)
+        created.start()
+        workers.append(created)
+        return created
+    yield make
+    for created in workers:
+        created.stop()
+
+
+def _run_detection(worker, submit_index, poll_index):
+    frame = np.zeros((40, 40, 3), dtype=np.uint8)
+    worker.submit(frame, [make_region(frame, 1.0)], submit_index)
+    assert not worker.should_submit(submit_index + 100)  # satu deteksi pada satu waktu
+    deadline = time.monotonic() + 5.0
+    while (result := worker.poll(poll_index)) is None and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return result
+
+
+def test_first_submission_is_immediate(worker):
+    assert worker().should_submit(0)
+
+
+def test_interval_is_measured_from_the_poll_frame(worker):
+    detection_worker = worker(budget=0.5)
+    result = _run_detection(detection_worker, submit_index=0, poll_index=6)
+    assert result.error is None and result.latency == pytest.approx(0.2)
+
+    # 0.2 s * 30 fps * (1 - 0.5) / 0.5 = 6 frame jeda setelah hasil diambil di frame 6
+    assert detection_worker.interval == 6
+    assert not detection_worker.should_submit(11)
+    assert detection_worker.should_submit(12)
+
+
+def test_budget_limits_worker_busy_fraction(worker):
+    detection_worker = worker(budget=0.25)
+    _run_detection(detection_worker, submit_index=0, poll_index=6)
+    # Sibuk 6 frame, istirahat 18 frame -> 25% waktu
+    assert detection_worker.interval == 18
+
+    full = worker(budget=1.0, min_interval=1)
+    _run_detection(full, submit_index=0, poll_index=6)
+    assert full.interval == 1
+    assert full.should_submit(7)
+
+
+def test_interval_is_clamped(worker):
+    detection_worker = worker(budget=0.05, max_interval=30)
+    _run_detection(detection_worker, submit_index=0, poll_index=6)
+    assert detection_worker.interval == 30
+
+
+def test_invalid_budget_is_rejected():
+    with pytest.raises(ValueError):
+        DetectionWorker(budget=0.0)
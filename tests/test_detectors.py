@@ -0,0 +1,86 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+import detectors
+from detectors import calibrate, detection_recall, resolve_detector
+
+FACE = (20, 60, 60, 20)  # (top, right, bottom, left)
+
+
+def test_detection_recall_matches_boxes_one_to_one():
+    shifted = (22, 62, 62, 22)
+    far = (0, 10, 10, 0)
+    assert detection_recall([[FACE]], [[FACE]]) == 1.0
+    assert detection_recall([[shifted, far]], [[FACE, FACE]]) == 0.5  # satu prediksi hanya memasangkan satu acuan
+    assert detection_recall([[far], []], [[FACE], [FACE]]) == 0.0
+    assert detection_recall([[shifted]], [[FACE]], iou_threshold=0.95) == 0.0
+    assert detection_recall([[FACE]], [[]]) is None  # tanpa kotak acuan
+
+
+class FakeDetector:
+    """Menemukan satu wajah di posisi relatif yang sama pada skala berapa pun."""
+
+    def __init__(self, delay=0.0, finds_faces=True):
+        self.delay = delay
+        self.finds_faces = finds_faces
+
+    def detect(self, rgb_image):
+        time.sleep(self.delay)
+        if not self.finds_faces:
+            return []
+        height, width = rgb_image.shape[:2]
+        return [(height // 5, 3 * width // 5, 3 * height // 5, width // 5)]
+
+
+def _create_fake_detector(spec):
+    if spec == "rusak":
+        raise RuntimeError("model tidak ditemukan")
+    return {"hog": FakeDetector(), "acuan": FakeDetector(), "lambat": FakeDetector(delay=0.01), "cepat": FakeDetector(delay=0.001),
+            "buta": FakeDetector(finds_faces=False)}[spec]
+
+
+@pytest.fixture
+def frames(monkeypatch):
+    monkeypatch.setattr(detectors, "create_detector", _create_fake_detector)
+    return [np.zeros((100, 100, 3), dtype=np.uint8) for _ in range(4)]
+
+
+def test_calibrate_picks_fastest_detector_with_enough_recall(frames):
+    chosen, results = calibrate(frames, ["lambat", "cepat", "buta", "rusak"], reference="acuan", scale=0.5)
+
+    assert chosen == "cepat"  # "buta" lebih cepat tetapi recall-nya 0
+    by_detector = {result["detector"]: result for result in results}
+    assert set(by_detector) == {"lambat", "cepat", "buta"}  # detektor yang gagal dibuat dilewati
+    assert by_detector["cepat"]["recall"] == by_detector["lambat"]["recall"] == 1.0
+    assert by_detector["buta"]["recall"] == 0.0 and by_detector["buta"]["faces"] == 0
+    assert by_detector["cepat"]["ms_per_frame"] < by_detector["lambat"]["ms_per_frame"]
+
+
+def test_calibrate_falls_back_to_highest_recall(frames):
+    chosen, _ = calibrate(frames, ["buta", "lambat"], reference="acuan", scale=0.5, min_recall=1.1)
+    assert chosen == "lambat"
+
+
+def test_calibrate_rejects_clip_without_faces_or_without_candidates(frames):
+    with pytest.raises(ValueError):
+        calibrate(frames, ["cepat"], reference="buta")
+    with pytest.raises(ValueError):
+        calibrate(frames, ["rusak"], reference="acuan")
+
+
+def test_resolve_detector(tmp_path, frames, monkeypatch):
+    calibration_path = str(tmp_path / "kalibrasi.json")
+    assert resolve_detector("haar", calibration_path) == "haar"
+    assert resolve_detector("auto", calibration_path) == "hog"  # belum ada hasil kalibrasi
+
+    monkeypatch.setattr(detectors, "read_calibration_frames", lambda clip: frames)
+    assert resolve_detector("auto", calibration_path, clip="klip.mp4", candidates=("lambat", "cepat")) == "cepat"
+    with open(calibration_path, "r", encoding="utf-8") as f:
+        assert json.load(f)["detector"] == "cepat"
+
+    # Tanpa klip: hasil kalibrasi tersimpan dipakai
+    assert resolve_detector("auto", calibration_path) == "cepat"
+
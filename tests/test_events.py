@@ -0,0 +1,87 @@
+import numpy as np
+
+from events import MatchEventLog
+
+
+def _log_with_events(tmp_path, events, **kwargs):
+    log = MatchEventLog(str(tmp_path / "events.sqlite3"), flush_interval=0.05, **kwargs)
+    for timestamp, camera, name in events:
+        log.record(camera, 1, name, 90.0, timestamp=timestamp)
+    log.close()
+    return log
+
+
+def _all_pages(log, limit, **filters):
+    pages = []
+    cursor = None
+    while True:
+        events, cursor = log.query(cursor=cursor, limit=limit, **filters)
+        pages.append(events)
+        if cursor is None:
+            return pages
+
+
+def test_close_flushes_queued_events(tmp_path):
+    log = _log_with_events(tmp_path, [(float(t), "0", "rem") for t in range(5)])
+    assert log.written == 5
+    assert log.dropped == 0
+    assert len(log.query(limit=10)[0]) == 5
+
+
+def test_keyset_pagination_is_newest_first_without_gaps(tmp_path):
+    log = _log_with_events(tmp_path, [(float(t), "0", "rem") for t in range(23)])
+    pages = _all_pages(log, limit=10)
+
+    assert [len(page) for page in pages] == [10, 10, 3]
+    timestamps = [event["timestamp"] for page in pages for event in page]
+    assert timestamps == [float(t) for t in reversed(range(23))]
+
+
+def test_keyset_pagination_handles_equal_timestamps(tmp_path):
+    # Banyak kejadian dengan timestamp sama: id memisahkan batas halaman
+    log = _log_with_events(tmp_path, [(100.0, "0", "rem")] * 7 + [(50.0, "0", "rem")] * 3)
+    ids = [event["id"] for page in _all_pages(log, limit=3) for event in page]
+
+    assert len(ids) == 10
+    assert len(set(ids)) == 10
+
+
+def test_query_filters_by_name_camera_and_time(tmp_path):
+    events = [(float(t), str(t % 2), "rem" if t % 3 == 0 else "asuna") for t in range(30)]
+    log = _log_with_events(tmp_path, events)
+
+    rem = [event for page in _all_pages(log, limit=4, name="rem") for event in page]
+    assert [event["timestamp"] for event in rem] == [float(t) for t in reversed(range(0, 30, 3))]
+
+    camera_1 = log.query(camera="1", since=10.0, until=20.0, limit=50)[0]
+    assert [event["timestamp"] for event in camera_1] == [19.0, 17.0, 15.0, 13.0, 11.0]
+
+
+def test_thumbnails_only_stored_when_enabled(tmp_path):
+    face = np.full((96, 96, 3), 128, dtype=np.uint8)
+
+    log = MatchEventLog(str(tmp_path / "off.sqlite3"), flush_interval=0.05)
+    log.record("0", 1, "rem", 90.0, thumbnail_rgb=face)
+    log.close()
+    event = log.query()[0][0]
+    assert not event["has_thumbnail"]
+    assert log.thumbnail(event["id"]) is None
+
+    log = MatchEventLog(str(tmp_path / "on.sqlite3"), flush_interval=0.05, store_thumbnails=True)
+    log.record("0", 1, "rem", 90.0, thumbnail_rgb=face)
+    log.close()
+    event = log.query()[0][0]
+    assert event["has_thumbnail"]
+    assert log.thumbnail(event["id"])[:2] == b"\xff\xd8"
+
+
+def test_bad_thumbnail_is_stored_as_null_and_writer_survives(tmp_path):
+    log = MatchEventLog(str(tmp_path / "events.sqlite3"), flush_interval=0.05, store_thumbnails=True)
+    log.record("0", 1, "rem", 90.0, thumbnail_rgb=np.zeros((4, 4), dtype=np.float64), timestamp=1.0)
+    log.record("0", 1, "asuna", 90.0, thumbnail_rgb=np.full((96, 96, 3), 128, dtype=np.uint8), timestamp=2.0)
+    log.close()
+
+    events = log.query()[0]
+    assert [(event["name"], event["has_thumbnail"]) for event in events] == [("asuna", True), ("rem", False)]
+    assert log.thumbnail_errors == 1
+    assert log.write_errors == 0
@@ -0,0 +1,260 @@
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+import build_gallery
+from gallery import (ENCODING_DIM, MANIFEST_FILENAME, GalleryMatcher, IVFIndex, SharedGallery, attach_matcher,
+                     file_checksum, identify_faces, load_gallery, load_matcher, save_gallery)
+
+
+def _clustered_gallery(n_clusters=20, per_cluster=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0.0, 1.0, (n_clusters, ENCODING_DIM)).astype(np.float32)
+    encodings = np.repeat(centers, per_cluster, axis=0) + rng.normal(0.0, 0.1, (n_clusters * per_cluster, ENCODING_DIM))
+    names = [f"waifu-{i}" for i in range(len(encodings))]
+    return encodings.astype(np.float32), names
+
+
+def _queries(encodings, n=100, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(encodings), n, replace=False)
+    return encodings[picks] + rng.normal(0.0, 0.05, (n, ENCODING_DIM)).astype(np.float32)
+
+
+def _face_distance(gallery, query):
+    # Sama dengan face_recognition.face_distance
+    return np.linalg.norm(gallery - query, axis=1)
+
+
+def test_gallery_matcher_top_k_matches_face_distance():
+    rng = np.random.default_rng(2)
+    encodings = rng.normal(0.0, 0.3, (300, ENCODING_DIM)).astype(np.float32)
+    names = [f"waifu-{i}" for i in range(len(encodings))]
+    queries = rng.normal(0.0, 0.3, (7, ENCODING_DIM)).astype(np.float32)
+
+    results = GalleryMatcher(encodings, names).match(queries, k=5)
+    assert len(results) == len(queries)
+    for query, matches in zip(queries, results):
+        distances = _face_distance(encodings, query)
+        expected = np.argsort(distances)[:5]
+        assert [name for name, _ in matches] == [names[i] for i in expected]
+        np.testing.assert_allclose([d for _, d in matches], distances[expected], rtol=1e-4)
+
+
+def test_gallery_matcher_edge_cases():
+    encodings, names = _clustered_gallery(n_clusters=1, per_cluster=3)
+    matcher = GalleryMatcher(encodings, names)
+    assert matcher.match([], k=1) == []
+    assert len(matcher.match(encodings[:1], k=10)[0]) == 3  # k lebih besar dari galeri
+    assert GalleryMatcher(np.empty((0, ENCODING_DIM)), []).match(encodings[:2]) == [[], []]
+    with pytest.raises(ValueError):
+        GalleryMatcher(encodings, names[:2])
+
+
+def test_identify_faces_applies_threshold():
+    encodings = np.zeros((2, ENCODING_DIM), dtype=np.float32)
+    encodings[1, 0] = 1.0
+    matcher = GalleryMatcher(encodings, ["asuna", "rem"])
+    far = np.full(ENCODING_DIM, 5.0, dtype=np.float32)
+    identities = identify_faces(matcher, [encodings[1], far])
+    assert identities[0] == ("rem", 100.0)
+    assert identities[1] == ("Unknown", 0.0)
+
+
+def test_ivf_recall_against_exact_search():
+    encodings, names = _clustered_gallery()
+    queries = _queries(encodings)
+    exact = GalleryMatcher(encodings, names).match(queries, k=1)
+    index = IVFIndex.build(encodings, names, n_lists=20, n_probe=4)
+
+    approximate = index.match(queries, k=1)
+    recall = np.mean([a[0][0] == e[0][0] for a, e in zip(approximate, exact)])
+    assert recall >= 0.9
+
+
+def test_ivf_probing_all_lists_is_exact():
+    encodings, names = _clustered_gallery(per_cluster=10)
+    queries = _queries(encodings, n=20)
+    exact = GalleryMatcher(encodings, names).match(queries, k=5)
+    index = IVFIndex.build(encodings, names, n_lists=8, n_probe=8)
+
+    for approximate_matches, exact_matches in zip(index.match(queries, k=5), exact):
+        assert [name for name, _ in approximate_matches] == [name for name, _ in exact_matches]
+        np.testing.assert_allclose([d for _, d in approximate_matches], [d for _, d in exact_matches], atol=1e-4)
+
+
+def test_ivf_save_and_load_roundtrip_uses_mmap(tmp_path):
+    encodings, names = _clustered_gallery(per_cluster=10)
+    queries = _queries(encodings, n=10)
+    index = IVFIndex.build(encodings, names, n_lists=8, n_probe=3, gallery_checksum="sha256:abc")
+    index.save(str(tmp_path / "index"))
+
+    loaded = IVFIndex.load(str(tmp_path / "index"), n_probe=3, gallery_checksum="sha256:abc")
+    assert not loaded.encodings.flags.owndata  # dipetakan dari file, bukan disalin
+    assert loaded.gallery_checksum == "sha256:abc"
+    assert loaded.match(queries, k=3) == index.match(queries, k=3)
+
+
+def test_ivf_save_replaces_previous_arrays(tmp_path):
+    encodings, names = _clustered_gallery(n_clusters=4, per_cluster=10)
+    path = str(tmp_path / "index")
+    IVFIndex.build(encodings, names, n_lists=4).save(path)
+    before = set(os.listdir(path))
+    index = IVFIndex.build(encodings[:20], names[:20], n_lists=2)
+    index.save(path)
+
+    assert len(IVFIndex.load(path)) == 20
+    assert len(os.listdir(path)) <= len(before)
+
+
+def test_ivf_load_rejects_index_from_other_gallery(tmp_path):
+    encodings, names = _clustered_gallery(n_clusters=4, per_cluster=10)
+    IVFIndex.build(encodings, names, n_lists=4, gallery_checksum="sha256:old").save(str(tmp_path / "index"))
+
+    with pytest.raises(ValueError):
+        IVFIndex.load(str(tmp_path / "index"), gallery_checksum="sha256:new")
+
+
+def test_load_matcher_uses_index_and_falls_back_when_gallery_changed(tmp_path):
+    encodings, names = _clustered_gallery(n_clusters=4, per_cluster=10)
+    gallery_path = str(tmp_path / "gallery")
+    index_path = str(tmp_path / "index")
+    manifest = save_gallery(gallery_path, encodings, names)
+    IVFIndex.build(encodings, names, n_lists=4, gallery_checksum=manifest["checksum"]).save(index_path)
+
+    matcher = load_matcher(gallery_path, str(tmp_path / "missing.pickle"), index_path)
+    assert isinstance(matcher, IVFIndex)
+
+    save_gallery(gallery_path, encodings[:20], names[:20])
+    matcher = load_matcher(gallery_path, str(tmp_path / "missing.pickle"), index_path)
+    assert isinstance(matcher, GalleryMatcher)
+    assert len(matcher) == 20
+
+
+# --- Format galeri (save_gallery/load_gallery) dan build inkremental ---
+
+def _edit_manifest(gallery_path, **changes):
+    path = os.path.join(gallery_path, MANIFEST_FILENAME)
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest.update(changes)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+def test_save_and_load_gallery_roundtrip(tmp_path):
+    encodings, names = _clustered_gallery(n_clusters=2, per_cluster=5)
+    gallery_path = str(tmp_path / "gallery")
+    manifest = save_gallery(gallery_path, encodings, names, sources=[f"{name}/a.png" for name in names])
+
+    loaded, sq_norms, loaded_manifest = load_gallery(gallery_path, verify_checksum=True)
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, encodings)
+    np.testing.assert_allclose(sq_norms, np.einsum('ij,ij->i', encodings, encodings), rtol=1e-6)
+    assert loaded_manifest["names"] == names
+    assert loaded_manifest["checksum"] == manifest["checksum"] == file_checksum(
+        os.path.join(gallery_path, manifest["encodings_file"]))
+
+
+def test_load_gallery_detects_modified_encodings(tmp_path):
+    encodings, names = _clustered_gallery(n_clusters=2, per_cluster=5)
+    gallery_path = str(tmp_path / "gallery")
+    manifest = save_gallery(gallery_path, encodings, names)
+    tampered = np.load(os.path.join(gallery_path, manifest["encodings_file"]), mmap_mode='r+')
+    tampered[0, 0] += 1.0
+    tampered.flush()
+    del tampered
+
+    load_gallery(gallery_path)  # tanpa verifikasi: tetap dimuat
+    with pytest.raises(ValueError, match="Checksum"):
+        load_gallery(gallery_path, verify_checksum=True)
+
+
+@pytest.mark.parametrize("changes", [{"version": 99}, {"format": "lain"}, {"count": 3}])
+def test_load_gallery_rejects_unsupported_or_inconsistent_manifest(tmp_path, changes):
+    encodings, names = _clustered_gallery(n_clusters=2, per_cluster=5)
+    gallery_path = str(tmp_path / "gallery")
+    save_gallery(gallery_path, encodings, names)
+    _edit_manifest(gallery_path, **changes)
+
+    with pytest.raises(ValueError):
+        load_gallery(gallery_path)
+
+
+def test_save_gallery_replaces_previous_files(tmp_path):
+    encodings, names = _clustered_gallery(n_clusters=2, per_cluster=5)
+    gallery_path = str(tmp_path / "gallery")
+    first = save_gallery(gallery_path, encodings, names)
+    time.sleep(0.002)  # nama file memakai timestamp milidetik
+    second = save_gallery(gallery_path, encodings[:4], names[:4])
+
+    assert second["encodings_file"] != first["encodings_file"]
+    assert sorted(os.listdir(gallery_path)) == sorted([MANIFEST_FILENAME, second["encodings_file"],
+                                                       second["sq_norms_file"]])
+    with pytest.raises(ValueError):
+        save_gallery(gallery_path, encodings, names[:3])
+
+
+def test_build_gallery_encodes_only_new_images(tmp_path, monkeypatch):
+    dataset = tmp_path / "dataset"
+    for relative_path in ("rem/1.png", "rem/2.png", "asuna/1.jpg", "asuna/catatan.txt"):
+        (dataset / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (dataset / relative_path).write_bytes(b"")
+    encoded = []
+
+    def fake_encode_image(job):
+        _, waifu_name, relative_path = job
+        encoded.append(relative_path)
+        if relative_path == "rem/2.png":
+            return waifu_name, relative_path, None  # tidak ada wajah
+        return waifu_name, relative_path, np.full(ENCODING_DIM, len(encoded), dtype=np.float32)
+    monkeypatch.setattr(build_gallery, "encode_image", fake_encode_image)
+    gallery_path = str(tmp_path / "gallery")
+
+    manifest = build_gallery.build_gallery(str(dataset), gallery_path, workers=1)
+    assert sorted(encoded) == ["asuna/1.jpg", "rem/1.png", "rem/2.png"]
+    assert manifest["names"] == ["asuna", "rem"]
+
+    # Hanya gambar baru yang di-encode; yang gagal (tanpa wajah) dicoba lagi
+    (dataset / "asuna" / "2.png").write_bytes(b"")
+    encoded.clear()
+    time.sleep(0.002)
+    manifest = build_gallery.build_gallery(str(dataset), gallery_path, workers=1)
+    assert sorted(encoded) == ["asuna/2.png", "rem/2.png"]
+    assert manifest["sources"] == ["asuna/1.jpg", "rem/1.png", "asuna/2.png"]
+    encodings, _, _ = load_gallery(gallery_path)
+    assert encodings.shape == (3, ENCODING_DIM)
+
+    encoded.clear()
+    build_gallery.build_gallery(str(dataset), gallery_path, workers=1, rebuild=True)
+    assert len(encoded) == 4
+
+
+# --- Galeri di shared memory (mode proses kamera) ---
+
+@pytest.mark.parametrize("build", [
+    lambda encodings, names: GalleryMatcher(encodings, names),
+    lambda encodings, names: IVFIndex.build(encodings, names, n_lists=8, n_probe=3),
+], ids=["exact", "ivf"])
+def test_shared_gallery_attach_roundtrip(build):
+    encodings, names = _clustered_gallery(n_clusters=8, per_cluster=10)
+    queries = _queries(encodings, n=10)
+    matcher = build(encodings, names)
+    shared = SharedGallery(matcher)
+    try:
+        assert shared.nbytes >= encodings.nbytes
+        attached = attach_matcher(shared.handle)
+        assert type(attached) is type(matcher)
+        assert attached.match(queries, k=3) == matcher.match(queries, k=3)
+        assert not attached.encodings.flags.writeable
+        with pytest.raises(ValueError):
+            attached.encodings[0, 0] = 1.0
+        del attached
+    finally:
+        shared.close()
+    assert shared.nbytes == 0
+    with pytest.raises(FileNotFoundError):
+        attach_matcher(shared.handle)
@@ -0,0 +1,64 @@
+from metrics import MetricsRegistry, render_families
+
+
+def _pipeline_registry(stage_seconds):
+    registry = MetricsRegistry()
+    histogram = registry.histogram("waifu_pipeline_stage_seconds", "Durasi tahap.", labelnames=("stage",),
+                                   buckets=(0.01, 0.1))
+    for seconds in stage_seconds:
+        histogram.observe(seconds, stage="detect")
+    registry.counter("waifu_capture_frames_dropped_total", "Frame dibuang.").inc(3)
+    return registry
+
+
+def test_render_families_text_format():
+    registry = MetricsRegistry()
+    registry.counter("waifu_requests_total", "Jumlah request.", labelnames=("path",)).inc(path='/a"b\\c\nd')
+    registry.gauge("waifu_fps", "FPS.", callback=lambda: 12.5)
+    histogram = registry.histogram("waifu_latency_seconds", "Latensi.", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+
+    assert registry.render() == "\n".join([
+        "# HELP waifu_requests_total Jumlah request.",
+        "# TYPE waifu_requests_total counter",
+        'waifu_requests_total{path="/a\\"b\\\\c\\nd"} 1.0',
+        "# HELP waifu_fps FPS.",
+        "# TYPE waifu_fps gauge",
+        "waifu_fps 12.5",
+        "# HELP waifu_latency_seconds Latensi.",
+        "# TYPE waifu_latency_seconds histogram",
+        'waifu_latency_seconds_bucket{le="0.1"} 1.0',
+        'waifu_latency_seconds_bucket{le="1.0"} 2.0',
+        'waifu_latency_seconds_bucket{le="+Inf"} 3.0',
+        "waifu_latency_seconds_sum 5.55",
+        "waifu_latency_seconds_count 3.0",
+    ]) + "\n"
+
+
+def test_camera_label_is_injected_and_families_are_merged():
+    # Seperti /metrics di match.py: metrik server tanpa label, metrik pipeline per kamera berlabel camera
+    server = MetricsRegistry()
+    server.counter("waifu_http_requests_total", "Request HTTP.").inc()
+    pipelines = [({"camera": "lobby"}, _pipeline_registry([0.005]).collect()),
+                 ({"camera": "booth"}, _pipeline_registry([0.05, 0.5]).collect())]
+
+    lines = server.render(extra=pipelines).splitlines()
+    assert "waifu_http_requests_total 1.0" in lines
+    assert lines.count("# TYPE waifu_pipeline_stage_seconds histogram") == 1
+    assert lines.count("# HELP waifu_capture_frames_dropped_total Frame dibuang.") == 1
+    assert 'waifu_pipeline_stage_seconds_bucket{camera="lobby",stage="detect",le="0.01"} 1.0' in lines
+    assert 'waifu_pipeline_stage_seconds_bucket{camera="booth",stage="detect",le="0.01"} 0.0' in lines
+    assert 'waifu_pipeline_stage_seconds_count{camera="booth",stage="detect"} 2.0' in lines
+    assert 'waifu_capture_frames_dropped_total{camera="lobby"} 3.0' in lines
+    assert 'waifu_capture_frames_dropped_total{camera="booth"} 3.0' in lines
+
+    # Semua sampel satu family berurutan di bawah HELP/TYPE-nya
+    family = [line for line in lines if "waifu_pipeline_stage_seconds" in line]
+    start = lines.index(family[0])
+    assert lines[start:start + len(family)] == family
+
+
+def test_render_families_empty():
+    assert render_families([]) == "\n"
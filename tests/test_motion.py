@@ -0,0 +1,80 @@
+import numpy as np
+
+from motion import DetectionPlanner, MotionDetector, expand_box, merge_boxes
+
+FULL_FRAME = [(None, 0.25)]
+
+
+def _frame(value=0):
+    return np.full((480, 640, 3), value, dtype=np.uint8)
+
+
+def _frame_with_square(top, left, side=80):
+    frame = _frame()
+    frame[top:top + side, left:left + side] = 255
+    return frame
+
+
+def test_motion_detector_first_frame_is_all_motion_then_static():
+    detector = MotionDetector()
+    assert detector.motion_boxes(_frame()) == [(0, 640, 480, 0)]
+    detector.set_reference()
+    assert detector.motion_boxes(_frame()) == []
+
+
+def test_motion_detector_finds_changed_region():
+    detector = MotionDetector()
+    detector.motion_boxes(_frame())
+    detector.set_reference()
+    (top, right, bottom, left), = detector.motion_boxes(_frame_with_square(200, 300))
+    assert top <= 200 and left <= 300 and bottom >= 280 and right >= 380
+    assert bottom - top < 200 and right - left < 200
+
+
+def test_merge_and_expand_boxes():
+    assert sorted(merge_boxes([(0, 10, 10, 0), (5, 15, 15, 5), (100, 110, 110, 100)])) == \
+        [(0, 15, 15, 0), (100, 110, 110, 100)]
+    assert expand_box((100, 200, 200, 100), 0.5, 640, 480) == (50, 250, 250, 50)
+    assert expand_box((0, 640, 480, 0), 0.5, 640, 480) == (0, 640, 480, 0)
+
+
+def test_planner_without_motion_detector_always_full_frame():
+    planner = DetectionPlanner()
+    assert planner.plan(_frame(), now=0) == FULL_FRAME
+    assert planner.plan(_frame(), now=0.1) == FULL_FRAME
+
+
+def test_planner_static_scene_still_gets_periodic_sweep():
+    planner = DetectionPlanner(full_sweep_interval=2.0, idle_sweep_interval=10.0, motion_detector=MotionDetector())
+    frame = _frame()
+    assert planner.plan(frame, now=0) == FULL_FRAME
+    assert planner.plan(frame, now=1) is None
+    assert planner.plan(frame, now=9) is None
+    assert planner.plan(frame, now=10) == FULL_FRAME
+    assert planner.plan(frame, now=11) is None
+    assert planner.plan(frame, now=1000) == FULL_FRAME
+
+
+def test_planner_motion_between_sweeps_gives_roi():
+    planner = DetectionPlanner(full_sweep_interval=2.0, motion_detector=MotionDetector())
+    assert planner.plan(_frame(), now=0) == FULL_FRAME
+    plan = planner.plan(_frame_with_square(200, 300), now=0.5)
+    assert plan is not None and plan != FULL_FRAME
+    for box, scale in plan:
+        top, right, bottom, left = box
+        assert top <= 200 and left <= 300 and bottom >= 280 and right >= 380
+        assert planner.frame_scale <= scale <= 1.0
+
+
+def test_planner_stale_track_in_static_scene_gets_roi():
+    planner = DetectionPlanner(full_sweep_interval=2.0, motion_detector=MotionDetector())
+    frame = _frame()
+    planner.plan(frame, now=0)
+    plan = planner.plan(frame, stale_track_locations=[(100, 200, 200, 100)], now=0.5)
+    assert plan is not None and plan[0][0] is not None
+
+
+def test_planner_large_motion_falls_back_to_full_frame():
+    planner = DetectionPlanner(full_sweep_interval=2.0, motion_detector=MotionDetector())
+    planner.plan(_frame(), now=0)
+    assert planner.plan(_frame(255), now=0.5) == FULL_FRAME
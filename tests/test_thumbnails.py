@@ -0,0 +1,104 @@
+import os
+
+import cv2
+import numpy as np
+
+import thumbnails
+from thumbnails import ThumbnailStore, build_thumbnail_memmap
+
+SIZE = (32, 32)
+
+
+def _write_image(dataset, name, value, filename="wajah.png"):
+    folder = dataset / name
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / filename
+    cv2.imwrite(str(path), np.full((40, 40, 3), value, dtype=np.uint8))
+    return path
+
+
+def _overwrite_in_place(path, value):
+    # Menimpa isi file tanpa mengubah mtime folder; mtime file dimajukan agar pasti berbeda
+    folder_mtime = os.stat(path.parent).st_mtime_ns
+    stat = os.stat(path)
+    cv2.imwrite(str(path), np.full((40, 40, 3), value, dtype=np.uint8))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    os.utime(path.parent, ns=(folder_mtime, folder_mtime))
+
+
+def _store(dataset, **kwargs):
+    return ThumbnailStore(str(dataset), size=SIZE, recheck_interval=None, **kwargs)
+
+
+def test_lru_is_bounded(tmp_path):
+    for i in range(5):
+        _write_image(tmp_path, f"waifu-{i}", i * 10)
+    store = _store(tmp_path, max_items=3)
+    for i in range(5):
+        assert store.get(f"waifu-{i}").shape == (32, 32, 3)
+    store.get("waifu-2")  # jadi yang terbaru dipakai
+
+    assert list(store._cache) == ["waifu-3", "waifu-4", "waifu-2"]
+
+
+def test_cached_get_does_not_touch_disk(tmp_path, monkeypatch):
+    _write_image(tmp_path, "rem", 100)
+    store = _store(tmp_path)
+    first = store.get("rem")
+
+    def no_disk(*args, **kwargs):
+        raise AssertionError("get() membaca disk")
+    monkeypatch.setattr(thumbnails, "_source_signature", no_disk)
+    monkeypatch.setattr(thumbnails, "load_thumbnail", no_disk)
+    assert store.get("rem") is first
+
+
+def test_revalidate_reloads_image_overwritten_in_place(tmp_path):
+    path = _write_image(tmp_path, "rem", 100)
+    store = _store(tmp_path)
+    assert store.get("rem")[0, 0, 0] == 100
+
+    assert store.revalidate() == 0
+    _overwrite_in_place(path, 200)
+    assert store.revalidate() == 1
+    assert store.get("rem")[0, 0, 0] == 200
+
+
+def test_memmap_rows_are_used_and_replaced_when_stale(tmp_path):
+    dataset = tmp_path / "dataset"
+    path = _write_image(dataset, "rem", 100)
+    _write_image(dataset, "asuna", 50)
+    prefix = str(tmp_path / "thumbs")
+    assert build_thumbnail_memmap(str(dataset), prefix, size=SIZE) == 2
+
+    store = _store(dataset, memmap_path=prefix)
+    thumbnail = store.get("rem")
+    assert isinstance(thumbnail.base, np.memmap) or isinstance(thumbnail, np.memmap)
+    assert thumbnail[0, 0, 0] == 100
+
+    _overwrite_in_place(path, 200)
+    assert store.revalidate() == 1
+    assert store.get("rem")[0, 0, 0] == 200
+    # Setelah dikeluarkan dari LRU, baris memmap yang basi tidak dipakai lagi
+    store.invalidate()
+    assert store.get("rem")[0, 0, 0] == 200
+    assert store.get("asuna")[0, 0, 0] == 50
+
+
+def test_invalidate_drops_entries(tmp_path):
+    _write_image(tmp_path, "rem", 100)
+    _write_image(tmp_path, "asuna", 50)
+    store = _store(tmp_path)
+    store.preload(["rem", "asuna", "rem"])
+    store.invalidate("rem")
+    assert list(store._cache) == ["asuna"]
+    store.invalidate()
+    assert not store._cache
+
+
+def test_missing_image_is_cached_as_none(tmp_path):
+    store = _store(tmp_path)
+    assert store.get("tidak-ada") is None
+    _write_image(tmp_path, "tidak-ada", 80)
+    assert store.revalidate() == 1
+    assert store.get("tidak-ada")[0, 0, 0] == 80
@@ -0,0 +1,83 @@
+import numpy as np
+
+import tracking
+from tracking import TrackManager, location_iou
+
+
+class FakeTracker:
+    inits = 0
+
+    def init(self, frame, bbox):
+        FakeTracker.inits += 1
+        self.bbox = bbox
+
+    def update(self, frame):
+        return True, self.bbox
+
+
+def _manager(monkeypatch, **kwargs):
+    FakeTracker.inits = 0
+    monkeypatch.setattr(tracking, "create_tracker", lambda tracker_type="CSRT": FakeTracker())
+    return TrackManager(**kwargs)
+
+
+FRAME = np.zeros((480, 640, 3), dtype=np.uint8)
+
+
+def test_location_iou():
+    assert location_iou((0, 10, 10, 0), (0, 10, 10, 0)) == 1.0
+    assert location_iou((0, 10, 10, 0), (20, 30, 30, 20)) == 0.0
+    assert abs(location_iou((0, 10, 10, 0), (0, 15, 10, 5)) - 50 / 150) < 1e-9
+
+
+def test_healthy_track_keeps_its_tracker(monkeypatch):
+    manager = _manager(monkeypatch)
+    manager.apply_detections(FRAME, [(100, 200, 200, 100)], [("Rem", 90.0)], now=0)
+    track = manager.tracks[0]
+    tracker = track.tracker
+    assert FakeTracker.inits == 1
+
+    # Deteksi hampir di tempat yang sama: tracker lama dipakai terus, tanpa init() baru
+    encoded = manager.apply_detections(FRAME, [(102, 202, 202, 102)], [("Rem", 91.0)], now=1)
+    assert FakeTracker.inits == 1
+    assert manager.tracks == [track] and track.tracker is tracker
+    assert encoded == [(track, (102, 202, 202, 102))]
+
+
+def test_drifted_track_is_reinitialised(monkeypatch):
+    manager = _manager(monkeypatch, reinit_iou=0.6)
+    manager.apply_detections(FRAME, [(100, 200, 200, 100)], [("Rem", 90.0)], now=0)
+    track = manager.tracks[0]
+
+    # Masih cocok (IoU >= iou_threshold) tetapi di bawah reinit_iou: identitas sama, tracker baru
+    manager.apply_detections(FRAME, [(130, 230, 230, 130)], [None], now=1)
+    assert FakeTracker.inits == 2
+    assert manager.tracks == [track]
+    assert track.location == (130, 230, 230, 130)
+    assert track.name == "Rem"
+
+
+def test_new_and_missing_tracks(monkeypatch):
+    manager = _manager(monkeypatch, max_misses=1)
+    manager.apply_detections(FRAME, [(100, 200, 200, 100)], [("Rem", 90.0)], now=0)
+    manager.apply_detections(FRAME, [(300, 500, 400, 400)], [("Ram", 80.0)], now=1)
+    assert [track.name for track in manager.tracks] == ["Ram", "Rem"]
+    manager.apply_detections(FRAME, [(300, 500, 400, 400)], [None], now=2)
+    assert [track.name for track in manager.tracks] == ["Ram"]
+
+
+def test_match_event_once_per_identity_and_interval(monkeypatch):
+    manager = _manager(monkeypatch)
+    manager.apply_detections(FRAME, [(100, 200, 200, 100)], [("Rem", 60.0)], now=0)
+    track = manager.tracks[0]
+    assert track.claim_match_event(0.0, 2.0)
+    # Kemiripan rendah di-encode setiap siklus, tetapi tidak menjadi kejadian baru
+    assert not track.claim_match_event(0.5, 2.0)
+    assert not track.claim_match_event(1.9, 2.0)
+    assert track.claim_match_event(2.0, 2.0)
+    for now in (2.5, 3.0, 3.5):
+        track.observe("Ram", 99.0, now)
+    # Nama berubah: langsung dicatat
+    assert track.name == "Ram"
+    assert track.claim_match_event(3.5, 2.0)
+    assert not track.claim_match_event(3.6, 2.0)
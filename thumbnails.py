@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# --- Cache thumbnail galeri waifu ---
+# Gambar waifu disiapkan sekali (350x350, RGB) lalu disimpan di memori dengan
+# batas LRU, atau dibaca dari array uint8 ter-memory-map untuk galeri besar.
+# Thread latar belakang memeriksa ulang path & mtime gambar setiap
+# recheck_interval dan memuat ulang thumbnail yang berubah, sehingga get()
+# di loop frame tidak menyentuh disk untuk nama yang sudah di-cache.
+
+THUMBNAIL_SIZE = (350, 350)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def get_waifu_image_path(waifu_name, dataset_base_path="waifu_dataset"):
+    waifu_folder = os.path.join(dataset_base_path, waifu_name)
+    if os.path.isdir(waifu_folder):
+        for filename in os.listdir(waifu_folder):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                found_path = os.path.join(waifu_folder, filename)
+                return found_path
+    return None
+
+
+def load_thumbnail(image_path, size=THUMBNAIL_SIZE):
+    """Membaca gambar dari disk dan mengubahnya menjadi thumbnail RGB siap tampil."""
+    waifu_img_bgr = cv2.imread(image_path)
+    if waifu_img_bgr is None or waifu_img_bgr.size == 0:
+        print(f"DEBUG: cv2.imread gagal memuat gambar waifu: {image_path}")
+        return None
+    if waifu_img_bgr.dtype != np.uint8:
+        waifu_img_bgr = waifu_img_bgr.astype(np.uint8)
+    waifu_img_resized = cv2.resize(waifu_img_bgr, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(waifu_img_resized, cv2.COLOR_BGR2RGB)
+
+
+def _source_signature(waifu_name, dataset_base_path):
+    """(path gambar, mtime gambar) -- berubah jika gambar diganti, ditimpa, atau dihapus."""
+    image_path = get_waifu_image_path(waifu_name, dataset_base_path)
+    try:
+        image_mtime = os.stat(image_path).st_mtime_ns if image_path else None
+    except OSError:
+        image_mtime = None
+    return (image_path, image_mtime)
+
+
+class ThumbnailStore:
+    """Menyediakan thumbnail RGB 350x350 per nama waifu tanpa I/O disk di loop frame.
+
+    - LRU di memori, dibatasi max_items.
+    - Opsional memmap_path: array uint8 (N, H, W, 3) hasil build_thumbnail_memmap()
+      yang dibaca dengan mmap; barisnya dipakai tanpa disalin.
+    - Thread latar belakang (recheck_interval detik, None = tidak ada) menjalankan
+      revalidate(): entri yang sumbernya berubah dimuat ulang di luar loop frame.
+    """
+
+    MEMMAP_VERSION = 2
+
+    def __init__(self, dataset_base_path="waifu_dataset", size=THUMBNAIL_SIZE, max_items=256,
+                 memmap_path=None, recheck_interval=5.0):
+        self.dataset_base_path = dataset_base_path
+        self.size = size
+        self.max_items = max_items
+        self.recheck_interval = recheck_interval
+        # nama -> (thumbnail atau None, signature sumber saat dimuat)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._memmap = None
+        self._memmap_index = {}
+        if memmap_path:
+            self._load_memmap(memmap_path)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        if recheck_interval:
+            self._thread = threading.Thread(target=self._run, name="thumbnail-revalidate", daemon=True)
+            self._thread.start()
+
+    def _load_memmap(self, memmap_path):
+        with open(memmap_path + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != self.MEMMAP_VERSION:
+            raise ValueError(f"Versi thumbnail memmap tidak didukung: {meta.get('version')}; jalankan ulang thumbnails.py.")
+        if tuple(meta["size"]) != tuple(self.size):
+            raise ValueError(f"Ukuran thumbnail memmap {meta['size']} tidak sama dengan {list(self.size)}.")
+        self._memmap = np.load(memmap_path + ".npy", mmap_mode='r')
+        self._memmap_index = {name: (row, (image_path, image_mtime))
+                              for row, (name, image_path, image_mtime) in enumerate(meta["entries"])}
+        print(f"Thumbnail memmap '{memmap_path}.npy' dimuat ({len(self._memmap_index)} entri).")
+
+    def get(self, waifu_name):
+        with self._lock:
+            entry = self._cache.get(waifu_name)
+            if entry is not None:
+                self._cache.move_to_end(waifu_name)
+                return entry[0]
+            memmap_entry = self._memmap_index.get(waifu_name)
+
+        if memmap_entry is not None:
+            # Baris memmap dipakai langsung; revalidate() menggantinya jika gambar sumber sudah berubah
+            row, signature = memmap_entry
+            thumbnail = self._memmap[row]
+        else:
+            # Pertama kali nama ini diminta tanpa memmap: satu-satunya pembacaan disk (lihat preload())
+            signature = _source_signature(waifu_name, self.dataset_base_path)
+            thumbnail = self._load(waifu_name, signature)
+        self._put(waifu_name, thumbnail, signature)
+        return thumbnail
+
+    def _put(self, waifu_name, thumbnail, signature):
+        with self._lock:
+            self._cache[waifu_name] = (thumbnail, signature)
+            self._cache.move_to_end(waifu_name)
+            while len(self._cache) > self.max_items:
+                self._cache.popitem(last=False)
+
+    def _load(self, waifu_name, signature):
+        image_path = signature[0]
+        if image_path is None:
+            print(f"DEBUG: Path gambar waifu tidak ditemukan untuk {waifu_name}.")
+            return None
+        return load_thumbnail(image_path, self.size)
+
+    def revalidate(self):
+        """Memeriksa sumber semua entri cache dan memuat ulang yang berubah. Mengembalikan jumlahnya."""
+        with self._lock:
+            entries = [(name, entry[1]) for name, entry in self._cache.items()]
+        changed = 0
+        for waifu_name, signature in entries:
+            current = _source_signature(waifu_name, self.dataset_base_path)
+            if current == signature:
+                continue
+            changed += 1
+            thumbnail = self._load(waifu_name, current)
+            with self._lock:
+                # Baris memmap untuk nama ini sudah basi
+                self._memmap_index.pop(waifu_name, None)
+                if waifu_name in self._cache:
+                    self._cache[waifu_name] = (thumbnail, current)
+        return changed
+
+    def _run(self):
+        while not self._stop_event.wait(self.recheck_interval):
+            try:
+                self.revalidate()
+            except Exception as e:
+                print(f"Peringatan: Gagal memeriksa ulang thumbnail waifu: {e}")
+
+    def close(self):
+        self._stop_event.set()
+
+    def preload(self, waifu_names):
+        """Mengisi cache saat startup (maksimal max_items nama pertama)."""
+        for waifu_name in list(dict.fromkeys(waifu_names))[:self.max_items]:
+            self.get(waifu_name)
+
+    def invalidate(self, waifu_name=None):
+        with self._lock:
+            if waifu_name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(waifu_name, None)
+
+
+def build_thumbnail_memmap(dataset_base_path, output_path, size=THUMBNAIL_SIZE):
+    """Menulis semua thumbnail ke output_path.npy (uint8) + output_path.json (indeks nama)."""
+    waifu_names = sorted(name for name in os.listdir(dataset_base_path)
+                         if os.path.isdir(os.path.join(dataset_base_path, name)))
+    thumbnails = np.lib.format.open_memmap(output_path + ".npy", mode='w+', dtype=np.uint8,
+                                           shape=(len(waifu_names), size[1], size[0], 3))
+    entries = []
+    for waifu_name in waifu_names:
+        image_path, image_mtime = _source_signature(waifu_name, dataset_base_path)
+        thumbnail = load_thumbnail(image_path, size) if image_path else None
+        if thumbnail is None:
+            continue
+        thumbnails[len(entries)] = thumbnail
+        entries.append((waifu_name, image_path, image_mtime))
+    # Buang baris kosong di akhir jika ada gambar yang gagal dimuat
+    trimmed = np.array(thumbnails[:len(entries)]) if len(entries) < len(waifu_names) else None
+    thumbnails.flush()
+    del thumbnails
+    if trimmed is not None:
+        np.save(output_path + ".npy", trimmed)
+
+    with open(output_path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"version": ThumbnailStore.MEMMAP_VERSION, "size": list(size), "entries": entries}, f)
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Membangun file thumbnail ter-memory-map dari waifu_dataset/.")
+    parser.add_argument("--dataset", default="waifu_dataset", help="Folder dataset waifu")
+    parser.add_argument("--output", default="waifu_thumbnails", help="Prefix file output (.npy dan .json)")
+    args = parser.parse_args()
+
+    count = build_thumbnail_memmap(args.dataset, args.output)
+    print(f"[INFO] {count} thumbnail disimpan ke {args.output}.npy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import itertools
+import time
+from collections import deque
+
+import cv2
+
+# --- Manajemen track wajah ---
+# Track dipertahankan antar siklus deteksi: deteksi baru dicocokkan ke track
+# lama berdasarkan IoU, sehingga identitas (nama & kemiripan) hasil
+# pencocokan sebelumnya bisa dipakai ulang tanpa meng-encode ulang wajah.
+
+TRACKER_TYPES = ("CSRT", "KCF", "MOSSE")
+
+
+def create_tracker(tracker_type="CSRT"):
+    """CSRT paling akurat, KCF lebih cepat, MOSSE paling cepat (untuk adegan ramai)."""
+    tracker_type = tracker_type.upper()
+    if tracker_type not in TRACKER_TYPES:
+        raise ValueError(f"Tipe tracker tidak dikenal: {tracker_type} (pilihan: {', '.join(TRACKER_TYPES)})")
+    factory_name = f"Tracker{tracker_type}_create"
+    # Di OpenCV 4.5+, sebagian tracker (mis. MOSSE) hanya ada di cv2.legacy
+    factory = getattr(cv2, factory_name, None)
+    if factory is None and hasattr(cv2, "legacy"):
+        factory = getattr(cv2.legacy, factory_name, None)
+    if factory is None:
+        raise ValueError(f"Tracker {tracker_type} tidak tersedia di build OpenCV ini (butuh opencv-contrib-python).")
+    return factory()
+
+
+def location_to_bbox(location):
+    """(top, right, bottom, left) -> (x, y, w, h)"""
+    top, right, bottom, left = location
+    return (left, top, right - left, bottom - top)
+
+
+def bbox_to_location(bbox):
+    """(x, y, w, h) -> (top, right, bottom, left)"""
+    left, top, w, h = bbox
+    return (top, left + w, top + h, left)
+
+
+def scale_location(location, factor):
+    return tuple(int(v * factor) for v in location)
+
+
+def location_iou(a, b):
+    """Intersection-over-union dua kotak (top, right, bottom, left)."""
+    top = max(a[0], b[0])
+    right = min(a[1], b[1])
+    bottom = min(a[2], b[2])
+    left = max(a[3], b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    if intersection == 0:
+        return 0.0
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return intersection / float(area_a + area_b - intersection)
+
+
+def location_center_in(location, box):
+    """True jika titik tengah location berada di dalam box (keduanya (top, right, bottom, left))."""
+    center_y = (location[0] + location[2]) / 2.0
+    center_x = (location[1] + location[3]) / 2.0
+    return box[0] <= center_y <= box[2] and box[3] <= center_x <= box[1]
+
+
+def draw_track(frame, track, tracked=False):
+    """Menggambar kotak dan label "nama (kemiripan%)" sebuah track ke frame BGR."""
+    left, top, w, h = track.bbox
+    right = left + w
+    bottom = top + h
+
+    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+
+    # --- Bagian yang menampilkan nama dan persentase ---
+    label = f"{track.name} ({track.similarity:.2f}%)"
+    if tracked:
+        label += " (Tracked)"
+
+    # Dapatkan ukuran teks untuk menggambar latar belakang
+    (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+
+    # Gambar persegi panjang terisi sebagai latar belakang teks
+    # Posisikan persegi panjang sedikit di atas kotak pembatas
+    cv2.rectangle(frame, (left, top - text_height - baseline - 10), (left + text_width, top - 10), (0, 0, 0), cv2.FILLED) # Latar belakang hitam
+
+    # Tampilkan teks pada frame
+    cv2.putText(frame, label, (left, top - baseline - 5), # Sesuaikan posisi Y sedikit
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2) # Teks putih
+
+
+class Track:
+    def __init__(self, track_id, tracker, bbox, history_size):
+        self.track_id = track_id
+        self.tracker = tracker
+        self.bbox = bbox
+        self.name = "Unknown"
+        self.similarity = 0.0
+        self.last_encoded_at = None
+        self.misses = 0
+        self._observations = deque(maxlen=history_size)
+        self._event_name = None
+        self._event_at = None
+
+    @property
+    def location(self):
+        return bbox_to_location(self.bbox)
+
+    def observe(self, name, similarity, now):
+        """Menambahkan hasil pencocokan baru dan menghaluskan identitas track.
+
+        Identitas = nama dengan total kemiripan terbesar di beberapa observasi
+        terakhir, sehingga satu salah cocok tidak langsung mengganti nama.
+        """
+        self._observations.append((name, similarity))
+        self.last_encoded_at = now
+
+        scores = {}
+        for observed_name, observed_similarity in self._observations:
+            # Observasi "Unknown" tetap dihitung agar identitas bisa luntur
+            scores[observed_name] = scores.get(observed_name, 0.0) + max(observed_similarity, 1.0)
+        self.name = max(scores, key=scores.get)
+        similarities = [s for n, s in self._observations if n == self.name]
+        self.similarity = round(sum(similarities) / len(similarities), 2)
+
+    def claim_match_event(self, now, min_interval):
+        """True (dan dicatat) jika kejadian pencocokan perlu direkam: identitas pertama kali
+        dikenali atau berubah, atau min_interval detik sejak kejadian terakhir track ini."""
+        if self.name == self._event_name and now - self._event_at < min_interval:
+            return False
+        self._event_name = self.name
+        self._event_at = now
+        return True
+
+    def needs_encoding(self, now, refresh_interval, min_confidence):
+        if self.last_encoded_at is None or self.name == "Unknown":
+            return True
+        if self.similarity < min_confidence:
+            return True
+        return now - self.last_encoded_at >= refresh_interval
+
+
+class TrackManager:
+    def __init__(self, tracker_type="CSRT", iou_threshold=0.3, refresh_interval=2.0,
+                 min_confidence=70.0, max_misses=1, history_size=5, reinit_iou=0.6):
+        # Validasi di awal agar tipe tracker yang salah langsung ketahuan
+        create_tracker(tracker_type)
+        self.tracker_type = tracker_type
+        self.iou_threshold = iou_threshold
+        # Tracker yang kotaknya masih beririsan >= reinit_iou dengan deteksi dipertahankan;
+        # di bawahnya tracker dianggap drift dan dibuat ulang di kotak deteksi
+        self.reinit_iou = reinit_iou
+        self.refresh_interval = refresh_interval
+        self.min_confidence = min_confidence
+        self.max_misses = max_misses
+        self.history_size = history_size
+        self.tracks = []
+        self._next_id = itertools.count(1)
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def clear(self):
+        self.tracks = []
+
+    def update(self, frame):
+        """Memperbarui semua tracker pada frame saat ini; track yang gagal dibuang."""
+        alive = []
+        for track in self.tracks:
+            success, bbox = track.tracker.update(frame)
+            if success:
+                track.bbox = tuple(int(v) for v in bbox)
+                alive.append(track)
+        self.tracks = alive
+        return self.tracks
+
+    def cached_locations(self, now=None):
+        """Kotak track yang identitasnya masih segar (tidak perlu di-encode ulang)."""
+        now = time.time() if now is None else now
+        return [track.location for track in self.tracks
+                if not track.needs_encoding(now, self.refresh_interval, self.min_confidence)]
+
+    def stale_locations(self, now=None):
+        """Kotak track yang identitasnya perlu di-encode ulang."""
+        now = time.time() if now is None else now
+        return [track.location for track in self.tracks
+                if track.needs_encoding(now, self.refresh_interval, self.min_confidence)]
+
+    def apply_detections(self, source_frame, locations, observations, now=None, searched=None):
+        """Menerapkan hasil satu siklus deteksi.
+
+        locations: kotak (top, right, bottom, left) di skala frame penuh, mengacu ke source_frame.
+        observations: (nama, kemiripan) per kotak, atau None jika wajah tidak di-encode
+        (identitas track lama dipakai ulang).
+        searched: kotak yang diperiksa detektor (None = seluruh frame); track di luarnya
+        tidak dihitung sebagai tidak terdeteksi.
+        Mengembalikan list (track, location) untuk kotak yang baru di-encode.
+        """
+        now = time.time() if now is None else now
+
+        # Pencocokan greedy berdasarkan IoU tertinggi
+        pairs = sorted(((location_iou(track.location, location), t, d)
+                        for t, track in enumerate(self.tracks)
+                        for d, location in enumerate(locations)), reverse=True)
+        matched_tracks = {}
+        used_tracks = set()
+        for iou, t, d in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in used_tracks or d in matched_tracks:
+                continue
+            used_tracks.add(t)
+            matched_tracks[d] = (self.tracks[t], iou)
+
+        updated_tracks = []
+        encoded = []
+        for d, location in enumerate(locations):
+            track, iou = matched_tracks.get(d, (None, 0.0))
+            if track is not None and iou >= self.reinit_iou:
+                # Tracker masih mengikuti wajah: dipakai terus tanpa init() yang mahal (CSRT puluhan ms)
+                track.misses = 0
+            else:
+                # Track baru, atau tracker sudah drift: inisialisasi di kotak hasil deteksi
+                tracker = create_tracker(self.tracker_type)
+                bbox = location_to_bbox(location)
+                try:
+                    tracker.init(source_frame, bbox)
+                except Exception as e_init:
+                    print(f"Error saat inisialisasi tracker: {e_init}")
+                    continue
+
+                if track is None:
+                    track = Track(next(self._next_id), tracker, bbox, self.history_size)
+                else:
+                    track.tracker = tracker
+                    track.bbox = bbox
+                    track.misses = 0
+
+            if observations[d] is not None:
+                track.observe(observations[d][0], observations[d][1], now)
+                encoded.append((track, location))
+            updated_tracks.append(track)
+
+        # Track yang tidak terdeteksi diberi toleransi beberapa siklus sebelum dibuang
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                if searched is not None and not any(location_center_in(track.location, box) for box in searched):
+                    updated_tracks.append(track)
+                    continue
+                track.misses += 1
+                if track.misses <= self.max_misses:
+                    updated_tracks.append(track)
+
+        self.tracks = updated_tracks
+        return encoded